@@ -0,0 +1,120 @@
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from txn_parser import parse_transaction_line, extract_upi_id
+from categorizer import categorize
+
+# (max concurrent calls, sustained requests per second, burst size)
+PROVIDER_LIMITS = {
+    "groq": (4, 0.5, 5),
+    "serper": (5, 5.0, 10),
+    "gemini": (2, 0.25, 2),
+    "ollama": (2, 100.0, 100),
+}
+
+
+class TokenBucket:
+    """Classic token bucket; acquire() blocks until a token is available."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ProviderLimiter:
+    """Caps in-flight calls and request rate for one upstream provider."""
+
+    def __init__(self, name: str, max_concurrency: int, rate: float, burst: float):
+        self.name = name
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._bucket = TokenBucket(rate, burst)
+
+    def __enter__(self):
+        self._semaphore.acquire()
+        self._bucket.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self._semaphore.release()
+        return False
+
+
+def build_limiters(limits: Optional[Dict] = None) -> Dict[str, ProviderLimiter]:
+    limits = limits or PROVIDER_LIMITS
+    return {name: ProviderLimiter(name, *spec) for name, spec in limits.items()}
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 20.0) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class BatchAnalyzer:
+    """Runs TransactionAnalyzer over a batch on a bounded thread pool.
+
+    Each distinct counterparty UPI ID is resolved exactly once per batch and
+    results come back in input order. Provider limits are enforced inside the
+    analyzer's own LLM and search calls, so throughput is bounded by those
+    limits rather than by the summed latency of every line. Uncached UPI IDs
+    and lines the grammar or the local categorizer can't handle are sent to
+    the LLM in packed batches.
+    """
+
+    def __init__(self, analyzer, max_workers: int = 8):
+        self.analyzer = analyzer
+        self.max_workers = max_workers
+
+    def process(self, transactions: List[str]):
+        if not transactions:
+            return []
+
+        # Categories for the whole batch in one vectorized call to the local model
+        categories = categorize(transactions)
+        upi_ids, needs_llm = [], []
+        for i, tx in enumerate(transactions):
+            parsed = parse_transaction_line(tx)
+            upi_ids.append(parsed.upi_id if parsed else (extract_upi_id(tx) or tx.strip()))
+            if parsed is None or categories[i] is None:
+                needs_llm.append(i)
+
+        unique_ids = list(dict.fromkeys(upi_ids))
+        # One packed call per batch of uncached IDs instead of one call per ID
+        self.analyzer.prefetch_upi_ids(unique_ids)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            resolved = dict(zip(unique_ids, pool.map(self.analyzer.resolve_counterparty, unique_ids)))
+            print(f"[DEBUG] Resolved {len(unique_ids)} unique counterparties for {len(transactions)} transactions")
+
+            analyses = [None if category is None else {"category": category} for category in categories]
+            if needs_llm:
+                print(f"[DEBUG] {len(transactions) - len(needs_llm)} lines categorized locally, "
+                      f"{len(needs_llm)} sent to the LLM")
+                batch = [(transactions[i], resolved[upi_ids[i]]) for i in needs_llm]
+                for i, analysis in zip(needs_llm, self.analyzer.analyze_fallback_batch(batch)):
+                    analyses[i] = analysis
+
+            return list(pool.map(
+                lambda tx, upi_id, analysis: self.analyzer.analyze_transaction(
+                    tx, counterparty=resolved[upi_id], analysis=analysis),
+                transactions,
+                upi_ids,
+                analyses,
+            ))
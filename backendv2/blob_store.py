@@ -0,0 +1,162 @@
+import os
+import uuid
+import hashlib
+from typing import BinaryIO, Optional, Tuple
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from columnar_store import TRANSACTION_SCHEMA, normalize_frame, to_transaction_table, unparsed_dates
+
+BLOB_ROOT = os.environ.get("UDAN_BLOB_ROOT", "./blobs")
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobStore:
+    """Content-addressed storage for uploads, plus memoized extraction results.
+
+    Files are stored once under the SHA-256 of their bytes, so re-uploading
+    the same statement costs neither disk nor a second extraction: results
+    are kept per (content hash, extraction version) and replayed on a hit.
+    """
+
+    def __init__(self, root: str = BLOB_ROOT):
+        self.root = root
+        self.results_dir = os.path.join(root, "results")
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.results_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def blob_path(self, digest: str, ext: str = "") -> str:
+        return os.path.join(self.root, digest[:2], digest + ext.lower())
+
+    def open_writer(self, ext: str = "", max_bytes: Optional[int] = None) -> "BlobWriter":
+        return BlobWriter(self, ext, max_bytes)
+
+    def put_stream(self, stream: BinaryIO, ext: str = "", max_bytes: Optional[int] = None) -> Tuple[str, str, int]:
+        """Copies a stream into the store while hashing it; returns (digest, path, size).
+
+        Raises ValueError once more than max_bytes have been read; the partial
+        file is discarded.
+        """
+        writer = self.open_writer(ext, max_bytes)
+        try:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                writer.write(chunk)
+            return writer.commit()
+        finally:
+            writer.abort()
+
+    def put_file(self, file_path: str) -> Tuple[str, str, int]:
+        with open(file_path, "rb") as f:
+            return self.put_stream(f, os.path.splitext(file_path)[1])
+
+    def _result_path(self, digest: str, version: str) -> str:
+        return os.path.join(self.results_dir, f"{digest}-{version}.parquet")
+
+    def load_result(self, digest: str, version: str) -> Optional[pd.DataFrame]:
+        path = self._result_path(digest, version)
+        if not os.path.exists(path):
+            return None
+        df = pq.read_table(path, memory_map=True).to_pandas()
+        return df.drop(columns=["application_id", "month"])
+
+    def result_writer(self, digest: str, version: str) -> "ResultWriter":
+        return ResultWriter(self._result_path(digest, version), os.path.join(self.tmp_dir, uuid.uuid4().hex))
+
+
+class BlobWriter:
+    """Incremental writer: hashes and spools chunks, then files them under their digest."""
+
+    def __init__(self, store: BlobStore, ext: str = "", max_bytes: Optional[int] = None):
+        self.store = store
+        self.ext = ext
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._tmp_path = os.path.join(store.tmp_dir, uuid.uuid4().hex)
+        self._out = open(self._tmp_path, "wb")
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise ValueError(f"File exceeds the {self.max_bytes} byte limit")
+        self._digest.update(chunk)
+        self._out.write(chunk)
+
+    def commit(self) -> Tuple[str, str, int]:
+        self._out.close()
+        digest = self._digest.hexdigest()
+        path = self.store.blob_path(digest, self.ext)
+        if os.path.exists(path):
+            print(f"[DEBUG] Upload {digest[:12]} already stored, reusing {path}")
+            os.remove(self._tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self._tmp_path, path)
+        return digest, path, self.size
+
+    def abort(self):
+        """Drops the spooled data; a no-op after a successful commit."""
+        if not self._out.closed:
+            self._out.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+class ResultWriter:
+    """Appends analyzed chunks to a result file that only becomes visible on a clean exit.
+
+    Only rows write_transactions would accept are kept: a date that fails to
+    parse is stored as NaT, which a replay could no longer tell apart from a
+    missing date and would file under the unknown month.
+    """
+
+    def __init__(self, path: str, tmp_path: str):
+        self.path = path
+        self.tmp_path = tmp_path
+        self.writer = None
+        self.discarded = False
+
+    def discard(self):
+        """Keeps the result from being memoized, e.g. after a handled failure."""
+        self.discarded = True
+
+    def write(self, df: pd.DataFrame):
+        if df is None or df.empty:
+            return
+        df = normalize_frame(df.copy())
+        df = df[~unparsed_dates(df)]
+        if df.empty:
+            return
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.tmp_path, TRANSACTION_SCHEMA)
+        self.writer.write_table(to_transaction_table("", df))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.writer is None:
+            return False  # nothing extracted; worth retrying next time rather than memoizing
+        self.writer.close()
+        if exc_type is None and not self.discarded:
+            os.replace(self.tmp_path, self.path)
+        elif os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        return False
+
+
+def file_digest(file_path: str) -> str:
+    """SHA-256 of a file, reusing the name when it already lives in the blob store."""
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    if len(name) == 64 and os.path.dirname(file_path).endswith(name[:2]):
+        return name
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+blobs = BlobStore()
@@ -0,0 +1,156 @@
+import os
+import re
+import glob
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import FeatureUnion, Pipeline
+
+DEFAULT_MODEL_PATH = os.environ.get("UDAN_CATEGORIZER_PATH", "./cache/categorizer.joblib")
+CONFIDENCE_THRESHOLD = float(os.environ.get("CATEGORY_CONFIDENCE_THRESHOLD", "0.6"))
+TRAINING_SOURCES = ["transactions_updated.csv", "processed_files/*.csv"]
+# Below these a model mislabels more than it helps, so the LLM keeps categorizing
+MIN_TRAINING_ROWS = int(os.environ.get("CATEGORIZER_MIN_ROWS", "50"))
+MIN_TRAINING_CLASSES = int(os.environ.get("CATEGORIZER_MIN_CLASSES", "3"))
+
+# Same label set the TRANSACTION_ANALYSIS prompt asks the LLM for
+CATEGORIES = ["food", "transport", "entertainment", "utilities", "shopping", "health", "education", "other"]
+
+_DIGITS = re.compile(r"\d+")
+_NOISE = re.compile(r"[^a-z#@.\s]")
+
+
+def transaction_text(raw: str) -> str:
+    """Normalizes a raw line for featurization: lowercase, digit runs collapsed to '#'."""
+    text = _DIGITS.sub("#", str(raw).lower())
+    return " ".join(_NOISE.sub(" ", text).split())
+
+
+def load_training_frame(sources: Sequence[str] = TRAINING_SOURCES) -> pd.DataFrame:
+    """Collects (text, category) pairs from the CSVs earlier runs already labeled.
+
+    Older exports are not all UTF-8, so undecodable bytes are replaced rather
+    than dropping the whole file.
+    """
+    frames = []
+    for pattern in sources:
+        for path in sorted(glob.glob(pattern)):
+            try:
+                df = pd.read_csv(path, dtype=str, on_bad_lines="skip", encoding="utf-8",
+                                 encoding_errors="replace")
+            except Exception as e:
+                print(f"[DEBUG] Skipping {path}: {e}")
+                continue
+            text_column = "raw_transaction" if "raw_transaction" in df.columns else "transaction"
+            if text_column not in df.columns or "category" not in df.columns:
+                print(f"[DEBUG] Skipping {path}: no {text_column}/category columns")
+                continue
+            frames.append(pd.DataFrame({"text": df[text_column], "category": df["category"]}))
+    if not frames:
+        return pd.DataFrame(columns=["text", "category"])
+    data = pd.concat(frames, ignore_index=True).dropna()
+    data["category"] = data["category"].str.strip().str.lower()
+    data = data[data["category"].isin(CATEGORIES)]
+    data["text"] = data["text"].map(transaction_text)
+    return data.drop_duplicates().reset_index(drop=True)
+
+
+class TransactionCategorizer:
+    """Char and word n-gram TF-IDF features feeding a multinomial logistic regression.
+
+    Small enough to train in seconds on the labeled history and to load from
+    disk in milliseconds; predict() scores a whole batch with one sparse
+    matrix product.
+    """
+
+    def __init__(self, pipeline: Optional[Pipeline] = None):
+        self.pipeline = pipeline
+
+    @classmethod
+    def train(cls, texts: Sequence[str], labels: Sequence[str]) -> "TransactionCategorizer":
+        features = FeatureUnion([
+            ("char", TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 5), sublinear_tf=True, min_df=1)),
+            ("word", TfidfVectorizer(analyzer="word", token_pattern=r"[a-z]{2,}", sublinear_tf=True)),
+        ])
+        pipeline = Pipeline([
+            ("features", features),
+            ("model", LogisticRegression(max_iter=1000, C=4.0, class_weight="balanced")),
+        ])
+        pipeline.fit([transaction_text(t) for t in texts], list(labels))
+        return cls(pipeline)
+
+    def predict(self, texts: Sequence[str]) -> Tuple[List[str], np.ndarray]:
+        """Returns the most likely category and its probability for each text."""
+        if not texts:
+            return [], np.empty(0)
+        probabilities = self.pipeline.predict_proba([transaction_text(t) for t in texts])
+        best = probabilities.argmax(axis=1)
+        labels = self.pipeline.classes_[best]
+        return [str(label) for label in labels], probabilities[np.arange(len(best)), best]
+
+    def save(self, path: str = DEFAULT_MODEL_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        joblib.dump(self.pipeline, path, compress=3)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_MODEL_PATH) -> "TransactionCategorizer":
+        return cls(joblib.load(path))
+
+
+def train_from_history(sources: Sequence[str] = TRAINING_SOURCES,
+                       path: str = DEFAULT_MODEL_PATH) -> Optional[TransactionCategorizer]:
+    data = load_training_frame(sources)
+    if len(data) < MIN_TRAINING_ROWS or data["category"].nunique() < MIN_TRAINING_CLASSES:
+        print(f"[DEBUG] Not enough labeled transactions to train a categorizer "
+              f"({len(data)} rows, {data['category'].nunique()} categories; need "
+              f"{MIN_TRAINING_ROWS} rows, {MIN_TRAINING_CLASSES} categories)")
+        return None
+    categorizer = TransactionCategorizer.train(data["text"].tolist(), data["category"].tolist())
+    categorizer.save(path)
+    print(f"[DEBUG] Trained categorizer on {len(data)} rows, {data['category'].nunique()} categories -> {path}")
+    return categorizer
+
+
+_categorizer: Optional[TransactionCategorizer] = None
+_categorizer_lock = threading.Lock()
+_categorizer_loaded = False
+
+
+def get_categorizer(path: str = DEFAULT_MODEL_PATH) -> Optional[TransactionCategorizer]:
+    """Process-wide categorizer, loaded from disk or trained once from the labeled history."""
+    global _categorizer, _categorizer_loaded
+    with _categorizer_lock:
+        if not _categorizer_loaded:
+            try:
+                if os.path.exists(path):
+                    _categorizer = TransactionCategorizer.load(path)
+                else:
+                    _categorizer = train_from_history(path=path)
+            except Exception as e:
+                print(f"[DEBUG] Categorizer unavailable: {e}")
+                _categorizer = None
+            _categorizer_loaded = True
+        return _categorizer
+
+
+def categorize(texts: Sequence[str], threshold: float = CONFIDENCE_THRESHOLD) -> List[Optional[str]]:
+    """Local categories for a batch; None where the model is missing or below `threshold`."""
+    categorizer = get_categorizer()
+    if categorizer is None:
+        return [None] * len(texts)
+    labels, confidence = categorizer.predict(texts)
+    return [label if score >= threshold else None for label, score in zip(labels, confidence)]
+
+
+if __name__ == "__main__":
+    model = train_from_history()
+    if model:
+        sample = ["INR 500 debited to swiggy.75839@okicici for dinner", "INR 120 debited to uber.ride@okaxis"]
+        print(list(zip(sample, *model.predict(sample))))
@@ -0,0 +1,177 @@
+import io
+import os
+import json
+import uuid
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from datetime import datetime
+from typing import Dict, List, Optional
+
+CHART_CACHE_DIR = os.environ.get("UDAN_CHART_CACHE", "./cache/charts")
+CHART_WORKERS = int(os.environ.get("CHART_WORKERS", 2))
+CHART_RENDER_TIMEOUT = float(os.environ.get("CHART_RENDER_TIMEOUT", 60))
+# Bump when rendering changes so cached images are not reused
+CHART_VERSION = "v1"
+DEFAULT_DPI = 100
+
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def _plot_panel(ax, panel: Dict):
+    kind = panel.get("type", "line")
+    x = panel.get("x", [])
+    if panel.get("x_dates"):
+        x = [datetime.fromisoformat(str(v)) for v in x]
+    series = panel.get("series", [])
+    if kind == "pie":
+        ax.pie(series[0]["y"], labels=x, autopct="%1.1f%%")
+    elif kind == "bar":
+        width = 0.8 / max(len(series), 1)
+        positions = range(len(x))
+        for i, s in enumerate(series):
+            ax.bar([p + i * width for p in positions], s["y"], width=width, label=s.get("label"))
+        ax.set_xticks([p + width * (len(series) - 1) / 2 for p in positions])
+        ax.set_xticklabels(x)
+    else:
+        for s in series:
+            sx = s.get("x", x)
+            if panel.get("x_dates") and "x" in s:
+                sx = [datetime.fromisoformat(str(v)) for v in sx]
+            if kind == "scatter":
+                ax.scatter(sx, s["y"], label=s.get("label"))
+            else:
+                ax.plot(sx, s["y"], label=s.get("label"), marker=s.get("marker"),
+                        linestyle=s.get("linestyle", "-"), alpha=s.get("alpha", 1.0))
+    ax.set_title(panel.get("title", ""))
+    ax.set_xlabel(panel.get("xlabel", ""))
+    ax.set_ylabel(panel.get("ylabel", ""))
+    if panel.get("rotate_xticks"):
+        ax.tick_params(axis="x", labelrotation=panel["rotate_xticks"])
+    if panel.get("grid"):
+        ax.grid(True)
+    if panel.get("legend") == "outside":
+        ax.legend(bbox_to_anchor=(1.05, 1), loc="upper left")
+    elif panel.get("legend"):
+        ax.legend()
+
+
+def render_spec(spec: Dict, fmt: str) -> bytes:
+    """Renders a chart spec to image bytes. Runs in the worker processes."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    rows, cols = spec.get("layout", [1, 1])
+    fig, axes = plt.subplots(rows, cols, figsize=spec.get("size", [12, 6]), squeeze=False)
+    try:
+        for ax, panel in zip(axes.flat, spec["panels"]):
+            _plot_panel(ax, panel)
+        for ax in list(axes.flat)[len(spec["panels"]):]:
+            ax.set_visible(False)
+        if spec.get("title"):
+            fig.suptitle(spec["title"])
+        fig.tight_layout()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=fmt, dpi=spec.get("dpi", DEFAULT_DPI), bbox_inches="tight")
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+
+def chart_id(spec: Dict) -> str:
+    payload = json.dumps(spec, sort_keys=True, default=str)
+    return hashlib.sha256(f"{CHART_VERSION}:{payload}".encode()).hexdigest()[:32]
+
+
+class ChartService:
+    """Renders chart specs on demand in a process pool and caches the bytes on disk.
+
+    Analysis code only registers specs (plain JSON data) and hands out their
+    ids; nothing is drawn until an image is requested. A spec's id is the
+    hash of its contents, so identical charts share one rendering per format
+    and concurrent requests for the same image wait on a single render.
+    """
+
+    def __init__(self, cache_dir: str = CHART_CACHE_DIR, workers: int = CHART_WORKERS):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.RLock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str, ext: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{ext}")
+
+    def _write(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn keeps the Flask process's threads and locks out of the workers
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def register(self, spec: Dict) -> str:
+        """Stores a spec for later rendering and returns its id."""
+        key = chart_id(spec)
+        path = self._path(key, "json")
+        if not os.path.exists(path):
+            self._write(path, json.dumps(spec, default=str).encode())
+        return key
+
+    def register_all(self, specs: List[Dict]) -> List[Dict]:
+        """Registers specs and returns [{id, title}] entries for API responses."""
+        return [{"id": self.register(spec), "title": spec.get("title", "")} for spec in specs]
+
+    def load_spec(self, key: str) -> Dict:
+        path = self._path(key, "json")
+        if not os.path.exists(path):
+            raise KeyError(f"Unknown chart {key}")
+        with open(path) as f:
+            return json.load(f)
+
+    def render(self, key: str, fmt: str = "png") -> bytes:
+        """Returns the rendered image, drawing it in the pool on first request."""
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported chart format {fmt!r}")
+        path = self._path(key, fmt)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read()
+        spec = self.load_spec(key)
+        pending_key = f"{key}.{fmt}"
+        with self._lock:
+            future = self._pending.get(pending_key)
+            if future is None:
+                future = self._get_pool().submit(render_spec, spec, fmt)
+                self._pending[pending_key] = future
+        try:
+            data = future.result(timeout=CHART_RENDER_TIMEOUT)
+        finally:
+            with self._lock:
+                if self._pending.get(pending_key) is future:
+                    del self._pending[pending_key]
+        if not os.path.exists(path):
+            self._write(path, data)
+        return data
+
+    def save(self, spec: Dict, output_path: str) -> str:
+        """Renders a spec straight to a file, for scripts that still want images on disk."""
+        fmt = os.path.splitext(output_path)[1].lstrip(".").lower() or "png"
+        data = self.render(self.register(spec), fmt)
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with open(output_path, "wb") as f:
+            f.write(data)
+        return output_path
+
+
+charts = ChartService()
@@ -0,0 +1,306 @@
+import os
+import ast
+import json
+import uuid
+import shutil
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+WAREHOUSE_ROOT = os.environ.get("UDAN_WAREHOUSE_ROOT", "./warehouse")
+TRANSACTIONS_ROOT = os.path.join(WAREHOUSE_ROOT, "transactions")
+APPLICATIONS_ROOT = os.path.join(WAREHOUSE_ROOT, "applications")
+QUARANTINE_ROOT = os.path.join(WAREHOUSE_ROOT, "quarantine")
+FORECASTS_ROOT = os.path.join(WAREHOUSE_ROOT, "forecasts")
+
+UNKNOWN_MONTH = "unknown"
+
+# Statement date layouts seen in uploads, tried in order. ISO comes first (the
+# local parsers emit it); everything else is day-first, as Indian statements are.
+DATE_FORMATS = [
+    "%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d-%m-%Y %H:%M:%S", "%H:%M:%S %d-%m-%Y",
+    "%d-%m-%Y", "%d/%m/%Y", "%d.%m.%Y", "%d-%m-%y", "%d/%m/%y", "%d %b %Y", "%d-%b-%Y", "%d %b %y",
+]
+
+TRANSACTION_COLUMNS = [
+    "raw_transaction", "upi_id", "amount", "transaction_type", "recipient_type",
+    "category", "bank", "recipient_name", "date", "merchant_info",
+]
+
+# Gemini output spells these differently from TransactionData
+COLUMN_ALIASES = {
+    "recepient_type": "recipient_type",
+    "recepient_name": "recipient_name",
+}
+
+# Arrow layout of search.TransactionData plus the partition keys
+TRANSACTION_SCHEMA = pa.schema([
+    ("raw_transaction", pa.string()),
+    ("upi_id", pa.string()),
+    ("amount", pa.float64()),
+    ("transaction_type", pa.string()),
+    ("recipient_type", pa.string()),
+    ("category", pa.string()),
+    ("bank", pa.string()),
+    ("recipient_name", pa.string()),
+    ("date", pa.timestamp("s")),
+    ("merchant_info", pa.string()),  # JSON encoded
+    ("account", pa.string()),  # linked UPI ID the statement belongs to
+    ("application_id", pa.string()),
+    ("month", pa.string()),
+])
+
+APPLICATION_SCHEMA = pa.schema([
+    ("application_id", pa.string()),
+    ("loanPurpose", pa.string()),
+    ("incomeSource", pa.string()),
+    ("useUpi", pa.string()),
+    ("files", pa.list_(pa.string())),
+    # UPI ID each file was exported from, aligned with files; None for statements and documents
+    ("file_accounts", pa.list_(pa.string())),
+    ("upi_ids", pa.list_(pa.string())),
+    ("is_own", pa.list_(pa.string())),
+    ("relationships", pa.list_(pa.string())),
+    ("frequencies", pa.list_(pa.string())),
+])
+
+
+FORECAST_SCHEMA = pa.schema([
+    ("application_id", pa.string()),
+    ("forecast_start", pa.timestamp("s")),
+    ("horizon_days", pa.int32()),
+    ("next_period_total", pa.float64()),
+    ("interval_low", pa.float64()),
+    ("interval_high", pa.float64()),
+    ("outlook", pa.string()),
+    ("history_days", pa.int32()),
+    ("low_confidence", pa.bool_()),
+    ("run_date", pa.string()),
+])
+
+
+def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Coerces one extracted CSV to the TransactionData column layout."""
+    df = df.rename(columns=lambda c: COLUMN_ALIASES.get(str(c).strip(), str(c).strip()))
+    for column in TRANSACTION_COLUMNS:
+        if column not in df.columns:
+            df[column] = None
+    df["amount"] = pd.to_numeric(df["amount"], errors="coerce")
+    return df[TRANSACTION_COLUMNS + [c for c in df.columns if c not in TRANSACTION_COLUMNS]]
+
+
+def parse_dates(values: pd.Series) -> pd.Series:
+    """Parses statement dates with the known formats, falling back to day-first parsing.
+
+    Values that parse under none of them become NaT.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    text = values.astype("string").str.strip()
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[s]")
+    for fmt in DATE_FORMATS:
+        pending = parsed.isna() & text.notna() & (text != "")
+        if not pending.any():
+            return parsed
+        parsed.loc[pending] = pd.to_datetime(text[pending], format=fmt, errors="coerce")
+    pending = parsed.isna() & text.notna() & (text != "")
+    if pending.any():
+        parsed.loc[pending] = pd.to_datetime(text[pending], format="mixed", dayfirst=True, errors="coerce")
+    return parsed
+
+
+def unparsed_dates(df: pd.DataFrame) -> pd.Series:
+    """Rows that carry a date none of the known formats can read."""
+    text = df["date"].astype("string").str.strip()
+    return text.notna() & (text != "") & parse_dates(df["date"]).isna()
+
+
+def _encode_merchant_info(value) -> Optional[str]:
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def to_transaction_table(application_id: str, df: pd.DataFrame, account: Optional[str] = None) -> pa.Table:
+    """Coerces an analyzed transaction frame to TRANSACTION_SCHEMA."""
+    df = normalize_frame(df.copy())
+    out = pd.DataFrame({
+        name: df[name].astype("string").where(df[name].notna(), None)
+        for name in ("raw_transaction", "upi_id", "transaction_type", "recipient_type",
+                     "category", "bank", "recipient_name")
+    })
+    out["amount"] = df["amount"].astype("float64")
+    out["date"] = parse_dates(df["date"]).astype("datetime64[s]")
+    out["merchant_info"] = df["merchant_info"].map(_encode_merchant_info)
+    if account is not None or "account" not in df.columns:
+        out["account"] = account
+    else:
+        out["account"] = df["account"].astype("string").where(df["account"].notna(), None)
+    out["application_id"] = application_id
+    out["month"] = out["date"].dt.strftime("%Y-%m").fillna(UNKNOWN_MONTH)
+    return pa.Table.from_pandas(out[TRANSACTION_SCHEMA.names], schema=TRANSACTION_SCHEMA,
+                                preserve_index=False)
+
+
+def write_transactions(application_id: str, df: pd.DataFrame, account: Optional[str] = None,
+                       root: str = TRANSACTIONS_ROOT) -> int:
+    """Appends transactions to the dataset partitioned by application and month.
+
+    Rows whose date cannot be parsed would land in the wrong (or no) month,
+    so they go to the application's quarantine file instead.
+    """
+    if df is None or df.empty:
+        return 0
+    df = normalize_frame(df.copy())
+    bad = unparsed_dates(df)
+    if bad.any():
+        quarantine_rows(application_id, df[bad], "unparseable date")
+        df = df[~bad]
+        if df.empty:
+            return 0
+    table = to_transaction_table(application_id, df, account)
+    pq.write_to_dataset(
+        table,
+        root_path=root,
+        partition_cols=["application_id", "month"],
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return table.num_rows
+
+
+def quarantine_rows(application_id: str, df: pd.DataFrame, reason: str, root: str = QUARANTINE_ROOT) -> str:
+    """Appends rows kept out of the dataset to <root>/<application_id>.csv with the reason."""
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, f"{application_id}.csv")
+    print(f"[DEBUG] Quarantined {len(df)} rows for {application_id}: {reason}")
+    df.assign(reason=reason).to_csv(path, mode="a", header=not os.path.exists(path), index=False)
+    return path
+
+
+def delete_transactions(application_id: str, root: str = TRANSACTIONS_ROOT,
+                        quarantine_root: str = QUARANTINE_ROOT):
+    """Removes an application's partitions and quarantine file before it is re-analyzed.
+
+    write_transactions only appends, so without this a second analysis of the
+    same uploads would count every transaction twice.
+    """
+    shutil.rmtree(os.path.join(root, f"application_id={application_id}"), ignore_errors=True)
+    quarantine_path = os.path.join(quarantine_root, f"{application_id}.csv")
+    if os.path.exists(quarantine_path):
+        os.remove(quarantine_path)
+
+
+def partition_files(application_id: str, root: str = TRANSACTIONS_ROOT) -> List[str]:
+    """Parquet files belonging to one application, across all months."""
+    app_dir = os.path.join(root, f"application_id={application_id}")
+    if not os.path.isdir(app_dir):
+        return []
+    files = []
+    for dirpath, _, filenames in os.walk(app_dir):
+        files.extend(os.path.join(dirpath, f) for f in filenames if f.endswith(".parquet"))
+    return sorted(files)
+
+
+def read_transactions(application_ids: Optional[Sequence[str]] = None,
+                      columns: Optional[Sequence[str]] = None,
+                      months: Optional[Sequence[str]] = None,
+                      filters: Optional[List] = None,
+                      root: str = TRANSACTIONS_ROOT) -> pd.DataFrame:
+    """Reads transactions with partition pruning, column pruning and pushdown filters.
+
+    `filters` uses the pyarrow DNF form, e.g. [("amount", "<", 0)].
+    """
+    if not os.path.isdir(root):
+        return pd.DataFrame(columns=list(columns or TRANSACTION_SCHEMA.names))
+    predicates = list(filters or [])
+    if application_ids is not None:
+        predicates.append(("application_id", "in", list(application_ids)))
+    if months is not None:
+        predicates.append(("month", "in", list(months)))
+    table = pq.read_table(
+        root,
+        columns=list(columns) if columns else None,
+        filters=predicates or None,
+        schema=TRANSACTION_SCHEMA,
+        partitioning="hive",
+        memory_map=True,
+    )
+    return table.to_pandas()
+
+
+def save_application(application_id: str, record: Dict, root: str = APPLICATIONS_ROOT) -> str:
+    os.makedirs(root, exist_ok=True)
+    row = {name: record.get(name) for name in APPLICATION_SCHEMA.names}
+    row["application_id"] = application_id
+    table = pa.Table.from_pylist([row], schema=APPLICATION_SCHEMA)
+    path = os.path.join(root, f"{application_id}.parquet")
+    pq.write_table(table, path)
+    return path
+
+
+def load_application(application_id: str, root: str = APPLICATIONS_ROOT,
+                     legacy_dir: str = "uploaded_files") -> Optional[Dict]:
+    """Loads an application record, falling back to the old loan_application_<id>.csv dumps."""
+    path = os.path.join(root, f"{application_id}.parquet")
+    if os.path.exists(path):
+        return pq.read_table(path, memory_map=True).to_pylist()[0]
+
+    legacy_path = os.path.join(legacy_dir, f"loan_application_{application_id}.csv")
+    if not os.path.exists(legacy_path):
+        return None
+    row = pd.read_csv(legacy_path, dtype=str, keep_default_na=False).iloc[0].to_dict()
+    for name in ("files", "upi_ids", "is_own", "relationships", "frequencies"):
+        row[name] = ast.literal_eval(row[name]) if row.get(name) else []
+    row["application_id"] = application_id
+    return row
+
+
+_forecasts_lock = threading.Lock()
+
+
+def write_forecasts(df: pd.DataFrame, run_date: str, replace: bool = True, root: str = FORECASTS_ROOT) -> int:
+    """Writes one batch forecasting run as its own run_date partition.
+
+    A full run (replace) replaces any earlier run of the same date. A run
+    over a subset of applicants only replaces those applicants' rows and
+    keeps everyone else's.
+    """
+    if df is None or df.empty:
+        return 0
+    out = df.assign(run_date=run_date)
+    out["forecast_start"] = pd.to_datetime(out["forecast_start"]).astype("datetime64[s]")
+    with _forecasts_lock:
+        if not replace:
+            existing = read_forecasts(run_date=run_date, root=root)
+            existing = existing[~existing["application_id"].isin(out["application_id"])]
+            if len(existing):
+                out = pd.concat([existing, out[FORECAST_SCHEMA.names]], ignore_index=True)
+        table = pa.Table.from_pandas(out[FORECAST_SCHEMA.names], schema=FORECAST_SCHEMA, preserve_index=False)
+        pq.write_to_dataset(
+            table,
+            root_path=root,
+            partition_cols=["run_date"],
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior="delete_matching",
+        )
+    return len(df)
+
+
+def read_forecasts(application_ids: Optional[Sequence[str]] = None, run_date: Optional[str] = None,
+                   root: str = FORECASTS_ROOT) -> pd.DataFrame:
+    """Reads batch forecasts; defaults to the most recent run."""
+    if not os.path.isdir(root):
+        return pd.DataFrame(columns=FORECAST_SCHEMA.names)
+    if run_date is None:
+        runs = sorted(d.split("=", 1)[1] for d in os.listdir(root) if d.startswith("run_date="))
+        if not runs:
+            return pd.DataFrame(columns=FORECAST_SCHEMA.names)
+        run_date = runs[-1]
+    predicates = [("run_date", "=", run_date)]
+    if application_ids is not None:
+        predicates.append(("application_id", "in", list(application_ids)))
+    return pq.read_table(root, filters=predicates, schema=FORECAST_SCHEMA, partitioning="hive").to_pandas()
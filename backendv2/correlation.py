@@ -1,91 +1,255 @@
+import os
+import threading
+from dataclasses import dataclass
+from typing import List
+
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import os
+
+from frame_store import store
+from columnar_store import load_application
+from charts import charts
+
+# Rows with no linked account (bank statements, offline records) are the applicant's own
+PRIMARY_ACCOUNT = 'primary'
+
+# application_id -> ((frame store version, min_months), correlation report)
+_reports = {}
+_reports_lock = threading.Lock()
+
+def _drop_report(application_id):
+    with _reports_lock:
+        _reports.pop(application_id, None)
+
+store.add_eviction_listener(_drop_report)
+
+@dataclass
+class SpendTensor:
+    """Monthly spend per account and category, aligned on a shared month and category axis."""
+    months: List[str]
+    accounts: List[str]
+    categories: List[str]
+    values: np.ndarray  # shape (months, accounts, categories)
+
+    def totals(self) -> np.ndarray:
+        """Months x accounts total spend."""
+        return self.values.sum(axis=2)
+
+def build_spend_tensor(df, outflow_only=True):
+    """Builds the month x account x category tensor for every account in one pass.
+
+    `df` needs date, amount, category and account columns. With outflow_only
+    only debits count (as positive spend); otherwise amounts are summed as-is.
+    Months without activity are zero-filled so every account shares one axis.
+    """
+    frame = df[['date', 'amount', 'category', 'account']].copy()
+    frame['date'] = pd.to_datetime(frame['date'], errors='coerce')
+    frame['amount'] = pd.to_numeric(frame['amount'], errors='coerce')
+    frame = frame.dropna(subset=['date', 'amount'])
+    if outflow_only:
+        frame = frame[frame['amount'] < 0].assign(amount=lambda f: -f['amount'])
+    if frame.empty:
+        return SpendTensor([], [], [], np.zeros((0, 0, 0)))
+
+    month_number = (frame['date'].dt.year * 12 + frame['date'].dt.month - 1).to_numpy()
+    first = int(month_number.min())
+    n_months = int(month_number.max()) - first + 1
+    account_codes, accounts = pd.factorize(frame['account'].fillna(PRIMARY_ACCOUNT).astype(str), sort=True)
+    category_codes, categories = pd.factorize(frame['category'].fillna('other').astype(str), sort=True)
+
+    flat = ((month_number - first) * len(accounts) + account_codes) * len(categories) + category_codes
+    values = np.bincount(flat, weights=frame['amount'].to_numpy(dtype='float64'),
+                         minlength=n_months * len(accounts) * len(categories))
+    months = [f'{(first + i) // 12:04d}-{(first + i) % 12 + 1:02d}' for i in range(n_months)]
+    return SpendTensor(months, list(accounts), list(categories),
+                       values.reshape(n_months, len(accounts), len(categories)))
+
+def pairwise_correlations(series):
+    """Pearson correlation between every pair of accounts, for each series at once.
+
+    `series` has shape (months, accounts, k); the result has shape
+    (k, accounts, accounts). Accounts with no variation in a series get NaN.
+    """
+    centered = series - series.mean(axis=0)
+    std = np.sqrt((centered ** 2).mean(axis=0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = np.where(std > 0, centered / std, np.nan)
+    return np.einsum('mak,mbk->kab', z, z) / series.shape[0]
+
+def _clean(matrix):
+    return [[None if not np.isfinite(v) else round(float(v), 4) for v in row] for row in matrix]
+
+def correlate_accounts(tensor, min_months=3, account_info=None):
+    """Correlation report for every pair of accounts in a SpendTensor.
+
+    Overall spend and each category are correlated in the same vectorized
+    pass. `account_info` maps an account to extra metadata (relationship,
+    is_own) to include in the report.
+    """
+    account_info = account_info or {}
+    report = {
+        'months': tensor.months,
+        'categories': tensor.categories,
+        'accounts': [
+            {'account': a, 'total_outflow': round(float(tensor.values[:, i, :].sum()), 2), **account_info.get(a, {})}
+            for i, a in enumerate(tensor.accounts)
+        ],
+        'overall': [],
+        'by_category': {},
+        'pairs': [],
+    }
+    if len(tensor.months) < min_months or len(tensor.accounts) < 2:
+        return report
+
+    series = np.concatenate([tensor.totals()[:, :, None], tensor.values], axis=2)
+    matrices = pairwise_correlations(series)
+    overall, by_category = matrices[0], matrices[1:]
+    report['overall'] = _clean(overall)
+    report['by_category'] = {c: _clean(by_category[k]) for k, c in enumerate(tensor.categories)}
+
+    upper_a, upper_b = np.triu_indices(len(tensor.accounts), k=1)
+    for a, b in zip(upper_a, upper_b):
+        categories = {c: round(float(by_category[k, a, b]), 4)
+                      for k, c in enumerate(tensor.categories) if np.isfinite(by_category[k, a, b])}
+        report['pairs'].append({
+            'accounts': [tensor.accounts[a], tensor.accounts[b]],
+            'overall': round(float(overall[a, b]), 4) if np.isfinite(overall[a, b]) else None,
+            'categories': categories,
+        })
+    report['pairs'].sort(key=lambda p: abs(p['overall']) if p['overall'] is not None else -1, reverse=True)
+    return report
+
+def application_account_info(application):
+    """relationship / is_own metadata per linked UPI ID from an application record."""
+    info = {PRIMARY_ACCOUNT: {'relationship': 'self', 'is_own': True}}
+    application = application or {}
+    for upi_id, is_own, relationship in zip(application.get('upi_ids') or [], application.get('is_own') or [],
+                                            application.get('relationships') or []):
+        info[upi_id] = {
+            'relationship': relationship or None,
+            'is_own': str(is_own).strip().lower() in ('yes', 'true', '1'),
+        }
+    return info
+
+def application_correlations(application_id, min_months=3):
+    """Cached correlation report across all of an application's linked accounts.
+
+    The report is rebuilt only when the application's transactions change.
+    """
+    df, version = store.get_frame(application_id)
+    with _reports_lock:
+        cached = _reports.get(application_id)
+        if cached and cached[0] == (version, min_months):
+            return cached[1]
+    info = application_account_info(load_application(application_id))
+    if 'account' not in df.columns:
+        df = df.assign(account=None)
+    tensor = build_spend_tensor(df)
+    report = correlate_accounts(tensor, min_months, info)
+    report['charts'] = charts.register_all(account_comparison_charts(tensor, report))
+    with _reports_lock:
+        if store.current_version(application_id) == version:
+            _reports[application_id] = ((version, min_months), report)
+    return report
+
+def monthly_outflow_by_account(df):
+    """Months x accounts DataFrame of total outflow; months with no activity count as zero."""
+    tensor = build_spend_tensor(df)
+    return pd.DataFrame(tensor.totals(), index=pd.PeriodIndex(tensor.months, freq='M'), columns=tensor.accounts)
+
+def related_party_correlation(df, own_accounts, min_months=3):
+    """Mean correlation of monthly outflow between the applicant's own accounts and linked ones.
+
+    Returns None when there is no own/linked pair or too few months to correlate.
+    """
+    if df is None or df.empty or 'account' not in df.columns:
+        return None
+    tensor = build_spend_tensor(df)
+    if len(tensor.months) < min_months:
+        return None
+    own_set = set(own_accounts) | {PRIMARY_ACCOUNT}
+    own = [i for i, a in enumerate(tensor.accounts) if a in own_set]
+    linked = [i for i, a in enumerate(tensor.accounts) if a not in own_set]
+    if not own or not linked:
+        return None
+    correlations = pairwise_correlations(tensor.totals()[:, :, None])[0][np.ix_(own, linked)]
+    correlations = correlations[np.isfinite(correlations)]
+    return float(correlations.mean()) if correlations.size else None
+
+def compare_account_files(csv_paths, output_dir='transaction_analysis', plot=True):
+    """Correlates spending across any number of exported CSVs, keyed by a display name.
+
+    Each file is read once; all pairs are correlated from the shared tensor.
+    With plot, the charts are also rendered into output_dir.
+    """
+    frames = [pd.read_csv(path).assign(account=name) for name, path in csv_paths.items()]
+    tensor = build_spend_tensor(pd.concat(frames, ignore_index=True), outflow_only=False)
+    report = correlate_accounts(tensor, min_months=2)
+    specs = account_comparison_charts(tensor, report)
+    report['charts'] = charts.register_all(specs)
+    if plot:
+        for spec in specs:
+            name = spec['title'].lower().replace(' ', '_').replace('-', '_')
+            charts.save(spec, os.path.join(output_dir, f'{name}.png'))
+
+    print("\nPairwise Spending Correlation:")
+    for pair in report['pairs']:
+        print(f"{pair['accounts'][0]} vs {pair['accounts'][1]}: {pair['overall']}")
+    print("\nTotal Spending by Account:")
+    for account in report['accounts']:
+        print(f"{account['account']}: {account['total_outflow']}")
+    return report
+
+def account_comparison_charts(tensor, report):
+    """Chart specs for an account comparison; rendered lazily by the chart service."""
+    months = [f'{m}-01' for m in tensor.months]
+    totals = tensor.totals()
+    specs = []
+    if report['pairs']:
+        specs.append({
+            'title': 'Correlation of Spending Categories between Accounts',
+            'panels': [{
+                'type': 'bar',
+                'x': tensor.categories,
+                'series': [{'label': ' vs '.join(p['accounts']),
+                            'y': [p['categories'].get(c, 0.0) for c in tensor.categories]}
+                           for p in report['pairs']],
+                'xlabel': 'Categories',
+                'ylabel': 'Correlation Coefficient',
+                'rotate_xticks': 45,
+                'legend': True,
+            }],
+        })
+    specs.append({
+        'title': 'Monthly Total Spending Comparison',
+        'size': [14, 7],
+        'panels': [{
+            'x': months,
+            'x_dates': True,
+            'series': [{'label': a, 'y': totals[:, i].round(2).tolist(), 'marker': 'o'}
+                       for i, a in enumerate(tensor.accounts)],
+            'xlabel': 'Month',
+            'ylabel': 'Total Spending',
+            'legend': True,
+        }],
+    })
+    specs.append({
+        'title': 'Category-wise Monthly Spending Comparison',
+        'size': [15, 8],
+        'panels': [{
+            'x': months,
+            'x_dates': True,
+            'series': [{'label': f'{a} {c}', 'y': tensor.values[:, i, k].round(2).tolist(), 'alpha': 0.5}
+                       for i, a in enumerate(tensor.accounts) for k, c in enumerate(tensor.categories)],
+            'xlabel': 'Month',
+            'ylabel': 'Spending Amount',
+            'legend': 'outside',
+        }],
+    })
+    return specs
 
 def analyze_transactions_comparison(manish_csv, brother_csv):
-    # Ensure output directory exists
-    os.makedirs('transaction_analysis', exist_ok=True)
-    
-    # Read CSV files
-    df_manish = pd.read_csv(manish_csv, parse_dates=['date'])
-    df_brother = pd.read_csv(brother_csv, parse_dates=['date'])
-    
-    # Group by month and category, calculate total spending
-    df_manish_monthly = df_manish.groupby([df_manish['date'].dt.to_period('M'), 'category'])['amount'].sum().unstack(fill_value=0)
-    df_brother_monthly = df_brother.groupby([df_brother['date'].dt.to_period('M'), 'category'])['amount'].sum().unstack(fill_value=0)
-    
-    # Convert Period index to datetime for plotting
-    df_manish_monthly.index = df_manish_monthly.index.to_timestamp()
-    df_brother_monthly.index = df_brother_monthly.index.to_timestamp()
-    
-    # Ensure both DataFrames have the same categories
-    common_categories = list(set(df_manish_monthly.columns) & set(df_brother_monthly.columns))
-    df_manish_monthly = df_manish_monthly[common_categories]
-    df_brother_monthly = df_brother_monthly[common_categories]
-    
-    # Correlation of monthly spending by category
-    correlation_matrix = df_manish_monthly.corrwith(df_brother_monthly)
-    
-    # Visualization 1: Correlation Bar Plot
-    plt.figure(figsize=(12, 6))
-    correlation_matrix.plot(kind='bar')
-    plt.title('Correlation of Spending Categories between Manish and Brother')
-    plt.xlabel('Categories')
-    plt.ylabel('Correlation Coefficient')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig('transaction_analysis/category_correlation.png')
-    plt.close()
-    
-    # Visualization 2: Monthly Spending Comparison
-    plt.figure(figsize=(14, 7))
-    df_manish_monthly.sum(axis=1).plot(label='Manish', marker='o')
-    df_brother_monthly.sum(axis=1).plot(label='Brother', marker='x')
-    plt.title('Monthly Total Spending Comparison')
-    plt.xlabel('Month')
-    plt.ylabel('Total Spending')
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig('transaction_analysis/monthly_spending_comparison.png')
-    plt.close()
-    
-    # Visualization 3: Category-wise Spending Comparison
-    plt.figure(figsize=(15, 8))
-    for category in common_categories:
-        plt.plot(df_manish_monthly.index, df_manish_monthly[category], 
-                 label=f'Manish {category}', alpha=0.5)
-        plt.plot(df_brother_monthly.index, df_brother_monthly[category], 
-                 label=f'Brother {category}', linestyle='--', alpha=0.5)
-    plt.title('Category-wise Monthly Spending Comparison')
-    plt.xlabel('Month')
-    plt.ylabel('Spending Amount')
-    plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
-    plt.tight_layout()
-    plt.savefig('transaction_analysis/category_spending_comparison.png')
-    plt.close()
-    
-    # Print detailed analysis
-    print("\nSpending Category Correlation Analysis:")
-    print(correlation_matrix)
-    
-    # Overall spending correlation
-    overall_correlation = np.corrcoef(df_manish_monthly.sum(axis=1), df_brother_monthly.sum(axis=1))[0, 1]
-    print(f"\nOverall Monthly Spending Correlation: {overall_correlation:.4f}")
-    
-    # Total spending by category
-    print("\nManish - Total Spending by Category:")
-    print(df_manish_monthly.sum())
-    print("\nBrother - Total Spending by Category:")
-    print(df_brother_monthly.sum())
-    
-    # Aggregate statistics
-    print("\nAggregate Statistics:")
-    print("Manish Total Spending:", df_manish['amount'].sum())
-    print("Brother Total Spending:", df_brother['amount'].sum())
-    print("Manish Average Transaction:", df_manish['amount'].mean())
-    print("Brother Average Transaction:", df_brother['amount'].mean())
+    return compare_account_files({'Manish': manish_csv, 'Brother': brother_csv})
 
 def main():
     # Prompt for file paths
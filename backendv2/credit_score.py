@@ -0,0 +1,60 @@
+import math
+from typing import Dict, Optional
+
+# Logistic scorecard over feature_store features. Missing features take the
+# neutral value below so thin files are neither rewarded nor punished.
+INTERCEPT = -1.0
+WEIGHTS = {
+    "income_regularity": 1.5,
+    "savings_rate": 1.2,
+    "positive_month_ratio": 0.8,
+    "essential_share": 0.4,
+    "outflow_stability": 0.6,
+    "recurring_adherence": 0.8,
+    "emi_burden": -1.5,
+    "related_party_correlation": 0.3,
+    "history_months": 0.7,
+}
+NEUTRAL = {
+    "income_regularity": 0.5,
+    "savings_rate": 0.0,
+    "positive_month_ratio": 0.5,
+    "essential_share": 0.5,
+    "outflow_stability": 0.5,
+    "recurring_adherence": 0.5,
+    "emi_burden": 0.3,
+    "related_party_correlation": 0.0,
+    "history_months": 0.0,
+}
+
+SCORE_MIN, SCORE_MAX = 300, 900
+BANDS = [(750, "excellent"), (700, "good"), (650, "fair"), (550, "weak"), (SCORE_MIN, "poor")]
+
+
+def _band(score: int) -> str:
+    for floor, label in BANDS:
+        if score >= floor:
+            return label
+    return BANDS[-1][1]
+
+
+def score_features(features: Dict[str, Optional[float]]) -> Dict:
+    """Scores a feature vector; returns the score, its band and each feature's contribution."""
+    logit = INTERCEPT
+    factors = []
+    for name, weight in WEIGHTS.items():
+        value = features.get(name)
+        used = NEUTRAL[name] if value is None else value
+        contribution = weight * used
+        logit += contribution
+        factors.append({"feature": name, "value": value, "contribution": round(contribution, 4)})
+    probability = 1 / (1 + math.exp(-logit))
+    score = int(round(SCORE_MIN + probability * (SCORE_MAX - SCORE_MIN)))
+    factors.sort(key=lambda f: abs(f["contribution"]), reverse=True)
+    return {
+        "score": score,
+        "band": _band(score),
+        "probability": round(probability, 4),
+        "factors": factors,
+        "missingFeatures": [name for name in WEIGHTS if features.get(name) is None],
+    }
@@ -1,8 +1,12 @@
 import os
+import json
 import yaml
-import pandas as pd
+import threading
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_experimental.agents import create_pandas_dataframe_agent
+from frame_store import store
+from insights import compute_insights
+from llm_client import gemini_api_key
 
 def load_config(file_path='config.yaml'):
     with open(file_path, 'r') as file:
@@ -12,37 +16,56 @@ def load_config(file_path='config.yaml'):
 
 load_config()
 
-def initialize_agent():
-    llm = ChatGoogleGenerativeAI(
-        google_api_key=os.environ["GEM_KEY"],
-        model="gemini-1.5-pro-002",
-        temperature=0
-    )
-    
-    print("Loading CSV files...")
-    csv_files = [file for file in os.listdir("./all_csvs") if file.endswith('.csv')]
-    dataframes = []
-    for file in csv_files:
-        path = f"./all_csvs/{file}"
-        print(path)
-        df = pd.read_csv(path)
-        print('accessed')
-        dataframes.append(df)
+# application_id -> (frame store version, agent)
+_agents = {}
+_agents_lock = threading.Lock()
+_llm = None
+
+def _drop_agent(application_id: str):
+    with _agents_lock:
+        _agents.pop(application_id, None)
+
+# an agent holds a reference to its frame, so it must go when the frame does
+store.add_eviction_listener(_drop_agent)
+
+def get_llm():
+    global _llm
+    if _llm is None:
+        _llm = ChatGoogleGenerativeAI(
+            google_api_key=gemini_api_key(),
+            model="gemini-1.5-pro-002",
+            temperature=0
+        )
+    return _llm
+
+def initialize_agent(application_id: str):
+    df, version = store.get_frame(application_id)
+    with _agents_lock:
+        cached = _agents.get(application_id)
+        if cached and cached[0] == version:
+            return cached[1]
+    if df.empty:
+        raise ValueError(f"No transaction data found for application {application_id}")
     
-    return create_pandas_dataframe_agent(
-        llm,
-        dataframes,
+    agent = create_pandas_dataframe_agent(
+        get_llm(),
+        df,
         verbose=True,
         allow_dangerous_code=True
     )
-
-def query_transactions(question: str) -> str:
-    agent = initialize_agent()
+    with _agents_lock:
+        # skip caching if the frame was evicted or replaced while the agent was built
+        if store.current_version(application_id) == version:
+            _agents[application_id] = (version, agent)
+    return agent
+
+def query_transactions(application_id: str, question: str) -> str:
+    agent = initialize_agent(application_id)
     response = agent.invoke({"input": question})
     return response['output']
 
-def generate_detailed_report() -> str:
-    agent = initialize_agent()
+def generate_detailed_report(application_id: str) -> str:
+    agent = initialize_agent(application_id)
     report_prompt =  """Analyze the transaction records in the provided dataframes. Use the raw data to provide insights, without making assumptions beyond the given data. If specific details cannot be determined due to insufficient data, mention this explicitly. Address the following sections in detail:
 
 1. **INCOME PATTERNS**
@@ -68,6 +91,12 @@ def generate_detailed_report() -> str:
 
 Include specific details like counts, percentages, or averages from the CSVs. Avoid processing or transforming date strings beyond their raw representation.."""
     
+    # The numeric sections are computed up front so the agent only has to
+    # interpret them instead of writing pandas code to derive them.
+    df, _ = store.get_frame(application_id)
+    metrics = json.dumps(compute_insights(df), indent=2)
+    report_prompt += f"\n\nUse these precomputed metrics as the source of truth for all figures:\n{metrics}"
+    
     response = agent.invoke({"input": report_prompt})
     return response['output']
 
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+from frame_store import store
+from insights import compute_insights
+from columnar_store import load_application
+from correlation import related_party_correlation
+
+DEFAULT_FEATURE_DB = os.environ.get("UDAN_FEATURE_DB", "./cache/features.sqlite3")
+# Bump when a feature definition changes so stale vectors are recomputed
+FEATURE_VERSION = "v2"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS features (
+    application_id TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    features TEXT NOT NULL,
+    computed_at REAL NOT NULL
+);
+"""
+
+
+def _ratio(value, default=None, low=0.0, high=1.0):
+    if value is None or not np.isfinite(value):
+        return default
+    return float(min(high, max(low, value)))
+
+
+def own_accounts(application: Dict):
+    upi_ids = application.get("upi_ids") or []
+    is_own = application.get("is_own") or []
+    return [u for u, own in zip(upi_ids, is_own) if str(own).strip().lower() in ("yes", "true", "1")]
+
+
+def build_features(application_id: str) -> Dict[str, Optional[float]]:
+    """Computes the applicant's scoring features from their stored transactions."""
+    df, _ = store.get_frame(application_id)
+    insights = compute_insights(df)
+    income, spending = insights["income"], insights["spending"]
+    cash_flow, stability = insights["cash_flow"], insights["stability"]
+    reliability = insights["reliability"]
+
+    months = cash_flow["months_observed"]
+    income_ratio = income["income_month_ratio"]
+    inflow_cv = income["inflow_cv"]
+    avg_inflow = income["avg_monthly_inflow"]
+    recurring_debits = [p for p in reliability["payments"] if p["direction"] == "debit"]
+    application = load_application(application_id) or {}
+
+    return {
+        "income_regularity": (
+            _ratio(income_ratio * (1 - min(inflow_cv, 1.0))) if income_ratio is not None and inflow_cv is not None
+            else None
+        ),
+        "savings_rate": _ratio(cash_flow["savings_rate"], low=-1.0),
+        "positive_month_ratio": _ratio(cash_flow["positive_months"] / months) if months else None,
+        "essential_share": _ratio(spending["essential_share"]),
+        "outflow_stability": _ratio(1 - stability["outflow_cv"]) if stability["outflow_cv"] is not None else None,
+        "recurring_adherence": (
+            _ratio(float(np.mean([p["regularity"] for p in recurring_debits]))) if recurring_debits else None
+        ),
+        "emi_burden": (
+            _ratio(reliability["monthly_committed_outflow"] / avg_inflow, high=2.0) if avg_inflow else None
+        ),
+        "related_party_correlation": _ratio(
+            related_party_correlation(df, own_accounts(application)), low=-1.0
+        ) if len(df) else None,
+        "history_months": _ratio(months / 12.0) if months else None,
+        "transaction_count": float(insights["total_transactions"]),
+    }
+
+
+class FeatureStore:
+    """Per-application feature vectors, computed at ingestion and read at scoring time."""
+
+    def __init__(self, path: str = DEFAULT_FEATURE_DB):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, application_id: str) -> Optional[Dict]:
+        row = self._connect().execute(
+            "SELECT features, computed_at FROM features WHERE application_id=? AND version=?",
+            (application_id, FEATURE_VERSION),
+        ).fetchone()
+        if row is None:
+            return None
+        return {"features": json.loads(row[0]), "computedAt": row[1]}
+
+    def put(self, application_id: str, features: Dict) -> Dict:
+        now = time.time()
+        self._connect().execute(
+            "INSERT OR REPLACE INTO features (application_id, version, features, computed_at) VALUES (?, ?, ?, ?)",
+            (application_id, FEATURE_VERSION, json.dumps(features), now),
+        )
+        return {"features": features, "computedAt": now}
+
+    def refresh(self, application_id: str) -> Dict:
+        return self.put(application_id, build_features(application_id))
+
+    def get_or_build(self, application_id: str) -> Dict:
+        return self.get(application_id) or self.refresh(application_id)
+
+
+features = FeatureStore()
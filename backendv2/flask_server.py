@@ -1,12 +1,29 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from upi_organizer import UPIDataProcessor
-import pandas as pd
 import os
+import json
+import threading
+import tempfile
 from datetime import datetime
 from csv_agent import query_transactions, generate_detailed_report
+from job_queue import JobQueue
+from workspace import get_workspace
+from columnar_store import save_application, load_application, delete_transactions
+from frame_store import store
+from insights import compute_insights
+from recurring import detect_recurring, summarize_recurring
+from correlation import application_correlations
+from charts import charts, FORMATS as CHART_FORMATS
+from forecasting import forecaster, forecast_portfolio, DEFAULT_HORIZON, MAX_HORIZON
+from feature_store import features
+from credit_score import score_features
+from llm_client import all_metrics
+from uploads import stream_request_upload, UploadError, MAX_REQUEST_BYTES
+from llm_csv import ExtractionIncomplete
 
 app = Flask(__name__)
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
 # Update CORS configuration to explicitly allow localhost:3000
 CORS(app, resources={
     r"/api/*": {
@@ -16,41 +33,83 @@ CORS(app, resources={
     }
 })
 
-processor = UPIDataProcessor()
-user_upi_id = []
-application_id = ''
-if not os.path.exists('all_csvs'):
-    os.makedirs('all_csvs')
+# Built on first use rather than at import: chart and PDF workers are spawned
+# processes that re-import this module as __mp_main__, and must not construct
+# an analyzer or a job queue of their own.
+_processor = None
+_job_queue = None
+_lazy_lock = threading.Lock()
+
+def get_processor():
+    global _processor
+    with _lazy_lock:
+        if _processor is None:
+            _processor = UPIDataProcessor()
+        return _processor
+
+def parse_horizon(value):
+    """Forecast horizon in days from a request or job payload; raises ValueError when out of range."""
+    horizon = int(DEFAULT_HORIZON if value is None else value)
+    if not 1 <= horizon <= MAX_HORIZON:
+        raise ValueError(f"horizon must be between 1 and {MAX_HORIZON} days")
+    return horizon
+
+def request_workspace():
+    """Resolves the calling application's workspace from the JSON body or query string."""
+    data = request.get_json(silent=True) or {}
+    application_id = data.get('applicationId') or request.args.get('applicationId')
+    if not application_id:
+        raise ValueError("applicationId is required")
+    return get_workspace(application_id)
+
 @app.route('/api/accepttext', methods=['GET', 'POST'])
 def set_upi():
-    global user_upi_id
+    try:
+        workspace = request_workspace()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     if request.method == 'GET':
-        if user_upi_id:
-            return jsonify({"message": "UPI ID is set, adding one more", "upiId": user_upi_id}), 200
+        if workspace.upi_ids:
+            return jsonify({"message": "UPI ID is set, adding one more", "upiId": workspace.upi_ids}), 200
         return jsonify({"error": "UPI ID not set"}), 400
         
     # Existing POST logic
     data = request.get_json()
-    user_upi_id = data.get('upiId')
-    return jsonify({"message": "UPI ID set successfully", "upiId": user_upi_id}), 200
+    upi_ids = workspace.add_upi_id(data.get('upiId'))
+    return jsonify({"message": "UPI ID set successfully", "upiId": upi_ids}), 200
+
+# Rows shown per file while an analysis job runs; the full set is served by /api/transactions
+PREVIEW_ROWS = 20
+MAX_PAGE_ROWS = 1000
 
 UPLOAD_FOLDER = "uploaded_files"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 @app.route('/api/submit-loan-application', methods=['POST'])
 def submit_loan_application():
+    # path -> extract job, queued as soon as each file's upload completes
+    extract_jobs = {}
+    def queue_extraction(uploaded_file):
+        if uploaded_file.path not in extract_jobs:
+            extract_jobs[uploaded_file.path] = get_job_queue().enqueue('extract', {'path': uploaded_file.path})
     try:
+        # Files are streamed into the blob store as they arrive
+        form, uploaded = stream_request_upload(request, on_file=queue_extraction)
+        uploads_by_field = {}
+        for f in uploaded:
+            uploads_by_field.setdefault(f.field, []).append(f.path)
+
         # Basic form data
         form_data = {
-            'loanPurpose': request.form.get('loanPurpose'),
-            'incomeSource': request.form.get('incomeSource'),
-            'useUpi': request.form.get('useUpi'),
+            'loanPurpose': form.get('loanPurpose'),
+            'incomeSource': form.get('incomeSource'),
+            'useUpi': form.get('useUpi'),
             #'upiEntries': upi_entries
         }
 
         # Dynamic UPI entries handling
         upi_entries = []
-        form_keys = request.form.keys()
+        form_keys = form.keys()
         
         # Get the number of UPI entries from the form structure
         max_index = -1
@@ -62,114 +121,343 @@ def submit_loan_application():
         # Initialize entries
         for i in range(max_index + 1):
             entry = {
-                'upiId': request.form.get(f'upiEntries[{i}][upiId]', ''),
-                'isOwn': request.form.get(f'upiEntries[{i}][isOwn]', ''),
-                'relationship': request.form.get(f'upiEntries[{i}][relationship]', ''),
-                'frequency': request.form.get(f'upiEntries[{i}][frequency]', '')
+                'upiId': form.get(f'upiEntries[{i}][upiId]', ''),
+                'isOwn': form.get(f'upiEntries[{i}][isOwn]', ''),
+                'relationship': form.get(f'upiEntries[{i}][relationship]', ''),
+                'frequency': form.get(f'upiEntries[{i}][frequency]', '')
             }
             upi_entries.append(entry)
             print(upi_entries)
 
         saved_files = []
+        file_accounts = []
         
-        # Save UPI transaction files
+        # UPI transaction files
         for i, entry in enumerate(upi_entries):
-            file_key = f'upiEntries[{i}][transactionFile]'
-            if file_key in request.files:
-                file = request.files[file_key]
-                filename = f"upi_transaction_{i}_{file.filename}"
-                filepath = os.path.join(UPLOAD_FOLDER, filename)
-                file.save(filepath)
-                saved_files.append(filepath)
-
-        # Save other files
-        for file_key, folder_name in [('offlineRecords', 'offline_records'), 
-                                    ('documents', 'identity_documents')]:
-            if file_key in request.files:
-                files = request.files.getlist(file_key)
-                for file in files:
-                    filename = f"{file.filename}"
-                    filepath = os.path.join(UPLOAD_FOLDER, folder_name, filename)
-                    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-                    file.save(filepath)
-                    saved_files.append(filepath)
-
-        # Save form data CSV
-        # Save form data CSV
+            entry_files = uploads_by_field.get(f'upiEntries[{i}][transactionFile]', [])
+            saved_files.extend(entry_files)
+            file_accounts.extend([entry['upiId'] or None] * len(entry_files))
+
+        # Other files
+        for file_key in ('offlineRecords', 'documents'):
+            saved_files.extend(uploads_by_field.get(file_key, []))
+            file_accounts.extend([None] * len(uploads_by_field.get(file_key, [])))
+
+        # Save form data as a typed Parquet record
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        csv_file_path = os.path.join(UPLOAD_FOLDER, f"loan_application_{timestamp}.csv")
 
         # Create a dictionary with all form data including UPI entries
-        csv_data = {
+        application_data = {
             **form_data,
             'files': saved_files,
+            'file_accounts': file_accounts,
             'upi_ids': [entry['upiId'] for entry in upi_entries],
             'is_own': [entry['isOwn'] for entry in upi_entries],
             'relationships': [entry['relationship'] for entry in upi_entries],
             'frequencies': [entry['frequency'] for entry in upi_entries]
         }
 
-        pd.DataFrame([csv_data]).to_csv(csv_file_path, index=False)
+        save_application(timestamp, application_data)
+        get_workspace(timestamp).update_meta(upi_ids=application_data['upi_ids'])
         return jsonify({
             "message": "Application submitted successfully",
             "applicationId": timestamp,
             "savedFiles": saved_files
         }), 200
 
+    except UploadError as e:
+        cancel_extractions(extract_jobs, str(e))
+        return jsonify({"error": str(e)}), e.status
     except Exception as e:
+        cancel_extractions(extract_jobs, str(e))
         return jsonify({"error": str(e)}), 500
 
+def cancel_extractions(extract_jobs, reason):
+    """Withdraws extract jobs queued for a submission that was then rejected.
+
+    A job a worker already picked up runs to completion; its memoized result
+    only speeds up a retried upload of the same file.
+    """
+    for job_id in extract_jobs.values():
+        get_job_queue().cancel(job_id, f"Upload rejected: {reason}")
+
+def run_analysis_job(payload, reporter):
+    workspace = get_workspace(payload['applicationId'])
+    application_data = load_application(payload['applicationId'])
+    files = application_data['files']
+    accounts = application_data.get('file_accounts') or [None] * len(files)
+    reporter.set_files(files)
+    # Start from an empty dataset so a re-run or a recovered job does not append duplicates
+    delete_transactions(workspace.application_id)
+    
+    for file_path, account in zip(files, accounts):
+        reporter.file_started(file_path)
+        processed = []
+        preview = []
+        def on_chunk(chunk_df, file_path=file_path, preview=preview):
+            processed.append(len(chunk_df))
+            if len(preview) < PREVIEW_ROWS:
+                preview.extend(chunk_df.head(PREVIEW_ROWS - len(preview)).to_dict('records'))
+            reporter.file_progress(file_path, sum(processed), preview)
+        try:
+            normalized_path = os.path.normpath(file_path)
+            result = get_processor().process_document(normalized_path, output_dir=workspace.path('raw'),
+                                                application_id=workspace.application_id,
+                                                on_chunk=on_chunk, account=account)
+            reporter.file_done(file_path, result)
+        except ExtractionIncomplete as e:
+            reporter.file_partial(file_path, str(e))
+        except Exception as e:
+            reporter.file_failed(file_path, str(e))
+
+    # Precompute the scoring features so /api/social-credit is a lookup
+    try:
+        features.refresh(workspace.application_id)
+    except Exception as e:
+        print(f"[DEBUG] Feature refresh failed for {workspace.application_id}: {e}")
+    # Fold the new transactions into the persisted forecast model
+    try:
+        forecaster.model_for(workspace.application_id)
+    except Exception as e:
+        print(f"[DEBUG] Forecast update failed for {workspace.application_id}: {e}")
+
+def run_extraction_job(payload, reporter):
+    """Extracts a freshly uploaded file ahead of analysis so /api/analyze replays the memoized result."""
+    reporter.set_files([payload['path']])
+    reporter.file_started(payload['path'])
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            result = get_processor().process_document(payload['path'], output_dir=tmp)
+    except ExtractionIncomplete as e:
+        reporter.file_partial(payload['path'], str(e))
+        return
+    except Exception as e:
+        reporter.file_failed(payload['path'], str(e))
+        return
+    reporter.file_done(payload['path'], {**result, "file": payload['path'], "prefetched": True})
+
+def run_portfolio_forecast_job(payload, reporter):
+    """Batch re-forecast of every applicant (or payload['applicationIds']) into the forecasts dataset."""
+    reporter.set_files(['portfolio'])
+    reporter.file_started('portfolio')
+    summary = forecast_portfolio(payload.get('applicationIds'), parse_horizon(payload.get('horizon')))
+    reporter.file_done('portfolio', {
+        "applicants": int(len(summary)),
+        "profit": int((summary['outlook'] == 'profit').sum()) if len(summary) else 0,
+        "loss": int((summary['outlook'] == 'loss').sum()) if len(summary) else 0
+    })
+
+def get_job_queue():
+    global _job_queue
+    with _lazy_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(workers=int(os.environ.get('ANALYSIS_WORKERS', 2)))
+            _job_queue.register('analyze', run_analysis_job)
+            _job_queue.register('extract', run_extraction_job)
+            _job_queue.register('forecast_portfolio', run_portfolio_forecast_job)
+        return _job_queue
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze_application():
-    global application_id
     try:
-        application_id = request.json.get('applicationId')
-        csv_path = os.path.join(UPLOAD_FOLDER, f"loan_application_{application_id}.csv")
+        application_id = request_workspace().application_id
+        if load_application(application_id) is None:
+            return jsonify({"error": f"Unknown application {application_id}"}), 404
         
-        application_data = pd.read_csv(csv_path)
-        files = eval(application_data['files'][0])  # Convert string representation to list
+        job_id = get_job_queue().enqueue('analyze', {'applicationId': application_id})
+        return jsonify({
+            "message": "Analysis queued",
+            "jobId": job_id,
+            "statusUrl": f"/api/jobs/{job_id}"
+        }), 202
         
-        analysis_results = []
-        for file_path in files:
-            normalized_path = os.path.normpath(file_path)
-            result = processor.process_document(normalized_path)
-            analysis_results.append(result)
-            
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+@app.route('/api/insights', methods=['GET'])
+def get_insights():
+    try:
+        workspace = request_workspace()
+        df, _ = store.get_frame(workspace.application_id)
         return jsonify({
-            "message": "Analysis completed",
-            "results": analysis_results
+            "status": "success",
+            "insights": compute_insights(df)
         }), 200
-        
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/transactions', methods=['GET'])
+def get_transactions():
+    """Pages through an application's stored transactions."""
+    try:
+        workspace = request_workspace()
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', 100)), 1), MAX_PAGE_ROWS)
+        df, _ = store.get_frame(workspace.application_id)
+        page = df.iloc[offset:offset + limit]
+        return jsonify({
+            "status": "success",
+            "total": int(len(df)),
+            "offset": offset,
+            "transactions": json.loads(page.to_json(orient='records', date_format='iso'))
+        }), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/correlations', methods=['GET'])
+def get_correlations():
+    try:
+        workspace = request_workspace()
+        min_months = int(request.args.get('minMonths', 3))
+        return jsonify({
+            "status": "success",
+            "correlations": application_correlations(workspace.application_id, min_months)
+        }), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/charts/<chart_id>.<fmt>', methods=['GET'])
+def get_chart(chart_id, fmt):
+    """Serves a registered chart, rendering it on first request."""
+    try:
+        data = charts.render(chart_id, fmt)
+    except KeyError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    # ids are content hashes, so a chart never changes under its URL
+    return Response(data, mimetype=CHART_FORMATS[fmt],
+                    headers={'Cache-Control': 'public, max-age=31536000, immutable'})
+
+@app.route('/api/forecast', methods=['GET'])
+def get_forecast():
+    try:
+        workspace = request_workspace()
+        horizon = parse_horizon(request.args.get('horizon'))
+        forecast = forecaster.forecast(workspace.application_id, horizon)
+        if forecast is None:
+            return jsonify({"error": "No dated transactions to forecast from"}), 404
+        return jsonify({
+            "status": "success",
+            "forecast": forecast
+        }), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/forecast/portfolio', methods=['POST'])
+def forecast_all_applicants():
+    data = request.get_json(silent=True) or {}
+    application_ids = data.get('applicationIds')
+    try:
+        horizon = parse_horizon(data.get('horizon'))
+        if application_ids is not None and not (
+                isinstance(application_ids, list) and all(isinstance(a, str) for a in application_ids)):
+            raise ValueError("applicationIds must be a list of application IDs")
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    job_id = get_job_queue().enqueue('forecast_portfolio', {
+        'applicationIds': application_ids,
+        'horizon': horizon
+    })
+    return jsonify({
+        "message": "Portfolio forecast queued",
+        "jobId": job_id,
+        "statusUrl": f"/api/jobs/{job_id}"
+    }), 202
+
+@app.route('/api/social-credit', methods=['GET', 'POST'])
+def get_social_credit():
+    try:
+        workspace = request_workspace()
+        entry = features.get_or_build(workspace.application_id)
+        return jsonify({
+            "status": "success",
+            "applicationId": workspace.application_id,
+            "computedAt": entry["computedAt"],
+            "features": entry["features"],
+            **score_features(entry["features"])
+        }), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/recurring-payments', methods=['GET'])
+def get_recurring_payments():
+    try:
+        workspace = request_workspace()
+        df, _ = store.get_frame(workspace.application_id)
+        return jsonify({
+            "status": "success",
+            "recurring": summarize_recurring(detect_recurring(df))
+        }), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/llm-metrics', methods=['GET'])
+def get_llm_metrics():
+    return jsonify(all_metrics()), 200
+
 @app.route('/api/query-transactions', methods=['POST'])
 def analyze_transactions():
     try:
+        workspace = request_workspace()
         question = request.json.get('question')
-        result = query_transactions(question)
+        result = query_transactions(workspace.application_id, question)
         return jsonify({
             "status": "success",
             "result": result
         }), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/generate-report', methods=['GET'])
 def get_transaction_report():
     try:
-        report = generate_detailed_report()
+        workspace = request_workspace()
+        report = generate_detailed_report(workspace.application_id)
         
         from csv_agent import convert_text_to_pdf_beautified
         
-        convert_text_to_pdf_beautified(report, "report.pdf")
+        convert_text_to_pdf_beautified(report, workspace.path("report.pdf"))
         
         return jsonify({
             "status": "success",
             "report": report
         }), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500 
 
+DEBUG = True
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    # The debug reloader runs this file in a watcher process and again in the
+    # serving child; only the child (or a non-reloading run) starts workers.
+    if not DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        get_job_queue().start()
+    app.run(debug=DEBUG, port=5000)
@@ -0,0 +1,122 @@
+import os
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from workspace import get_workspace
+from columnar_store import normalize_frame, partition_files
+
+DEFAULT_MEMORY_BUDGET = int(os.environ.get("FRAME_STORE_BUDGET_MB", 512)) * 1024 * 1024
+
+
+class _ApplicationFrames:
+    def __init__(self):
+        self.files: Dict[str, Tuple[float, int, pd.DataFrame]] = {}
+        self.merged: Optional[pd.DataFrame] = None
+        self.version = 0
+        self.nbytes = 0
+
+
+class DataFrameStore:
+    """In-process cache of each application's transaction frame.
+
+    Sources are the application's Parquet partitions plus any legacy CSVs in
+    its workspace. Files are read once and re-read only when their mtime or
+    size changes.
+    Applications are evicted least-recently-used first once the combined
+    frames exceed the memory budget. Caches derived from a frame register an
+    eviction listener so they are released together with it.
+    """
+
+    def __init__(self, memory_budget: int = DEFAULT_MEMORY_BUDGET):
+        self.memory_budget = memory_budget
+        self._apps: "OrderedDict[str, _ApplicationFrames]" = OrderedDict()
+        self._lock = threading.RLock()
+        # global counter so a re-loaded application never reuses an old version
+        self._versions = itertools.count(1)
+        self._listeners: List[Callable[[str], None]] = []
+
+    def add_eviction_listener(self, callback: Callable[[str], None]):
+        """Calls callback(application_id) whenever an application's frames are dropped."""
+        self._listeners.append(callback)
+
+    def _notify(self, application_ids: List[str]):
+        # called outside self._lock so listeners may query the store
+        for application_id in application_ids:
+            for callback in self._listeners:
+                callback(application_id)
+
+    def current_version(self, application_id: str) -> Optional[int]:
+        """Version of the cached frame, or None if the application is not cached."""
+        with self._lock:
+            entry = self._apps.get(application_id)
+            return entry.version if entry is not None and entry.merged is not None else None
+
+    def _refresh(self, application_id: str, entry: _ApplicationFrames) -> bool:
+        paths = partition_files(application_id) + get_workspace(application_id).csv_files()
+        changed = False
+        for path in list(entry.files):
+            if path not in paths:
+                del entry.files[path]
+                changed = True
+        for path in paths:
+            stat = os.stat(path)
+            cached = entry.files.get(path)
+            if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+                continue
+            try:
+                if path.endswith(".parquet"):
+                    df = normalize_frame(pd.read_parquet(path))
+                else:
+                    df = normalize_frame(pd.read_csv(path))
+            except (pd.errors.EmptyDataError, pd.errors.ParserError, OSError) as e:
+                print(f"[DEBUG] Skipping unreadable file {path}: {e}")
+                df = normalize_frame(pd.DataFrame())
+            df["source_file"] = os.path.basename(path)
+            entry.files[path] = (stat.st_mtime, stat.st_size, df)
+            changed = True
+        return changed
+
+    def get_frame(self, application_id: str) -> Tuple[pd.DataFrame, int]:
+        """Returns (merged frame, version); version changes whenever the data does."""
+        evicted = []
+        with self._lock:
+            entry = self._apps.pop(application_id, None) or _ApplicationFrames()
+            self._apps[application_id] = entry  # most recently used goes last
+            if self._refresh(application_id, entry) or entry.merged is None:
+                frames = [df for _, _, df in entry.files.values()]
+                entry.merged = (
+                    pd.concat(frames, ignore_index=True) if frames
+                    else normalize_frame(pd.DataFrame())
+                )
+                # per-file frames are kept alongside the merged one
+                entry.nbytes = int(entry.merged.memory_usage(deep=True).sum()) * 2
+                entry.version = next(self._versions)
+                evicted = self._evict(keep=application_id)
+            merged, version = entry.merged, entry.version
+        self._notify(evicted)
+        return merged, version
+
+    def _evict(self, keep: str) -> List[str]:
+        evicted = []
+        total = sum(entry.nbytes for entry in self._apps.values())
+        for application_id in list(self._apps):
+            if total <= self.memory_budget:
+                break
+            if application_id == keep:
+                continue
+            total -= self._apps.pop(application_id).nbytes
+            evicted.append(application_id)
+            print(f"[DEBUG] Evicted cached frames for application {application_id}")
+        return evicted
+
+    def invalidate(self, application_id: str):
+        with self._lock:
+            self._apps.pop(application_id, None)
+        self._notify([application_id])
+
+
+store = DataFrameStore()
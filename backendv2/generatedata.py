@@ -1,11 +1,10 @@
 import random
 import datetime
-import matplotlib.pyplot as plt
 import os
 import pandas as pd
-import numpy as np
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
+
+from charts import charts
+from forecasting import forecast_frame, forecast_batch
 
 # Ensure output directory exists
 os.makedirs('transaction_analysis', exist_ok=True)
@@ -72,105 +71,70 @@ def save_transactions_to_csv(transactions, filename):
     df['date'] = pd.to_datetime(df['date'])
     df.to_csv(filename, index=False)
 
-def plot_detailed_transactions(transactions, title):
-    plt.figure(figsize=(20, 10))
-    
-    # Category-wise spending
-    plt.subplot(2, 2, 1)
+def transaction_summary_chart(transactions, title):
+    """Chart spec summarizing generated transactions; rendered by the chart service."""
     categories_data = {}
-    for t in transactions:
-        categories_data[t['category']] = categories_data.get(t['category'], 0) + t['amount']
-    
-    plt.pie(categories_data.values(), labels=categories_data.keys(), autopct='%1.1f%%')
-    plt.title(f'{title} - Expense Categories')
-    
-    # business transactions over time
-    plt.subplot(2, 2, 2)
-    business_transactions = [t for t in transactions if t['category'] == 'business']
-    business_amounts = [t['amount'] for t in business_transactions]
-    business_dates = [t['date'] for t in business_transactions]
-    plt.scatter(business_dates, business_amounts)
-    plt.title(f'{title} - business Transactions')
-    plt.xlabel('Date')
-    plt.ylabel('Amount (INR)')
-    plt.xticks(rotation=45)
-    
-    # Monthly total spending
-    plt.subplot(2, 2, 3)
+    category_frequency = {}
     monthly_spending = {}
     for t in transactions:
+        categories_data[t['category']] = categories_data.get(t['category'], 0) + t['amount']
+        category_frequency[t['category']] = category_frequency.get(t['category'], 0) + 1
         month_key = t['date'].strftime('%Y-%m')
         monthly_spending[month_key] = monthly_spending.get(month_key, 0) + t['amount']
-    
+    business_transactions = [t for t in transactions if t['category'] == 'business']
     months = sorted(monthly_spending.keys())
-    spending_values = [monthly_spending[month] for month in months]
-    plt.plot(months, spending_values, marker='o')
-    plt.title(f'{title} - Monthly Total Spending')
-    plt.xlabel('Month')
-    plt.ylabel('Total Amount (INR)')
-    plt.xticks(rotation=45)
-    
-    # Transaction frequency by category
-    plt.subplot(2, 2, 4)
-    category_frequency = {}
-    for t in transactions:
-        category_frequency[t['category']] = category_frequency.get(t['category'], 0) + 1
-    
-    plt.bar(category_frequency.keys(), category_frequency.values())
-    plt.title(f'{title} - Transaction Frequency')
-    plt.xlabel('Category')
-    plt.ylabel('Number of Transactions')
-    plt.xticks(rotation=45)
-    
-    plt.tight_layout()
-    
-    # Save the figure
-    filename = f'transaction_analysis/{title.lower().replace(" ", "_")}_analysis.png'
-    plt.savefig(filename, dpi=300, bbox_inches='tight')
-    plt.close()
 
-def predict_transactions(file_path):
-    # Load the dataset
+    return {
+        'size': [20, 10],
+        'layout': [2, 2],
+        'panels': [
+            # Category-wise spending
+            {'type': 'pie', 'x': list(categories_data.keys()),
+             'series': [{'y': list(categories_data.values())}],
+             'title': f'{title} - Expense Categories'},
+            # business transactions over time
+            {'type': 'scatter', 'x': [t['date'].isoformat() for t in business_transactions], 'x_dates': True,
+             'series': [{'y': [t['amount'] for t in business_transactions]}],
+             'title': f'{title} - business Transactions', 'xlabel': 'Date', 'ylabel': 'Amount (INR)',
+             'rotate_xticks': 45},
+            # Monthly total spending
+            {'x': months, 'series': [{'y': [monthly_spending[m] for m in months], 'marker': 'o'}],
+             'title': f'{title} - Monthly Total Spending', 'xlabel': 'Month', 'ylabel': 'Total Amount (INR)',
+             'rotate_xticks': 45},
+            # Transaction frequency by category
+            {'type': 'bar', 'x': list(category_frequency.keys()),
+             'series': [{'y': list(category_frequency.values())}],
+             'title': f'{title} - Transaction Frequency', 'xlabel': 'Category',
+             'ylabel': 'Number of Transactions', 'rotate_xticks': 45},
+        ],
+    }
+
+def history_chart(data):
+    """Chart spec of historical transaction amounts from a frame with date and amount columns."""
+    return {
+        'panels': [{
+            'x': data['date'].astype(str).tolist(),
+            'x_dates': True,
+            'series': [{'y': data['amount'].tolist(), 'marker': 'o', 'label': 'Actual Amount'}],
+            'title': 'Historical and Predicted Transactions',
+            'xlabel': 'Date',
+            'ylabel': 'Amount',
+            'legend': True,
+            'rotate_xticks': 45,
+        }],
+    }
+
+def load_history(file_path):
     data = pd.read_csv(file_path)
     
     # Convert the 'date' column to datetime and sort by date
     data['date'] = pd.to_datetime(data['date'])
-    data = data.sort_values('date').reset_index(drop=True)
-    
-    # Prepare data for Random Forest model
-    # Convert dates to numeric (days since start) for modeling
-    data['days'] = (data['date'] - data['date'].min()).dt.days
-    X = data[['days']]  # Feature
-    y = data['amount']  # Target
-    
-    # Split into training and test sets
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
-    # Train the Random Forest Regressor
-    model = RandomForestRegressor(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
-    
-    # Predict the amounts for the next month (30 days)
-    last_day = data['days'].max()
-    future_days = np.arange(last_day + 1, last_day + 31).reshape(-1, 1)
-    future_predictions = model.predict(future_days)
-    
-    # Calculate the total predicted amount for the next month
-    next_month_total = future_predictions.sum()
-    
-    # Create visualization of historical and predicted data
-    plt.figure(figsize=(12, 6))
-    plt.plot(data['date'], data['amount'], marker='o', label='Actual Amount')
-    future_dates = [data['date'].max() + pd.Timedelta(days=i) for i in range(1, 31)]
-    #plt.scatter(future_dates, future_predictions, color='red', label='Predicted Amount')
-    plt.title("Historical and Predicted Transactions")
-    plt.xlabel("Date")
-    plt.ylabel("Amount")
-    plt.legend()
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig('transaction_analysis/prediction_plot.png')
-    plt.close()
+    return data.sort_values('date').reset_index(drop=True)
+
+def predict_transactions(file_path):
+    # Load the dataset and forecast the next 30 days of net cash flow
+    result = forecast_frame(load_history(file_path))
+    next_month_total = result['next_period_total'] if result else 0.0
     
     # Print prediction results
     print(f"Total Predicted Amount for the Next Month: INR {next_month_total:.2f}")
@@ -193,15 +157,26 @@ def main():
     save_transactions_to_csv(brother_transactions, 'transaction_analysis/brother_transactions.csv')
     
     # Plot the transactions
-    plot_detailed_transactions(manish_transactions, "Manish's Transactions")
-    plot_detailed_transactions(brother_transactions, "Brother's Transactions")
-    
-    # Predict transactions for both Manish and his brother
-    print("Prediction for Manish's Transactions:")
-    manish_prediction = predict_transactions('transaction_analysis/manish_transactions.csv')
-    
-    print("\nPrediction for Brother's Transactions:")
-    brother_prediction = predict_transactions('transaction_analysis/brother_transactions.csv')
+    charts.save(transaction_summary_chart(manish_transactions, "Manish's Transactions"),
+                'transaction_analysis/manish\'s_transactions_analysis.png')
+    charts.save(transaction_summary_chart(brother_transactions, "Brother's Transactions"),
+                'transaction_analysis/brother\'s_transactions_analysis.png')
+    
+    # Predict transactions for both Manish and his brother in one batch
+    histories = {
+        'Manish': load_history('transaction_analysis/manish_transactions.csv'),
+        'Brother': load_history('transaction_analysis/brother_transactions.csv'),
+    }
+    predictions, _ = forecast_batch(
+        pd.concat([df.assign(applicant=name) for name, df in histories.items()], ignore_index=True),
+        key='applicant'
+    )
+    for prediction in predictions:
+        print(f"\nPrediction for {prediction['applicant']}'s Transactions:")
+        print(f"Total Predicted Amount for the Next Month: INR {prediction['next_period_total']:.2f}")
+        print("Prediction for the next month is: " + prediction['outlook'].upper())
+    
+    charts.save(history_chart(histories['Brother']), 'transaction_analysis/prediction_plot.png')
     
     print("\nTransaction Analysis Complete.")
 
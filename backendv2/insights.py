@@ -0,0 +1,126 @@
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from recurring import detect_recurring, summarize_recurring
+
+# Categories treated as essential spend; anything else counts as discretionary
+ESSENTIAL_CATEGORIES = {
+    "utilities", "health", "medical", "education", "transport", "food", "groceries",
+    "household", "rent", "emi", "electricity", "electricity_bill", "water", "water_bill",
+    "gas", "gas_bill", "phone", "phone_recharge", "internet", "internet_bill",
+}
+
+
+def _round(value, digits: int = 2):
+    if value is None or (isinstance(value, float) and not np.isfinite(value)):
+        return None
+    return round(float(value), digits)
+
+
+def _series_dict(series: pd.Series, digits: int = 2) -> Dict:
+    return {str(k): _round(v, digits) for k, v in series.items()}
+
+
+def prepare_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Normalizes the columns the feature engine depends on."""
+    df = df.copy()
+    for column in ("amount", "date"):
+        if column not in df.columns:
+            df[column] = None
+    df["amount"] = pd.to_numeric(df["amount"], errors="coerce").fillna(0.0)
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    for column in ("category", "recipient_name", "recipient_type", "bank"):
+        if column not in df.columns:
+            df[column] = "unknown"
+        df[column] = df[column].fillna("unknown").astype(str).str.strip().str.lower()
+    df["month"] = df["date"].dt.to_period("M")
+    df["is_credit"] = df["amount"] > 0
+    df["is_essential"] = df["category"].isin(ESSENTIAL_CATEGORIES)
+    return df
+
+
+def compute_insights(df: pd.DataFrame) -> Dict:
+    """Deterministic lending features computed directly from a transaction frame.
+
+    Covers the numeric parts of the csv_agent report: income regularity,
+    spend mix, essential vs. discretionary split, cash flow and
+    month-on-month stability, plus recurring payments and EMIs. No LLM calls
+    are made.
+    """
+    df = prepare_frame(df)
+    credits = df["amount"].where(df["is_credit"], 0.0)
+    debits = (-df["amount"]).where(~df["is_credit"], 0.0)
+    df = df.assign(credit=credits, debit=debits,
+                   essential_debit=debits.where(df["is_essential"], 0.0))
+
+    insights = {
+        "total_transactions": int(len(df)),
+        "total_amount": _round(df["amount"].sum()),
+        "avg_transaction": _round(df["amount"].mean()) if len(df) else None,
+        "category_distribution": {str(k): int(v) for k, v in df["category"].value_counts().items()},
+        "merchant_distribution": {
+            str(k): int(v)
+            for k, v in df.loc[df["recipient_type"] == "merchant", "recipient_name"].value_counts().items()
+        },
+        "bank_distribution": {str(k): int(v) for k, v in df["bank"].value_counts().items()},
+    }
+
+    dated = df[df["month"].notna()]
+    monthly = dated.groupby("month")[["credit", "debit", "essential_debit"]].sum()
+    if len(monthly):
+        # fill gaps so a month with no activity counts as zero, not as missing
+        full_index = pd.period_range(monthly.index.min(), monthly.index.max(), freq="M")
+        monthly = monthly.reindex(full_index, fill_value=0.0)
+    monthly["net"] = monthly["credit"] - monthly["debit"]
+    monthly_income = monthly["credit"]
+    income_mean = monthly_income.mean() if len(monthly) else 0.0
+
+    insights["income"] = {
+        "credit_count": int(df["is_credit"].sum()),
+        "total_inflow": _round(credits.sum()),
+        "avg_monthly_inflow": _round(income_mean),
+        "inflow_cv": _round(monthly_income.std(ddof=0) / income_mean, 4) if income_mean else None,
+        "months_with_income": int((monthly_income > 0).sum()),
+        "income_month_ratio": _round((monthly_income > 0).mean(), 4) if len(monthly) else None,
+        "top_sources": _series_dict(
+            df.loc[df["is_credit"]].groupby("recipient_name")["amount"].sum().nlargest(5)
+        ),
+    }
+
+    total_debit = debits.sum()
+    essential = df["essential_debit"].sum()
+    insights["spending"] = {
+        "debit_count": int((~df["is_credit"]).sum()),
+        "total_outflow": _round(total_debit),
+        "avg_monthly_outflow": _round(monthly["debit"].mean()) if len(monthly) else None,
+        "by_category": _series_dict(df.groupby("category")["debit"].sum().sort_values(ascending=False)),
+        "top_recipients": _series_dict(df.groupby("recipient_name")["debit"].sum().nlargest(10)),
+        "essential_outflow": _round(essential),
+        "discretionary_outflow": _round(total_debit - essential),
+        "essential_share": _round(essential / total_debit, 4) if total_debit else None,
+    }
+
+    net = monthly["net"]
+    change = monthly["debit"].pct_change().replace([np.inf, -np.inf], np.nan)
+    rolling = monthly["net"].rolling(3, min_periods=1).mean()
+    insights["cash_flow"] = {
+        "months_observed": int(len(monthly)),
+        "net_flow": _round(net.sum()),
+        "positive_months": int((net > 0).sum()),
+        "savings_rate": _round(net.sum() / credits.sum(), 4) if credits.sum() else None,
+        "monthly_net": _series_dict(net),
+        "rolling_3m_net": _series_dict(rolling),
+    }
+
+    insights["stability"] = {
+        "outflow_mom_change_mean": _round(change.mean(), 4),
+        "outflow_mom_change_std": _round(change.std(ddof=0), 4),
+        "outflow_cv": _round(monthly["debit"].std(ddof=0) / monthly["debit"].mean(), 4)
+        if len(monthly) and monthly["debit"].mean() else None,
+        "net_flow_std": _round(net.std(ddof=0)) if len(monthly) else None,
+    }
+
+    insights["reliability"] = summarize_recurring(detect_recurring(df))
+    return insights
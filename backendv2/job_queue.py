@@ -0,0 +1,248 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+import traceback
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_QUEUE_PATH = os.environ.get("UDAN_JOB_DB", "./cache/jobs.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress TEXT NOT NULL DEFAULT '{}',
+    results TEXT NOT NULL DEFAULT '[]',
+    error TEXT,
+    owner TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+"""
+
+
+def _owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_alive(owner: Optional[str]) -> bool:
+    if not owner:
+        return False
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname():
+        return True  # can't tell for other hosts, leave their jobs alone
+    try:
+        os.kill(int(pid), 0)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+class JobReporter:
+    """Handed to job handlers so they can publish per-file progress and partial results."""
+
+    def __init__(self, queue: "JobQueue", job_id: str):
+        self.queue = queue
+        self.job_id = job_id
+        self.files = []
+        self.failed = []
+        self.partial = []
+
+    def set_files(self, files):
+        self.files = list(files)
+        self.queue._update(self.job_id, progress={f: {"status": "pending"} for f in files})
+
+    def file_started(self, name: str):
+        self.queue._update(self.job_id, file_status=(name, {"status": "running", "processed": 0}))
+
+    def file_progress(self, name: str, processed: int, preview: Any = None):
+        """Publishes a running row count and an optional bounded preview; rows are not accumulated."""
+        status = {"status": "running", "processed": processed}
+        if preview is not None:
+            status["preview"] = preview
+        self.queue._update(self.job_id, file_status=(name, status))
+
+    def file_done(self, name: str, result: Any):
+        self.queue._update(self.job_id, file_status=(name, {"status": "done"}), result=result)
+
+    def file_failed(self, name: str, error: str):
+        self.failed.append(name)
+        self.queue._update(self.job_id, file_status=(name, {"status": "failed"}),
+                           result={"file": name, "error": error})
+
+    def file_partial(self, name: str, error: str):
+        """The file was processed but part of it could not be read."""
+        self.partial.append(name)
+        self.queue._update(self.job_id, file_status=(name, {"status": "partial"}),
+                           result={"file": name, "error": error})
+
+    def final_status(self):
+        """'failed' if every file failed, 'partial' if some failed or were only partly read, else 'done'."""
+        if not self.failed and not self.partial:
+            return "done", None
+        total = len(self.files) or len(self.failed) + len(self.partial)
+        problems = []
+        if self.failed:
+            problems.append(f"{len(self.failed)} of {total} files failed")
+        if self.partial:
+            problems.append(f"{len(self.partial)} of {total} files were only partly extracted")
+        message = "; ".join(problems)
+        if len(self.failed) >= total:
+            return "failed", message
+        return "partial", message
+
+
+class JobQueue:
+    """Durable work queue backed by SQLite with a local pool of worker threads.
+
+    Jobs survive restarts: anything left 'running' by a process that is no
+    longer alive is put back on the queue when a new queue starts.
+    """
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH, workers: int = 2, poll_interval: float = 1.0):
+        self.path = path
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.handlers: Dict[str, Callable[[Dict, JobReporter], Any]] = {}
+        self.owner = _owner_id()
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._threads = []
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def register(self, kind: str, handler: Callable[[Dict, JobReporter], Any]):
+        self.handlers[kind] = handler
+
+    def enqueue(self, kind: str, payload: Dict) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO jobs (id, kind, payload, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+            (job_id, kind, json.dumps(payload), now, now),
+        )
+        self._wakeup.set()
+        return job_id
+
+    def cancel(self, job_id: str, reason: str) -> bool:
+        """Withdraws a job that no worker has claimed yet; returns False once it is running or finished."""
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status='cancelled', error=?, updated_at=? WHERE id=? AND status='queued'",
+            (reason, time.time(), job_id),
+        )
+        return cursor.rowcount == 1
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._connect().execute(
+            "SELECT id, kind, payload, status, progress, results, error, created_at, updated_at "
+            "FROM jobs WHERE id=?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "jobId": row[0],
+            "kind": row[1],
+            "payload": json.loads(row[2]),
+            "status": row[3],
+            "progress": json.loads(row[4]),
+            "results": json.loads(row[5]),
+            "error": row[6],
+            "createdAt": row[7],
+            "updatedAt": row[8],
+        }
+
+    def _update(self, job_id: str, status: Optional[str] = None, progress: Optional[Dict] = None,
+                file_status=None, result: Any = None, error: Optional[str] = None):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT progress, results FROM jobs WHERE id=?", (job_id,)).fetchone()
+            current_progress = json.loads(row[0]) if progress is None else progress
+            results = json.loads(row[1])
+            if file_status:
+                current_progress[file_status[0]] = file_status[1]
+            if result is not None:
+                results.append(result)
+            conn.execute(
+                "UPDATE jobs SET status=COALESCE(?, status), progress=?, results=?, "
+                "error=COALESCE(?, error), updated_at=? WHERE id=?",
+                (status, json.dumps(current_progress, default=str), json.dumps(results, default=str),
+                 error, time.time(), job_id),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _claim(self) -> Optional[tuple]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, kind, payload FROM jobs WHERE status='queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE jobs SET status='running', owner=?, updated_at=? WHERE id=?",
+                    (self.owner, time.time(), row[0]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def recover(self):
+        """Re-queues jobs whose owning process died mid-run."""
+        conn = self._connect()
+        for job_id, owner in conn.execute("SELECT id, owner FROM jobs WHERE status='running'").fetchall():
+            if owner != self.owner and not _owner_alive(owner):
+                print(f"[DEBUG] Re-queueing orphaned job {job_id} from {owner}")
+                conn.execute(
+                    "UPDATE jobs SET status='queued', owner=NULL, updated_at=? WHERE id=?",
+                    (time.time(), job_id),
+                )
+
+    def _worker(self):
+        while True:
+            job = self._claim()
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            job_id, kind, payload = job
+            try:
+                handler = self.handlers[kind]
+                reporter = JobReporter(self, job_id)
+                handler(json.loads(payload), reporter)
+                status, error = reporter.final_status()
+                self._update(job_id, status=status, error=error)
+            except Exception as e:
+                traceback.print_exc()
+                self._update(job_id, status="failed", error=str(e))
+
+    def start(self):
+        if self._threads:
+            return
+        self.recover()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
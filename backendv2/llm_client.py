@@ -0,0 +1,372 @@
+import os
+import json
+import time
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from batch_engine import backoff_delay
+
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+GROQ_MODEL = "llama-3.1-70b-versatile"
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3.2:3b")
+GEMINI_MODEL = "gemini-1.5-pro-002"
+
+MAX_BATCH_SIZE = 50
+BATCH_MAX_TOKENS = 4096
+
+# Historical names the Gemini key has been stored under across scripts
+GEMINI_KEY_VARS = ("GOOGLE_API_KEY", "GEM_KEY", "API_KEY", "GOOGLE_AI_API_KEY")
+
+
+@dataclass
+class LLMResponse:
+    text: str
+    provider: str
+    model: str
+    latency_ms: float
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class LLMError(Exception):
+    pass
+
+
+def _pooled_session(pool_size: int = 16) -> requests.Session:
+    """A keep-alive session whose connection pool is shared across threads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class LLMBackend:
+    name = "base"
+    # Roughly how many tokens of prompt fit in one request
+    context_window = 8192
+
+    def complete(self, system_prompt: str, prompt: str, temperature: float = 0.8,
+                 max_tokens: int = 1024, json_mode: bool = False) -> LLMResponse:
+        raise NotImplementedError
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """Any /chat/completions endpoint that speaks the OpenAI wire format (Groq, vLLM, ...)."""
+
+    def __init__(self, name: str, base_url: str, model: str, api_key: Optional[str] = None,
+                 context_window: int = 8192, timeout: float = 60):
+        self.name = name
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.model = model
+        self.api_key = api_key
+        self.context_window = context_window
+        self.timeout = timeout
+        self.session = _pooled_session()
+
+    def complete(self, system_prompt, prompt, temperature=0.8, max_tokens=1024, json_mode=False):
+        body = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt},
+            ],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "top_p": 1,
+            "stream": False,
+        }
+        if json_mode:
+            body["response_format"] = {"type": "json_object"}
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+
+        start = time.perf_counter()
+        response = self.session.post(self.url, json=body, headers=headers, timeout=self.timeout)
+        latency_ms = (time.perf_counter() - start) * 1000
+        if response.status_code >= 400:
+            raise LLMError(f"{self.name} returned {response.status_code}: {response.text[:200]}")
+        data = response.json()
+        usage = data.get("usage") or {}
+        return LLMResponse(
+            text=data["choices"][0]["message"]["content"],
+            provider=self.name,
+            model=self.model,
+            latency_ms=latency_ms,
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+        )
+
+
+class OllamaBackend(LLMBackend):
+    """Local Ollama server via its native /api/chat endpoint."""
+
+    name = "ollama"
+
+    def __init__(self, base_url: str = OLLAMA_BASE_URL, model: str = OLLAMA_MODEL,
+                 context_window: int = 4096, timeout: float = 120):
+        self.url = base_url.rstrip("/") + "/api/chat"
+        self.model = model
+        self.context_window = context_window
+        self.timeout = timeout
+        self.session = _pooled_session()
+
+    def complete(self, system_prompt, prompt, temperature=0.8, max_tokens=1024, json_mode=False):
+        body = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt},
+            ],
+            "stream": False,
+            "options": {"temperature": temperature, "num_predict": max_tokens},
+        }
+        if json_mode:
+            body["format"] = "json"
+        start = time.perf_counter()
+        response = self.session.post(self.url, json=body, timeout=self.timeout)
+        latency_ms = (time.perf_counter() - start) * 1000
+        if response.status_code >= 400:
+            raise LLMError(f"ollama returned {response.status_code}: {response.text[:200]}")
+        data = response.json()
+        return LLMResponse(
+            text=data["message"]["content"],
+            provider=self.name,
+            model=self.model,
+            latency_ms=latency_ms,
+            prompt_tokens=data.get("prompt_eval_count", 0),
+            completion_tokens=data.get("eval_count", 0),
+        )
+
+
+_gemini_lock = threading.Lock()
+_gemini_configured = False
+
+
+def gemini_api_key() -> Optional[str]:
+    for var in GEMINI_KEY_VARS:
+        if os.environ.get(var):
+            return os.environ[var]
+    return None
+
+
+def configure_gemini(**kwargs):
+    """Configures the google.generativeai SDK once per process."""
+    global _gemini_configured
+    import google.generativeai as genai
+
+    with _gemini_lock:
+        if not _gemini_configured:
+            genai.configure(api_key=gemini_api_key(), **kwargs)
+            _gemini_configured = True
+    return genai
+
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+    context_window = 1_000_000
+
+    def __init__(self, model: str = GEMINI_MODEL):
+        self.model = model
+        self._models = {}
+
+    def _model_for(self, system_prompt: str):
+        genai = configure_gemini()
+        if system_prompt not in self._models:
+            self._models[system_prompt] = genai.GenerativeModel(
+                model_name=self.model, system_instruction=system_prompt
+            )
+        return self._models[system_prompt]
+
+    def complete(self, system_prompt, prompt, temperature=0.8, max_tokens=1024, json_mode=False):
+        config = {"temperature": temperature, "max_output_tokens": max_tokens}
+        if json_mode:
+            config["response_mime_type"] = "application/json"
+        start = time.perf_counter()
+        response = self._model_for(system_prompt).generate_content(prompt, generation_config=config)
+        latency_ms = (time.perf_counter() - start) * 1000
+        usage = getattr(response, "usage_metadata", None)
+        return LLMResponse(
+            text=response.text,
+            provider=self.name,
+            model=self.model,
+            latency_ms=latency_ms,
+            prompt_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+            completion_tokens=getattr(usage, "candidates_token_count", 0) or 0,
+        )
+
+
+class StubBackend(LLMBackend):
+    """Offline backend for tests and local runs; answers come from a handler function."""
+
+    name = "stub"
+
+    def __init__(self, handler: Optional[Callable[[str, str], str]] = None):
+        self.handler = handler or (lambda system_prompt, prompt: "{}")
+        self.model = "stub"
+
+    def complete(self, system_prompt, prompt, temperature=0.8, max_tokens=1024, json_mode=False):
+        start = time.perf_counter()
+        text = self.handler(system_prompt, prompt)
+        return LLMResponse(text=text, provider=self.name, model=self.model,
+                           latency_ms=(time.perf_counter() - start) * 1000)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) for sizing batches."""
+    return len(text) // 4 + 1
+
+
+def adaptive_batch_size(backend: LLMBackend, system_prompt: str, payloads: List[Dict],
+                        output_tokens_per_item: int, max_tokens: int = BATCH_MAX_TOKENS) -> int:
+    """Largest batch that fits both the backend's context window and the output budget."""
+    sample = payloads[:20]
+    input_per_item = estimate_tokens(json.dumps(sample)) / max(1, len(sample)) + 8
+    room = backend.context_window - estimate_tokens(system_prompt) - max_tokens
+    by_input = int(room // input_per_item) if room > 0 else 1
+    by_output = max_tokens // output_tokens_per_item
+    return max(1, min(MAX_BATCH_SIZE, by_input, by_output))
+
+
+def parse_json_response(text: str):
+    """Parses a model reply as JSON, tolerating ```json fences around it."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    return json.loads(text)
+
+
+class LLMClient:
+    """Shared front door for LLM calls: retries, JSON validation and metrics."""
+
+    def __init__(self, backend: LLMBackend, limiter=None):
+        self.backend = backend
+        self.limiter = limiter
+        self._metrics_lock = threading.Lock()
+        self.metrics = {"calls": 0, "failures": 0, "latency_ms": 0.0,
+                        "prompt_tokens": 0, "completion_tokens": 0}
+
+    def _record(self, response: Optional[LLMResponse]):
+        with self._metrics_lock:
+            if response is None:
+                self.metrics["failures"] += 1
+                return
+            self.metrics["calls"] += 1
+            self.metrics["latency_ms"] += response.latency_ms
+            self.metrics["prompt_tokens"] += response.prompt_tokens
+            self.metrics["completion_tokens"] += response.completion_tokens
+
+    def complete(self, system_prompt: str, prompt: str, **kwargs) -> LLMResponse:
+        try:
+            if self.limiter:
+                with self.limiter:
+                    response = self.backend.complete(system_prompt, prompt, **kwargs)
+            else:
+                response = self.backend.complete(system_prompt, prompt, **kwargs)
+        except Exception:
+            self._record(None)
+            raise
+        self._record(response)
+        return response
+
+    def complete_json(self, system_prompt: str, prompt: str, required_fields: Iterable[str] = (),
+                      max_retries: int = 3, **kwargs):
+        """Returns the parsed JSON reply, retrying until it has every required field."""
+        last_error = None
+        for attempt in range(max_retries):
+            try:
+                response = self.complete(system_prompt, prompt, json_mode=True, **kwargs)
+                parsed = parse_json_response(response.text)
+                missing = [f for f in required_fields if f not in parsed]
+                if missing:
+                    raise ValueError(f"Missing required fields in response: {missing}")
+                return parsed
+            except Exception as e:
+                last_error = e
+                print(f"[DEBUG] {self.backend.name} attempt {attempt + 1} failed: {e}")
+                if attempt < max_retries - 1:
+                    time.sleep(backoff_delay(attempt))
+        raise LLMError(f"All {max_retries} attempts failed: {last_error}")
+
+    def complete_json_batch(self, system_prompt: str, payloads: List[Dict], required_fields: Iterable[str] = (),
+                            output_tokens_per_item: int = 60, max_tokens: int = BATCH_MAX_TOKENS,
+                            max_retries: int = 2, **kwargs) -> List[Optional[Dict]]:
+        """Packs payloads into JSON-array prompts and validates the replies element-wise.
+
+        The model must answer {"results": [{"id": i, ...}, ...]}. The returned
+        list lines up with `payloads`; entries the model dropped or answered
+        without every required field are None so callers can retry them alone.
+        """
+        required_fields = tuple(required_fields)
+        results: List[Optional[Dict]] = [None] * len(payloads)
+        if not payloads:
+            return results
+        size = adaptive_batch_size(self.backend, system_prompt, payloads, output_tokens_per_item, max_tokens)
+        for start in range(0, len(payloads), size):
+            chunk = payloads[start:start + size]
+            prompt = json.dumps([{"id": i, **payload} for i, payload in enumerate(chunk)])
+            try:
+                reply = self.complete_json(system_prompt, prompt, required_fields=("results",),
+                                           max_retries=max_retries, max_tokens=max_tokens, **kwargs)
+            except LLMError as e:
+                print(f"[DEBUG] Batch of {len(chunk)} failed: {e}")
+                continue
+            for element in reply.get("results") or []:
+                if not isinstance(element, dict):
+                    continue
+                index = element.pop("id", None)
+                if isinstance(index, int) and 0 <= index < len(chunk) and results[start + index] is None \
+                        and all(field in element for field in required_fields):
+                    results[start + index] = element
+            missing = sum(r is None for r in results[start:start + len(chunk)])
+            print(f"[DEBUG] Batch of {len(chunk)} answered, {missing} element(s) need a retry")
+        return results
+
+    def snapshot(self) -> Dict:
+        with self._metrics_lock:
+            metrics = dict(self.metrics)
+        metrics["avg_latency_ms"] = metrics["latency_ms"] / metrics["calls"] if metrics["calls"] else 0.0
+        metrics["provider"] = self.backend.name
+        return metrics
+
+
+def build_backend(provider: Optional[str] = None) -> LLMBackend:
+    provider = (provider or os.environ.get("LLM_PROVIDER", "groq")).lower()
+    if provider == "groq":
+        return OpenAICompatibleBackend("groq", GROQ_BASE_URL, GROQ_MODEL,
+                                       api_key=os.environ.get("GROQ_API_KEY"))
+    if provider == "ollama":
+        return OllamaBackend()
+    if provider == "gemini":
+        return GeminiBackend()
+    if provider == "stub":
+        return StubBackend()
+    if provider == "openai-compatible":
+        return OpenAICompatibleBackend("openai-compatible", os.environ["LLM_BASE_URL"],
+                                       os.environ["LLM_MODEL"], api_key=os.environ.get("LLM_API_KEY"))
+    raise ValueError(f"Unknown LLM provider: {provider}")
+
+
+_clients: Dict[str, LLMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(provider: Optional[str] = None, limiter=None) -> LLMClient:
+    """Process-wide client per provider, so connection pools are reused."""
+    key = (provider or os.environ.get("LLM_PROVIDER", "groq")).lower()
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = LLMClient(build_backend(key), limiter=limiter)
+        return _clients[key]
+
+
+def all_metrics() -> Dict[str, Dict]:
+    with _clients_lock:
+        return {name: client.snapshot() for name, client in _clients.items()}
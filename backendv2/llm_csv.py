@@ -0,0 +1,154 @@
+import re
+import csv
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from columnar_store import TRANSACTION_COLUMNS, COLUMN_ALIASES
+
+# Header Gemini is told to emit; used when it leaves the header out
+DEFAULT_HEADER = ["raw_transaction", "upi_id", "amount", "transaction_type", "recipient_type",
+                  "category", "bank", "recipient_name"]
+
+CATEGORIES = {"food", "transport", "entertainment", "utilities", "shopping", "health", "education", "other"}
+MISSING = {"", "na", "n/a", "nan", "none", "null", "-"}
+
+_FENCE = re.compile(r"^\s*```")
+_CURRENCY = re.compile(r"(?i)inr|rs\.?|\u20b9")
+_AMOUNT_NOISE = re.compile(r"[^0-9.\-+]")
+
+
+@dataclass
+class ParseReport:
+    rows: int = 0
+    quarantined: List[Dict] = field(default_factory=list)
+    failed: List[Dict] = field(default_factory=list)
+
+    def reject(self, line_no: int, values: List[str], reason: str):
+        print(f"[DEBUG] Quarantined CSV row {line_no}: {reason}")
+        self.quarantined.append({"line": line_no, "values": values, "reason": reason})
+
+    def fail(self, pages: List[int], error: str):
+        """Records the 0-based page indices of a chunk whose extraction failed outright."""
+        self.failed.append({"pages": pages, "error": error})
+
+
+class ExtractionIncomplete(Exception):
+    """Raised once a document has been read through if some of its pages could not be extracted."""
+
+    def __init__(self, report: ParseReport):
+        ranges = ", ".join(
+            f"page {f['pages'][0] + 1}" if len(f["pages"]) == 1 else f"pages {f['pages'][0] + 1}-{f['pages'][-1] + 1}"
+            for f in report.failed
+        )
+        super().__init__(f"{report.rows} rows extracted; extraction failed for {ranges}")
+        self.report = report
+
+
+def iter_text_lines(chunks: Iterable[str]) -> Iterator[str]:
+    """Re-splits arbitrarily sized text chunks (e.g. a streamed response) into lines."""
+    pending = ""
+    for chunk in chunks:
+        pending += chunk
+        *complete, pending = pending.split("\n")
+        for line in complete:
+            yield line + "\n"
+    if pending:
+        yield pending + "\n"
+
+
+def _strip_fences(lines: Iterable[str]) -> Iterator[str]:
+    for line in lines:
+        if _FENCE.match(line) or not line.strip():
+            continue
+        yield line
+
+
+def normalize_header(values: List[str]) -> List[str]:
+    names = [re.sub(r"\s+", "_", v.strip().strip('"').lower()) for v in values]
+    return [COLUMN_ALIASES.get(name, name) for name in names]
+
+
+def _looks_like_header(values: List[str]) -> bool:
+    return len(set(normalize_header(values)) & set(DEFAULT_HEADER)) >= 2
+
+
+def _clean(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    value = value.strip()
+    return None if value.lower() in MISSING else value
+
+
+def coerce_row(header: List[str], values: List[str]) -> Dict:
+    """Maps one CSV record onto the TransactionData columns.
+
+    Records with more fields than the header almost always come from an
+    unquoted comma in the description, so the overflow is folded back into
+    raw_transaction. Raises ValueError for records that can't be repaired.
+    """
+    if len(values) > len(header) and header and header[0] == "raw_transaction":
+        overflow = len(values) - len(header)
+        values = [",".join(values[:overflow + 1])] + values[overflow + 1:]
+    if len(values) < len(header) - 1:
+        raise ValueError(f"expected {len(header)} fields, got {len(values)}")
+    raw = dict(zip(header, (_clean(v) for v in values)))
+    if not any(raw.values()):
+        raise ValueError("empty record")
+
+    try:
+        amount = float(_AMOUNT_NOISE.sub("", _CURRENCY.sub("", raw.get("amount") or "")))
+    except ValueError:
+        raise ValueError(f"non-numeric amount {raw.get('amount')!r}")
+    transaction_type = (raw.get("transaction_type") or "").lower()
+    if transaction_type not in ("credit", "debit"):
+        text = (raw.get("raw_transaction") or "").lower()
+        transaction_type = "debit" if amount < 0 or "debit" in text else "credit"
+    amount = -abs(amount) if transaction_type == "debit" else abs(amount)
+
+    category = (raw.get("category") or "other").lower()
+    recipient_type = (raw.get("recipient_type") or "").lower()
+    row = {column: raw.get(column) for column in TRANSACTION_COLUMNS}
+    row.update({
+        "amount": amount,
+        "transaction_type": transaction_type,
+        "category": category if category in CATEGORIES else "other",
+        "recipient_type": recipient_type if recipient_type in ("merchant", "individual") else None,
+        "bank": (raw.get("bank") or "unknown").lower(),
+    })
+    return row
+
+
+def iter_transaction_rows(lines: Iterable[str], report: Optional[ParseReport] = None) -> Iterator[Dict]:
+    """Streams TransactionData-shaped dicts out of LLM-produced CSV text.
+
+    Fences and blank lines are dropped, a missing header is replaced with
+    DEFAULT_HEADER, quoted fields (including ones spanning lines) are handled
+    by the csv module, and rows that can't be coerced go to `report`
+    instead of aborting the document.
+    """
+    report = report if report is not None else ParseReport()
+    reader = csv.reader(_strip_fences(lines), skipinitialspace=True)
+    header = None
+    for values in reader:
+        if header is None:
+            if _looks_like_header(values):
+                header = normalize_header(values)
+                continue
+            header = DEFAULT_HEADER
+        if _looks_like_header(values):
+            continue  # repeated header, e.g. once per page
+        try:
+            row = coerce_row(header, values)
+        except ValueError as e:
+            report.reject(reader.line_num, values, str(e))
+            continue
+        report.rows += 1
+        yield row
+
+
+def write_quarantine(report: ParseReport, path: str):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["line", "reason", "values"])
+        for bad in report.quarantined:
+            writer.writerow([bad["line"], bad["reason"], "|".join(bad["values"])])
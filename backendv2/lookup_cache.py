@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Optional
+
+DEFAULT_CACHE_PATH = os.environ.get("UDAN_CACHE_PATH", "./cache/lookup_cache.sqlite3")
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 100_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    version TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (namespace, key, version)
+);
+CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access);
+"""
+
+
+def prompt_version(prompt: str) -> str:
+    """Short, stable fingerprint of a prompt so editing it invalidates old entries."""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+
+
+class LookupCache:
+    """SQLite-backed key/value cache with TTL and LRU eviction.
+
+    SQLite in WAL mode handles locking, so one file can be shared by every
+    Flask worker process. Each thread gets its own connection.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, evict_every: int = 500):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str, version: str = "") -> Optional[Any]:
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at FROM entries WHERE namespace=? AND key=? AND version=?",
+            (namespace, key, version),
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at < now:
+            conn.execute(
+                "DELETE FROM entries WHERE namespace=? AND key=? AND version=?",
+                (namespace, key, version),
+            )
+            return None
+        conn.execute(
+            "UPDATE entries SET last_access=? WHERE namespace=? AND key=? AND version=?",
+            (now, namespace, key, version),
+        )
+        return json.loads(value)
+
+    def set(self, namespace: str, key: str, value: Any, version: str = "",
+            ttl_seconds: Optional[float] = None):
+        now = time.time()
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._connect().execute(
+            "INSERT OR REPLACE INTO entries (namespace, key, version, value, expires_at, last_access) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (namespace, key, version, json.dumps(value), now + ttl, now),
+        )
+        with self._writes_lock:
+            self._writes += 1
+            due = self._writes % self.evict_every == 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        """Drops expired entries, then the least recently used ones above max_entries."""
+        conn = self._connect()
+        conn.execute("DELETE FROM entries WHERE expires_at < ?", (time.time(),))
+        count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM entries WHERE rowid IN "
+                "(SELECT rowid FROM entries ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            )
+
+    def clear(self, namespace: Optional[str] = None):
+        if namespace is None:
+            self._connect().execute("DELETE FROM entries")
+        else:
+            self._connect().execute("DELETE FROM entries WHERE namespace=?", (namespace,))
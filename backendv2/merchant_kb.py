@@ -0,0 +1,210 @@
+import os
+import re
+import ast
+import json
+import sqlite3
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+import pandas as pd
+
+from txn_parser import extract_upi_id
+
+DEFAULT_KB_PATH = os.environ.get("UDAN_MERCHANT_KB_PATH", "./cache/merchant_kb.sqlite3")
+SEED_SOURCE = "transactions_updated.csv"
+MIN_SIMILARITY = 0.5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS merchants (
+    canonical TEXT PRIMARY KEY,
+    category TEXT,
+    aliases TEXT NOT NULL DEFAULT '[]',
+    upi_prefixes TEXT NOT NULL DEFAULT '[]',
+    info TEXT
+);
+"""
+
+# Placeholder local parts shared by unrelated merchants; never indexed as prefixes
+GENERIC_PREFIXES = {"shop", "mart", "store", "vendor", "seller", "retail", "merchant", "pay", "upi", "gpay",
+                    "paytmqr", "bharatpe", "business", "biz"}
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_PREFIX = re.compile(r"^[a-z]+")
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(_NON_ALNUM.sub(" ", str(name).lower()).split())
+
+
+def upi_prefix(upi_id: str) -> Optional[str]:
+    """Leading alphabetic run of the local part: swiggy.75839@okicici -> swiggy."""
+    match = _PREFIX.match(upi_id.strip().lower().partition("@")[0])
+    if not match or len(match.group(0)) < 3 or match.group(0) in GENERIC_PREFIXES:
+        return None
+    return match.group(0)
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {normalize_name(text)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class MerchantRecord:
+    canonical: str
+    category: Optional[str] = None
+    aliases: List[str] = field(default_factory=list)
+    upi_prefixes: List[str] = field(default_factory=list)
+    info: Optional[List[Dict]] = None
+
+
+class MerchantKB:
+    """Local merchant knowledge base with an in-memory fuzzy name index.
+
+    Records live in SQLite so every worker process shares them; lookups run
+    against in-memory dicts: UPI prefix and exact alias are O(1), and fuzzy
+    matches go through a trigram inverted index scored by Jaccard similarity.
+    """
+
+    def __init__(self, path: str = DEFAULT_KB_PATH, seed_source: Optional[str] = SEED_SOURCE):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self.records: Dict[str, MerchantRecord] = {}
+        self._by_alias: Dict[str, str] = {}
+        self._by_prefix: Dict[str, str] = {}
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connect().executescript(_SCHEMA)
+        self.reload()
+        if not self.records and seed_source and os.path.exists(seed_source):
+            # a bad seed file must not take the KB (and every analysis using it) down
+            try:
+                self.seed_from_csv(seed_source)
+            except Exception as e:
+                print(f"[DEBUG] Could not seed merchant knowledge base from {seed_source}: {e}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def reload(self):
+        rows = self._connect().execute(
+            "SELECT canonical, category, aliases, upi_prefixes, info FROM merchants"
+        ).fetchall()
+        with self._lock:
+            self.records.clear()
+            self._by_alias.clear()
+            self._by_prefix.clear()
+            self._postings.clear()
+            for canonical, category, aliases, prefixes, info in rows:
+                self._index(MerchantRecord(canonical, category, json.loads(aliases), json.loads(prefixes),
+                                           json.loads(info) if info else None))
+
+    def _index(self, record: MerchantRecord):
+        self.records[record.canonical] = record
+        for alias in {record.canonical, *record.aliases}:
+            key = normalize_name(alias)
+            if not key:
+                continue
+            self._by_alias[key] = record.canonical
+            for gram in trigrams(key):
+                self._postings[gram].add(key)
+        for prefix in record.upi_prefixes:
+            self._by_prefix[prefix] = record.canonical
+
+    def add(self, canonical: str, category: Optional[str] = None, aliases=(), upi_prefixes=(),
+            info: Optional[List[Dict]] = None) -> MerchantRecord:
+        """Inserts a merchant or merges new aliases, prefixes and info into an existing one."""
+        canonical = normalize_name(canonical)
+        with self._lock:
+            record = self.records.get(canonical) or MerchantRecord(canonical)
+            record.category = category or record.category
+            record.aliases = sorted({*record.aliases, *(normalize_name(a) for a in aliases if a)})
+            record.upi_prefixes = sorted({*record.upi_prefixes, *(p for p in upi_prefixes if p)})
+            record.info = info or record.info
+            self._index(record)
+        self._connect().execute(
+            "INSERT OR REPLACE INTO merchants (canonical, category, aliases, upi_prefixes, info) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (record.canonical, record.category, json.dumps(record.aliases), json.dumps(record.upi_prefixes),
+             json.dumps(record.info) if record.info else None),
+        )
+        return record
+
+    def fuzzy(self, name: str, min_similarity: float = MIN_SIMILARITY) -> Optional[MerchantRecord]:
+        grams = trigrams(name)
+        counts: Dict[str, int] = defaultdict(int)
+        with self._lock:
+            for gram in grams:
+                for alias in self._postings.get(gram, ()):
+                    counts[alias] += 1
+            best, best_score = None, min_similarity
+            for alias, shared in counts.items():
+                score = shared / (len(grams) + len(trigrams(alias)) - shared)
+                if score >= best_score:
+                    best, best_score = alias, score
+            return self.records[self._by_alias[best]] if best else None
+
+    def lookup(self, name: Optional[str] = None, upi_id: Optional[str] = None) -> Optional[MerchantRecord]:
+        """Resolves a merchant by UPI prefix, then exact alias, then fuzzy name match."""
+        if upi_id:
+            prefix = upi_prefix(upi_id)
+            if prefix in self._by_prefix:
+                return self.records[self._by_prefix[prefix]]
+        if not name:
+            return None
+        key = normalize_name(name)
+        if key in self._by_alias:
+            return self.records[self._by_alias[key]]
+        return self.fuzzy(key)
+
+    def seed_from_csv(self, path: str = SEED_SOURCE) -> int:
+        """Builds records from merchant rows (and their captured search snippets) of an analyzed CSV.
+
+        Older exports are not all UTF-8; undecodable bytes are replaced.
+        """
+        df = pd.read_csv(path, dtype=str, on_bad_lines="skip", encoding="utf-8", encoding_errors="replace")
+        if "recipient_type" not in df.columns or "recipient_name" not in df.columns:
+            return 0
+        merchants = df[df["recipient_type"].str.lower() == "merchant"].dropna(subset=["recipient_name"])
+        seeded = 0
+        for name, group in merchants.groupby(merchants["recipient_name"].str.strip().str.lower()):
+            if not normalize_name(name):
+                continue
+            upi_ids = [extract_upi_id(str(v)) for v in group.get("upi_id", pd.Series(dtype=str)).dropna()]
+            category = None
+            if "category" in group.columns and group["category"].notna().any():
+                category = group["category"].mode().iat[0]
+            info = None
+            for raw in group.get("merchant_info", pd.Series(dtype=str)).dropna():
+                try:
+                    info = ast.literal_eval(raw)
+                    break
+                except (ValueError, SyntaxError):
+                    continue
+            self.add(name, category=category, aliases=[name],
+                     upi_prefixes=[upi_prefix(u) for u in upi_ids if u], info=info)
+            seeded += 1
+        print(f"[DEBUG] Seeded merchant knowledge base with {seeded} merchants from {path}")
+        return seeded
+
+
+_kb: Optional[MerchantKB] = None
+_kb_lock = threading.Lock()
+
+
+def get_merchant_kb() -> MerchantKB:
+    global _kb
+    with _kb_lock:
+        if _kb is None:
+            _kb = MerchantKB()
+        return _kb
@@ -5,6 +5,7 @@ from google.generativeai.types import HarmCategory, HarmBlockThreshold
 import dotenv
 import csv
 from datetime import datetime
+from llm_client import configure_gemini, gemini_api_key
 
 
 dotenv.load_dotenv()
@@ -14,19 +15,16 @@ def diagnose_gemini_api_issues(file_path):
     """
     try:
         # 1. Verify API Key
-        api_key = os.getenv('GOOGLE_AI_API_KEY')
+        api_key = gemini_api_key()
         if not api_key:
-            print("❌ ERROR: No API key found. Set GOOGLE_AI_API_KEY environment variable.")
+            print("❌ ERROR: No API key found. Set GOOGLE_API_KEY environment variable.")
             return False
 
         # 2. Check library version
         print(f"📦 Generative AI Library Version: {genai.__version__}")
 
         # 3. Configure with additional safety settings
-        genai.configure(
-            api_key=api_key,
-            transport='rest'  # Use REST transport instead of gRPC
-        )
+        configure_gemini(transport='rest')  # Use REST transport instead of gRPC
 
         # 4. Detailed logging and error handling
         safety_settings = {
@@ -1,7 +1,15 @@
 import os
+import csv
 import time
-import google.generativeai as genai
 import yaml
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from llm_client import configure_gemini, GEMINI_MODEL
+from prompts import DOCUMENT_EXTRACTION_PROMPT
+from llm_csv import ParseReport, ExtractionIncomplete, iter_text_lines, iter_transaction_rows, write_quarantine
+from columnar_store import TRANSACTION_COLUMNS
+from pdf_extract import extract_pdf, page_count, write_page_subset
+from batch_engine import PROVIDER_LIMITS, ProviderLimiter
 
 def load_config(file_path='config.yaml'):
     with open(file_path, 'r') as file:
@@ -10,7 +18,13 @@ def load_config(file_path='config.yaml'):
             os.environ[key] = value
 
 load_config()
-genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
+genai = configure_gemini()
+
+# Scanned pages per Gemini call; small enough to stay well under max_output_tokens
+GEMINI_PAGES_PER_CHUNK = int(os.environ.get('GEMINI_PAGES_PER_CHUNK', 3))
+GEMINI_CONCURRENCY = int(os.environ.get('GEMINI_CONCURRENCY', PROVIDER_LIMITS['gemini'][0]))
+
+gemini_limiter = ProviderLimiter('gemini', GEMINI_CONCURRENCY, *PROVIDER_LIMITS['gemini'][1:])
 
 def upload_to_gemini(path, mime_type=None):
     """Uploads the given file to Gemini."""
@@ -42,44 +56,98 @@ generation_config = {
 
 
 model = genai.GenerativeModel(
-    model_name="gemini-1.5-pro-002",
+    model_name=GEMINI_MODEL,
     generation_config=generation_config,
-    system_instruction=(
-        "Analyze bank statements and transaction documents to extract structured data.\n\n"
-        "For UPI IDs, identify patterns like:\n"
-        "- (person_name)(number)@bank\n"
-        "- (person_name).(number)@bank\n"
-        "- (phonenumber)@bank\n"
-        "- (business_name)(identifier)@bank\n\n"
-        "Bank names should be one of: hdfc, icici, sbi, axis, paytm, okicici, okhdfc, oksbi, okaxis\n\n"
-        "Return a CSV-formatted string with these headers:\n"
-        "raw_transaction, upi_id, amount, transaction_type, recepient_type, category, bank, recepient_name\n\n"
-        "Where:\n"
-        "- category: food/transport/entertainment/utilities/shopping/health/education/other\n"
-        "- transaction_type: credit/debit\n"
-        "- recepient_type: merchant/individual\n"
-        "- amount: numeric value (positive for credit, negative for debit)\n"
-        "Use only ASCII characters in all outputs."
-        "If you don't find any data, return an NA fields."
-    ),
+    system_instruction=DOCUMENT_EXTRACTION_PROMPT,
 )
 
 
-def clean_csv_content(csv_content):
-    """Cleans the CSV content by removing the ```csv``` markers."""
-    return csv_content.strip("```csv").strip("```").strip()
+def iter_document_transactions(file_path, output_csv_path):
+    """Streams structured transactions out of a document.
 
-def save_csv(content, output_path):
-    """Saves a cleaned CSV-formatted string to a CSV file."""
-    cleaned_content = clean_csv_content(content)
-    with open(output_path, mode="w", newline="") as csv_file:
-        csv_file.write(cleaned_content)
-    print(f"CSV saved to {output_path}")
-
-def process_document_with_gemini(file_path, output_csv_path):
-    """Processes any supported document and returns structured transaction data."""
+    PDFs go through the local text/table tier first; only pages with no
+    extractable text are sent to Gemini. Each row is written to
+    output_csv_path as soon as it is available; rows that can't be repaired
+    are written to <output_csv_path>.rejected.csv instead. If any page range
+    failed to extract, ExtractionIncomplete is raised after the last row.
+    """
     print(f"[DEBUG] Processing file: {file_path}")
-    
+    report = ParseReport()
+    with open(output_csv_path, mode="w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=TRANSACTION_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for row in _iter_tiered_rows(file_path, report):
+            writer.writerow(row)
+            yield row
+    print(f"[DEBUG] Extracted {report.rows} transactions to {output_csv_path}")
+    if report.quarantined:
+        write_quarantine(report, output_csv_path + ".rejected.csv")
+        print(f"[DEBUG] {len(report.quarantined)} rows quarantined")
+    if report.failed:
+        raise ExtractionIncomplete(report)
+
+def page_chunks(pages, size=GEMINI_PAGES_PER_CHUNK):
+    """Groups sorted page numbers into runs of consecutive pages, at most `size` long."""
+    chunks = []
+    for page in pages:
+        if chunks and len(chunks[-1]) < size and chunks[-1][-1] == page - 1:
+            chunks[-1].append(page)
+        else:
+            chunks.append([page])
+    return chunks
+
+def _iter_tiered_rows(file_path, report):
+    if os.path.splitext(file_path)[1].lower() != '.pdf':
+        yield from _iter_gemini_rows(file_path, report)
+        return
+
+    rows, scanned = extract_pdf(file_path)
+    report.rows += len(rows)
+    if not scanned:
+        for row in rows:
+            row.pop("page", None)
+            yield row
+        return
+
+    # Local rows grouped by page, scanned pages grouped into Gemini chunks;
+    # both are emitted in page order once everything before them is ready.
+    # Chunks never share a page, so identical rows in adjacent chunks are
+    # genuine repeat payments and are kept.
+    segments = {}
+    for row in rows:
+        segments.setdefault(row.pop("page"), []).append(row)
+    chunks = page_chunks(scanned)
+    print(f"[DEBUG] {file_path}: {len(scanned)} scanned pages in {len(chunks)} chunks, "
+          f"up to {GEMINI_CONCURRENCY} in flight")
+    with tempfile.TemporaryDirectory() as tmp, ThreadPoolExecutor(max_workers=GEMINI_CONCURRENCY) as pool:
+        for chunk in chunks:
+            if len(chunks) == 1 and len(chunk) == page_count(file_path):
+                subset = file_path
+            else:
+                subset = write_page_subset(file_path, chunk, os.path.join(tmp, f"pages_{chunk[0]}_{chunk[-1]}.pdf"))
+            segments[chunk[0]] = pool.submit(_gemini_chunk_rows, subset, chunk)
+        for page in sorted(segments):
+            segment = segments[page]
+            if isinstance(segment, list):
+                chunk_rows = segment
+            else:
+                chunk_rows, chunk_report = segment.result()
+                report.rows += chunk_report.rows
+                report.quarantined.extend(chunk_report.quarantined)
+                report.failed.extend(chunk_report.failed)
+            yield from chunk_rows
+
+def _gemini_chunk_rows(file_path, pages):
+    """Extracts one chunk of scanned pages; a failure is recorded against `pages` instead of raised."""
+    report = ParseReport()
+    try:
+        return list(_iter_gemini_rows(file_path, report)), report
+    except Exception as e:
+        print(f"[DEBUG] Gemini extraction failed for pages {pages[0] + 1}-{pages[-1] + 1} of {file_path}: {e}")
+        report.fail(pages, str(e))
+        return [], report
+
+def _iter_gemini_rows(file_path, report):
     # Upload file with appropriate mime type
     ext = os.path.splitext(file_path)[1].lower()
     mime_type = {
@@ -102,21 +170,14 @@ def process_document_with_gemini(file_path, output_csv_path):
         ]
     )
 
-    response = chat_session.send_message("Please process this document as described.")
-    csv_content = response.text
-    save_csv(csv_content, output_csv_path)
+    # Held until the streamed response is fully read, so the cap covers generation time
+    with gemini_limiter:
+        response = chat_session.send_message("Please process this document as described.", stream=True)
+        yield from iter_transaction_rows(iter_text_lines(chunk.text for chunk in response), report)
 
-    transactions = []
-    csv_lines = clean_csv_content(csv_content).strip().split('\n')
-    headers = csv_lines[0].split(',')
-    
-    for line in csv_lines[1:]:
-        values = line.split(',')
-        transaction = dict(zip(headers, values))
-        transactions.append(transaction)
-    
-    print(f"[DEBUG] Extracted {len(transactions)} transactions")
-    return transactions
+def process_document_with_gemini(file_path, output_csv_path):
+    """Processes any supported document and returns structured transaction data."""
+    return list(iter_document_transactions(file_path, output_csv_path))
 
 if __name__ == "__main__":
     file_path = "./testing.pdf"
@@ -1,9 +1,9 @@
 import os
 import time
-import google.generativeai as genai
+from llm_client import configure_gemini
 
 # Configure API Key
-genai.configure(api_key=os.environ["API_KEY"])
+genai = configure_gemini()
 
 def upload_to_gemini(path, mime_type=None):
     """Uploads the given file to Gemini."""
@@ -0,0 +1,189 @@
+import os
+import re
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import pdfplumber
+from pypdf import PdfReader, PdfWriter
+
+from txn_parser import parse_transaction_line, extract_upi_id
+from upi_handles import parse_handle, resolve_bank
+from categorizer import categorize
+
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", os.cpu_count() or 2))
+PAGES_PER_TASK = 8
+# Pages with fewer extractable characters than this are treated as scanned images
+MIN_TEXT_CHARS = 40
+
+# Statement column names, lifted from test.py's possible_mappings
+COLUMN_PATTERNS = {
+    "date": [r"^date", r"txn date", r"transaction date", r"value date"],
+    "description": [r"description", r"details", r"narration", r"particulars", r"remarks"],
+    "debit": [r"debit", r"withdrawal", r"dr\b"],
+    "credit": [r"credit", r"deposit", r"cr\b"],
+    "amount": [r"amount"],
+    "balance": [r"balance"],
+}
+
+DATE_FORMATS = ["%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%d-%m-%y", "%d %b %Y", "%d-%b-%Y", "%d %b %y",
+                "%Y-%m-%d", "%d.%m.%Y"]
+
+_DATE = r"\d{1,2}[/\-. ](?:\d{1,2}|[A-Za-z]{3})[/\-. ]\d{2,4}"
+# Fallback for text-only statements: date, narration, amount, optional Dr/Cr marker
+STATEMENT_LINE = re.compile(
+    rf"^(?P<date>{_DATE})\s+(?P<description>.+?)\s+(?P<amount>-?[\d,]+\.\d{{2}})\s*(?P<marker>Dr|Cr)?\b",
+    re.IGNORECASE,
+)
+
+
+def map_columns(header: List[Optional[str]]) -> Dict[str, int]:
+    """Maps normalized column names to their index in a table header row."""
+    mapping = {}
+    for index, name in enumerate(header):
+        text = " ".join(str(name or "").lower().split())
+        for target, patterns in COLUMN_PATTERNS.items():
+            if target not in mapping and any(re.search(p, text) for p in patterns):
+                mapping[target] = index
+                break
+    return mapping
+
+
+def parse_amount(value) -> Optional[float]:
+    text = str(value or "").replace(",", "").strip()
+    match = re.search(r"-?\d+(?:\.\d+)?", text)
+    if not match:
+        return None
+    amount = float(match.group(0))
+    return -abs(amount) if re.search(r"\bdr\b", text, re.IGNORECASE) else amount
+
+
+def parse_date(value) -> Optional[str]:
+    text = " ".join(str(value or "").split())
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+def _row(date: Optional[str], description: str, amount: float, page: int) -> Dict:
+    return {
+        "raw_transaction": description,
+        "upi_id": extract_upi_id(description),
+        "amount": amount,
+        "transaction_type": "debit" if amount < 0 else "credit",
+        "date": date,
+        "page": page,
+    }
+
+
+def rows_from_table(table: List[List], page: int) -> List[Dict]:
+    if not table or len(table) < 2:
+        return []
+    columns = map_columns(table[0])
+    if "description" not in columns or not ({"amount", "debit", "credit"} & columns.keys()):
+        return []
+    rows = []
+    for cells in table[1:]:
+        def cell(name):
+            index = columns.get(name)
+            return cells[index] if index is not None and index < len(cells) else None
+        description = " ".join(str(cell("description") or "").split())
+        if not description:
+            continue
+        debit, credit = parse_amount(cell("debit")), parse_amount(cell("credit"))
+        if debit:
+            amount = -abs(debit)
+        elif credit:
+            amount = abs(credit)
+        else:
+            amount = parse_amount(cell("amount"))
+        if amount is None:
+            continue
+        rows.append(_row(parse_date(cell("date")), description, amount, page))
+    return rows
+
+
+def rows_from_text(text: str, page: int) -> List[Dict]:
+    rows = []
+    for line in text.splitlines():
+        parsed = parse_transaction_line(line)
+        if parsed:
+            row = _row(parsed.date or None, parsed.raw_transaction, parsed.amount, page)
+            row["upi_id"] = parsed.upi_id
+            rows.append(row)
+            continue
+        match = STATEMENT_LINE.match(line.strip())
+        if match:
+            amount = parse_amount(match.group("amount"))
+            if (match.group("marker") or "").lower() == "dr":
+                amount = -abs(amount)
+            rows.append(_row(parse_date(match.group("date")), match.group("description"), amount, page))
+    return rows
+
+
+def extract_page_range(path: str, start: int, end: int) -> Tuple[List[Dict], List[int]]:
+    """Extracts pages [start, end) locally; returns rows and the page numbers that look scanned."""
+    rows, scanned = [], []
+    with pdfplumber.open(path, pages=list(range(start + 1, end + 1))) as pdf:
+        for offset, page in enumerate(pdf.pages):
+            number = start + offset
+            text = page.extract_text() or ""
+            if len(text.strip()) < MIN_TEXT_CHARS:
+                scanned.append(number)
+                continue
+            page_rows = []
+            for table in page.extract_tables():
+                page_rows.extend(rows_from_table(table, number))
+            rows.extend(page_rows or rows_from_text(text, number))
+    return rows, scanned
+
+
+def page_count(path: str) -> int:
+    return len(PdfReader(path).pages)
+
+
+def extract_pdf(path: str, max_workers: int = PDF_WORKERS) -> Tuple[List[Dict], List[int]]:
+    """Local text/table tier: extracts every page in parallel, in page order."""
+    total = page_count(path)
+    ranges = [(start, min(start + PAGES_PER_TASK, total)) for start in range(0, total, PAGES_PER_TASK)]
+    rows, scanned = [], []
+    if len(ranges) <= 1:
+        results = [extract_page_range(path, start, end) for start, end in ranges]
+    else:
+        # Extraction runs inside the job queue's worker threads; forking there
+        # would copy held locks into the children, so start clean interpreters
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(ranges)),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(extract_page_range, [path] * len(ranges), *zip(*ranges)))
+    for range_rows, range_scanned in results:
+        rows.extend(range_rows)
+        scanned.extend(range_scanned)
+    print(f"[DEBUG] {path}: {len(rows)} rows from {total - len(scanned)} text pages, {len(scanned)} scanned pages")
+    return enrich_rows(rows), scanned
+
+
+def enrich_rows(rows: List[Dict]) -> List[Dict]:
+    """Fills bank, counterparty and category locally so text-tier rows match Gemini's columns."""
+    categories = categorize([row["raw_transaction"] for row in rows]) if rows else []
+    for row, category in zip(rows, categories):
+        handle = parse_handle(row["upi_id"]) if row["upi_id"] else None
+        row["bank"] = resolve_bank(row["upi_id"]) if row["upi_id"] else None
+        row["recipient_type"] = ("merchant" if handle["is_merchant"] else "individual") if handle else None
+        row["recipient_name"] = handle["name"] if handle else None
+        row["category"] = category or "other"
+    return rows
+
+
+def write_page_subset(path: str, pages: List[int], output_path: str) -> str:
+    """Writes the given 0-based pages of a PDF to a new file (e.g. only the scanned ones)."""
+    reader = PdfReader(path)
+    writer = PdfWriter()
+    for number in pages:
+        writer.add_page(reader.pages[number])
+    with open(output_path, "wb") as f:
+        writer.write(f)
+    return output_path
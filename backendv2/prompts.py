@@ -35,3 +35,65 @@ Return in this exact JSON format:
 {
     "verified_name": "actual business name in lowercase ASCII"
 }"""
+
+
+UPI_PARSER_BATCH_PROMPT = """Analyze each UPI ID in the input JSON array and extract structured information.
+Each input element is {"id": <int>, "upi_id": "<upi id>"}.
+Common patterns include:
+- (person_name)(number)@bank
+- (person_name).(number)@bank  
+- (phonenumber)@bank
+- (business_name)(identifier)@bank
+
+bank name can be one of these hdfc, icici, sbi, axis, paytm, okicici, okhdfc, oksbi, okaxis
+Return exactly one result per input element, echoing its id, in this exact JSON format using only ASCII characters:
+{
+    "results": [
+        {
+            "id": 0,
+            "is_merchant": true/false,
+            "name": "extracted name in lowercase ASCII only",
+            "bank": "bank name",
+            "confidence": 0.0-1.0
+        }
+    ]
+}"""
+
+TRANSACTION_ANALYSIS_BATCH_PROMPT = """Analyze each UPI transaction in the input JSON array.
+Each input element is {"id": <int>, "transaction": "...", "upi_data": {...}, "merchant_info": ...}.
+Use only ASCII characters in the response.
+For amounts, use numbers only without currency symbols.
+
+Return exactly one result per input element, echoing its id, in this exact JSON format:
+{
+    "results": [
+        {
+            "id": 0,
+            "category": "food/transport/entertainment/utilities/shopping/health/education/other",
+            "transaction_type": "credit/debit",
+            "amount": 0.00,
+            "is_business_transaction": true/false,
+            "recipient_type": "merchant/individual"
+        }
+    ]
+}"""
+
+DOCUMENT_EXTRACTION_PROMPT = """Analyze bank statements and transaction documents to extract structured data.
+
+For UPI IDs, identify patterns like:
+- (person_name)(number)@bank
+- (person_name).(number)@bank
+- (phonenumber)@bank
+- (business_name)(identifier)@bank
+
+Bank names should be one of: hdfc, icici, sbi, axis, paytm, okicici, okhdfc, oksbi, okaxis
+
+Return a CSV-formatted string with these headers:
+raw_transaction, upi_id, amount, transaction_type, recepient_type, category, bank, recepient_name
+
+Where:
+- category: food/transport/entertainment/utilities/shopping/health/education/other
+- transaction_type: credit/debit
+- recepient_type: merchant/individual
+- amount: numeric value (positive for credit, negative for debit)
+Use only ASCII characters in all outputs.If you don't find any data, return an NA fields."""
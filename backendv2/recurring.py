@@ -0,0 +1,119 @@
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+# (label, nominal period in days, tolerance in days)
+PERIODS = [
+    ("weekly", 7, 2),
+    ("biweekly", 14, 3),
+    ("monthly", 30, 5),
+    ("quarterly", 91, 10),
+    ("yearly", 365, 20),
+]
+
+
+def _label_period(days: float) -> str:
+    for label, nominal, tolerance in PERIODS:
+        if abs(days - nominal) <= tolerance:
+            return label
+    return "irregular"
+
+
+def detect_recurring(df: pd.DataFrame, min_occurrences: int = 3, amount_tolerance: float = 0.3,
+                     min_score: float = 0.6) -> List[Dict]:
+    """Finds recurring payments and likely EMIs in a transaction frame.
+
+    Transactions are grouped by counterparty and direction, then split into
+    amount bands: after sorting by amount, a new band starts wherever the
+    next amount is more than `amount_tolerance` above the previous one. Each
+    band's inter-arrival times give the period and a regularity score. Both
+    steps are sort-based, so the whole pass is O(n log n).
+    """
+    if df is None or df.empty or "amount" not in df.columns or "date" not in df.columns:
+        return []
+
+    counterparty = df["upi_id"] if "upi_id" in df.columns else pd.Series(None, index=df.index, dtype=object)
+    if "recipient_name" in df.columns:
+        counterparty = counterparty.fillna(df["recipient_name"])
+    frame = pd.DataFrame({
+        "counterparty": counterparty,
+        "amount": pd.to_numeric(df["amount"], errors="coerce"),
+        "date": pd.to_datetime(df["date"], errors="coerce"),
+        "category": df["category"] if "category" in df.columns else None,
+    })
+    frame = frame.dropna(subset=["counterparty", "amount", "date"])
+    frame = frame[frame["amount"] != 0]
+    if frame.empty:
+        return []
+    frame["direction"] = np.where(frame["amount"] < 0, "debit", "credit")
+    frame["abs_amount"] = frame["amount"].abs()
+
+    # Amount bands: sort within each counterparty/direction and cut on large jumps
+    frame = frame.sort_values(["counterparty", "direction", "abs_amount"], kind="mergesort")
+    previous = frame.groupby(["counterparty", "direction"], sort=False)["abs_amount"].shift()
+    frame["band"] = (previous.isna() | (frame["abs_amount"] > previous * (1 + amount_tolerance))).cumsum()
+
+    # Inter-arrival times within each band
+    frame = frame.sort_values(["band", "date"], kind="mergesort")
+    frame["gap_days"] = frame.groupby("band")["date"].diff().dt.total_seconds() / 86400.0
+
+    stats = frame.groupby("band").agg(
+        counterparty=("counterparty", "first"),
+        direction=("direction", "first"),
+        category=("category", lambda s: s.mode().iat[0] if s.notna().any() else None),
+        occurrences=("amount", "size"),
+        first_seen=("date", "min"),
+        last_seen=("date", "max"),
+        amount_mean=("abs_amount", "mean"),
+        amount_std=("abs_amount", "std"),
+        period_days=("gap_days", "median"),
+        gap_std=("gap_days", "std"),
+    )
+    stats = stats[(stats["occurrences"] >= min_occurrences) & (stats["period_days"] >= 1)]
+    if stats.empty:
+        return []
+
+    span_days = (stats["last_seen"] - stats["first_seen"]).dt.total_seconds() / 86400.0
+    expected = span_days / stats["period_days"] + 1
+    interval_score = 1 - (stats["gap_std"].fillna(0) / stats["period_days"]).clip(0, 1)
+    amount_cv = (stats["amount_std"].fillna(0) / stats["amount_mean"]).clip(0, 1)
+    coverage = (stats["occurrences"] / expected).clip(0, 1)
+    stats["amount_cv"] = amount_cv
+    stats["regularity"] = 0.5 * interval_score + 0.25 * (1 - amount_cv) + 0.25 * coverage
+    stats = stats[stats["regularity"] >= min_score].sort_values("regularity", ascending=False)
+
+    results = []
+    for row in stats.itertuples():
+        period = _label_period(row.period_days)
+        results.append({
+            "counterparty": row.counterparty,
+            "direction": row.direction,
+            "category": row.category,
+            "occurrences": int(row.occurrences),
+            "period": period,
+            "period_days": round(float(row.period_days), 1),
+            "amount_mean": round(float(row.amount_mean), 2),
+            "amount_cv": round(float(row.amount_cv), 4),
+            "regularity": round(float(row.regularity), 4),
+            "first_seen": row.first_seen.isoformat(),
+            "last_seen": row.last_seen.isoformat(),
+            "next_expected": (row.last_seen + pd.Timedelta(days=float(row.period_days))).isoformat(),
+            # Fixed-amount monthly debits are the signature of an EMI or standing instruction
+            "likely_emi": bool(row.direction == "debit" and period == "monthly" and row.amount_cv < 0.02),
+        })
+    return results
+
+
+def summarize_recurring(recurring: List[Dict]) -> Dict:
+    debits = [r for r in recurring if r["direction"] == "debit"]
+    return {
+        "recurring_count": len(recurring),
+        "recurring_debit_count": len(debits),
+        "likely_emi_count": sum(r["likely_emi"] for r in recurring),
+        "monthly_committed_outflow": round(
+            sum(r["amount_mean"] * 30 / r["period_days"] for r in debits), 2
+        ),
+        "avg_regularity": round(float(np.mean([r["regularity"] for r in recurring])), 4) if recurring else None,
+        "payments": recurring,
+    }
@@ -3,10 +3,32 @@ import json
 import os
 import yaml
 import csv
+import threading
 from datetime import datetime
 from dataclasses import dataclass, asdict
-from typing import Optional, Dict, List
-from prompts import UPI_PARSER_PROMPT, TRANSACTION_ANALYSIS_PROMPT, MERCHANT_VERIFY_PROMPT
+from typing import Optional, Dict, List, Tuple
+from prompts import (UPI_PARSER_PROMPT, TRANSACTION_ANALYSIS_PROMPT, MERCHANT_VERIFY_PROMPT,
+                     UPI_PARSER_BATCH_PROMPT, TRANSACTION_ANALYSIS_BATCH_PROMPT)
+from txn_parser import parse_transaction_line, extract_upi_id
+from lookup_cache import LookupCache, prompt_version
+from batch_engine import BatchAnalyzer, build_limiters
+from llm_client import get_client, LLMError
+from categorizer import categorize
+from upi_handles import parse_handle, resolve_bank
+from merchant_kb import get_merchant_kb, upi_prefix
+
+SEARCH_VERSION = "serper-v1"
+# "upi" entries are written by both the single and the batched parser, so
+# editing either prompt must invalidate them
+UPI_CACHE_VERSION = prompt_version(UPI_PARSER_PROMPT + UPI_PARSER_BATCH_PROMPT)
+
+UPI_FIELDS = ('is_merchant', 'name', 'bank')
+ANALYSIS_FIELDS = ('category', 'transaction_type', 'amount', 'recipient_type')
+VERIFY_FIELDS = ('verified_name',)
+
+def upi_cache_key(upi_id: str) -> str:
+    """Handles are case-insensitive; cache per-counterparty results under one spelling."""
+    return upi_id.strip().lower()
 
 @dataclass
 class UPIData:
@@ -41,6 +63,15 @@ class TransactionAnalyzer:
         self.known_merchants = {}
         self.known_individuals = {}
         self.known_banks = {}
+        # Calls answered with default values because the LLM failed
+        self.fallback_count = 0
+        self._fallback_lock = threading.Lock()
+        self.cache = LookupCache()
+        self.limiters = build_limiters()
+        provider = os.environ.get("LLM_PROVIDER", "groq")
+        self.llm = get_client(provider, limiter=self.limiters.get(provider))
+        self.batch_engine = BatchAnalyzer(self)
+        self.merchants = get_merchant_kb()
         self.output_file = f"transactions_updated.csv"
 
     def load_config(self, file_path='config.yaml'):
@@ -49,97 +80,85 @@ class TransactionAnalyzer:
             for key, value in config.items():
                 os.environ[key] = value
 
-    def _call_ollama(self, prompt: str, system_prompt: str, temperature: float = 0.8, max_retries: int = 3) -> dict:
-        print(f"\n[DEBUG] Making Groq API call with prompt: {prompt[:100]}...")
-        from groq import Groq
-        from time import sleep
-        
-        client = Groq(api_key="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")
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt}
-        ]
-        
-        for attempt in range(max_retries):
-            try:
-                completion = client.chat.completions.create(
-                    model="llama-3.1-70b-versatile",  # Faster model
-                    messages=messages,
-                    temperature=temperature,
-                    max_tokens=1024,  # Reduced for faster response
-                    top_p=1,
-                    stream=False,
-                    stop=None
-                )
-                print(f"[DEBUG] Groq API call completed successfully on attempt {attempt + 1}")
-                
-                response = completion.choices[0].message.content
-                parsed_response = json.loads(response)
-                
-                # Validate required fields
-                required_fields = {'is_merchant', 'name', 'bank'}
-                if not all(field in parsed_response for field in required_fields):
-                    raise ValueError("Missing required fields in response")
-                    
-                if "confidence" not in parsed_response:
-                    parsed_response["confidence"] = 1.0
-                    
-                print(f"[DEBUG] Parsed response: {parsed_response}")
-                return parsed_response
-                
-            except (json.JSONDecodeError, ValueError) as e:
-                print(f"[DEBUG] Attempt {attempt + 1} failed: {str(e)}")
-                if attempt < max_retries - 1:
-                    sleep(1)  # Brief delay between retries
-                    continue
-                
-            except Exception as e:
-                print(f"[DEBUG] Unexpected error on attempt {attempt + 1}: {str(e)}")
-                if attempt < max_retries - 1:
-                    sleep(1)
-                    continue
+    def _call_ollama(self, prompt: str, system_prompt: str, temperature: float = 0.8, max_retries: int = 3,
+                     required_fields=UPI_FIELDS, default: Optional[Dict] = None) -> dict:
+        print(f"\n[DEBUG] Making {self.llm.backend.name} call with prompt: {prompt[:100]}...")
+        try:
+            parsed_response = self.llm.complete_json(
+                system_prompt,
+                prompt,
+                required_fields=required_fields,
+                max_retries=max_retries,
+                temperature=temperature,
+                max_tokens=1024
+            )
+        except LLMError as e:
+            print(f"[DEBUG] {e}, returning default values")
+            with self._fallback_lock:
+                self.fallback_count += 1
+            if default is not None:
+                return dict(default)
+            return {
+                "is_merchant": False,
+                "name": prompt,
+                "bank": "unknown",
+                "confidence": 0.0
+            }
         
-        # Return default values after all retries exhausted
-        print("[DEBUG] All retry attempts failed, returning default values")
-        return {
-            "is_merchant": False,
-            "name": prompt,
-            "bank": "unknown",
-            "confidence": 0.0
-        }
+        if "confidence" not in parsed_response:
+            parsed_response["confidence"] = 1.0
+        print(f"[DEBUG] Parsed response: {parsed_response}")
+        return parsed_response
 
     def _search_merchant(self, merchant_name: str, upi_id: str) -> List[Dict]:
+        cached = self.cache.get("merchant_search", upi_cache_key(upi_id), SEARCH_VERSION)
+        if cached is not None:
+            return cached
         print(f"\n[DEBUG] Performing web search for merchant: {merchant_name}")
         try:
-            response = requests.post(
-                "https://google.serper.dev/search",
-                headers=self.serper_headers,
-                json={"q": f"{merchant_name} business type"}
-            )
+            with self.limiters["serper"]:
+                response = requests.post(
+                    "https://google.serper.dev/search",
+                    headers=self.serper_headers,
+                    json={"q": f"{merchant_name} business type"}
+                )
             results = response.json().get('organic', [])
             print(f"[DEBUG] Found {len(results)} search results")
-            return [{'title': r.get('title', ''), 'snippet': r.get('snippet', '')} 
-                   for r in results[:2]]
+            summary = [{'title': r.get('title', ''), 'snippet': r.get('snippet', '')} 
+                       for r in results[:2]]
+            self.cache.set("merchant_search", upi_cache_key(upi_id), summary, SEARCH_VERSION)
+            return summary
         except Exception as e:
             print(f"[DEBUG] Search failed with error: {str(e)}")
             return [{"error": f"Search failed: {str(e)}"}]
 
-    def get_standardized_name(self, upi_data: UPIData, merchant_info=None) -> str:
+    def get_standardized_name(self, upi_id: str, upi_data: UPIData, merchant_info=None) -> str:
         name = upi_data.name.lower()
         if upi_data.is_merchant:
-            if name in self.known_merchants:
-                return self.known_merchants[name]
+            # Verified names belong to the handle: two handles can share a display
+            # name, and one handle's extracted name can vary between lines
+            key = upi_cache_key(upi_id)
+            if key in self.known_merchants:
+                return self.known_merchants[key]
+            version = prompt_version(MERCHANT_VERIFY_PROMPT)
+            cached = self.cache.get("merchant_verify", key, version)
+            if cached is not None:
+                self.known_merchants[key] = cached
+                return cached
             if merchant_info:
                 verified = self._call_ollama(
                     prompt=json.dumps({"name": name, "info": merchant_info}),
-                    system_prompt=MERCHANT_VERIFY_PROMPT
+                    system_prompt=MERCHANT_VERIFY_PROMPT,
+                    required_fields=VERIFY_FIELDS,
+                    default={}
                 )
                 try:
                     standardized = verified["verified_name"]
+                    self.cache.set("merchant_verify", key, standardized, version)
                 except Exception as e:
                     print(f"[DEBUG] Error verifying merchant: {str(e)}")
                     standardized = name
-                self.known_merchants[name] = standardized
+                self.known_merchants[key] = standardized
                 return standardized
             return name
         else:
@@ -149,6 +168,9 @@ class TransactionAnalyzer:
             return name
 
     def get_bank_name(self, upi_id: str) -> str:
+        bank_name = resolve_bank(upi_id)
+        if bank_name:
+            return bank_name
         if upi_id in self.known_banks:
             return self.known_banks[upi_id]
         bank_name = self.parse_upi_id(upi_id).bank
@@ -156,107 +178,178 @@ class TransactionAnalyzer:
         return bank_name
 
     def parse_upi_id(self, upi_id: str) -> UPIData:
-        if upi_id in self.known_banks:
-            bank = self.known_banks[upi_id]
-            parsed = self._call_ollama(prompt=upi_id, system_prompt=UPI_PARSER_PROMPT)
-            parsed['bank'] = bank
-            return UPIData(**parsed)
+        local = parse_handle(upi_id)
+        if local is not None:
+            self.known_banks[upi_id] = local['bank']
+            return UPIData(**local)
+        version = UPI_CACHE_VERSION
+        cached = self.cache.get("upi", upi_id, version)
+        if cached is not None:
+            self.known_banks[upi_id] = cached['bank']
+            return UPIData(**cached)
         parsed = self._call_ollama(prompt=upi_id, system_prompt=UPI_PARSER_PROMPT)
+        parsed = {k: parsed[k] for k in ('is_merchant', 'name', 'bank', 'confidence')}
+        if resolve_bank(upi_id):
+            parsed['bank'] = resolve_bank(upi_id)
+        elif upi_id in self.known_banks:
+            parsed['bank'] = self.known_banks[upi_id]
+        # Failed calls come back with zero confidence; don't pin those.
+        if parsed['confidence'] > 0:
+            self.cache.set("upi", upi_id, parsed, version)
         self.known_banks[upi_id] = parsed['bank']
         return UPIData(**parsed)
 
-    def save_transaction(self, transaction_data: TransactionData):
-        exists = os.path.exists(self.output_file)
+    def prefetch_upi_ids(self, upi_ids: List[str]) -> int:
+        """Parses every uncached UPI ID with batched LLM calls and warms the cache.
 
-    def analyze_transaction(self, transaction: str) -> TransactionData:
-        print(f"\n[DEBUG] Starting analysis for transaction: {transaction}")
-        date_str = transaction.split()[0]
-        upi_id = transaction.split('@')[0] + '@' + transaction.split('@')[1].split()[0]
-        print(f"[DEBUG] Extracted UPI ID: {upi_id}")
-        
-        upi_data = self.parse_upi_id(upi_id)
-        print(f"[DEBUG] Parsed UPI data: {upi_data}")
-        
-        merchant_info = None
-        if upi_data.is_merchant:
-            print("[DEBUG] Merchant detected, performing web search")
-            merchant_info = self._search_merchant(upi_data.name, upi_id)
-        
-        recipient_name = self.get_standardized_name(upi_data, merchant_info)
-        print(f"[DEBUG] Standardized recipient name: {recipient_name}")
-        
-        print("[DEBUG] Performing transaction analysis with Groq")
-        analysis = self._call_ollama(
-            prompt=json.dumps({
-                "transaction": transaction,
-                "upi_data": asdict(upi_data),
-                "merchant_info": merchant_info
-            }),
-            system_prompt=TRANSACTION_ANALYSIS_PROMPT
+        IDs the batch reply dropped or mangled are left uncached, so the
+        per-ID parse_upi_id path picks them up later. Returns the number of
+        IDs resolved here.
+        """
+        version = UPI_CACHE_VERSION
+        misses = [u for u in dict.fromkeys(upi_ids)
+                  if parse_handle(u) is None and self.cache.get("upi", u, version) is None]
+        if len(misses) < 2:
+            return 0
+        print(f"[DEBUG] Batch parsing {len(misses)} uncached UPI IDs")
+        replies = self.llm.complete_json_batch(
+            UPI_PARSER_BATCH_PROMPT,
+            [{"upi_id": u} for u in misses],
+            required_fields=UPI_FIELDS,
+            output_tokens_per_item=50,
+            temperature=0.8
         )
-        
-        amount = abs(float(analysis["amount"]))
-        if analysis["transaction_type"] == "debit" or "debited" in transaction.lower():
-            amount = -amount
-        print(f"[DEBUG] Final amount calculated: {amount}")
-        
-        transaction_data = TransactionData(
-            raw_transaction=transaction,
-            upi_id=upi_id,
-            amount=amount,
-            date=date_str,
-            transaction_type=analysis["transaction_type"],
-            recipient_type=analysis["recipient_type"],
-            category=analysis["category"],
-            bank=upi_data.bank,
-            recipient_name=recipient_name,
-            merchant_info=merchant_info
+        resolved = 0
+        for upi_id, reply in zip(misses, replies):
+            if reply is None:
+                continue
+            parsed = {k: reply[k] for k in UPI_FIELDS}
+            parsed['confidence'] = reply.get('confidence', 1.0)
+            if parsed['confidence'] > 0:
+                self.cache.set("upi", upi_id, parsed, version)
+            self.known_banks[upi_id] = parsed['bank']
+            resolved += 1
+        return resolved
+
+    def _analysis_default(self, transaction: str, upi_data: UPIData) -> Dict:
+        return {
+            "category": "other",
+            "transaction_type": "debit" if "debited" in transaction.lower() else "credit",
+            "amount": 0.0,
+            "recipient_type": "merchant" if upi_data.is_merchant else "individual"
+        }
+
+    def analyze_fallback_batch(self, items: List[Tuple[str, Tuple]]) -> List[Dict]:
+        """Runs TRANSACTION_ANALYSIS over lines the grammar rejects, many per call.
+
+        `items` pairs each raw line with its resolved counterparty. Elements the
+        batch reply does not answer fall back to one single-line call each.
+        """
+        payloads = [
+            {"transaction": tx, "upi_data": asdict(upi_data), "merchant_info": merchant_info}
+            for tx, (upi_data, merchant_info, _) in items
+        ]
+        replies = self.llm.complete_json_batch(
+            TRANSACTION_ANALYSIS_BATCH_PROMPT,
+            payloads,
+            required_fields=ANALYSIS_FIELDS,
+            output_tokens_per_item=70,
+            temperature=0.8
         )
-        
-        print("[DEBUG] Saving transaction to CSV")
-        self.save_transaction(transaction_data)
-        print("[DEBUG] Transaction analysis completed")
-        with open(self.output_file, 'a', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=asdict(transaction_data).keys())
-            if not writer.writeheader():
-                writer.writerow(asdict(transaction_data))
-        return transaction_data
-    
+        analyses = []
+        for (tx, (upi_data, _, _)), payload, reply in zip(items, payloads, replies):
+            if reply is None:
+                reply = self._call_ollama(
+                    prompt=json.dumps(payload),
+                    system_prompt=TRANSACTION_ANALYSIS_PROMPT,
+                    required_fields=ANALYSIS_FIELDS,
+                    default=self._analysis_default(tx, upi_data)
+                )
+            analyses.append(reply)
+        return analyses
 
-    def analyze_transaction(self, transaction: str) -> TransactionData:
-        date_str = transaction.split()[0]
-        upi_id = transaction.split('@')[0] + '@' + transaction.split('@')[1].split()[0]
-        
+    def save_transaction(self, transaction_data: TransactionData):
+        exists = os.path.exists(self.output_file)
+
+    def resolve_counterparty(self, upi_id: str) -> Tuple[UPIData, Optional[List[Dict]], str]:
         upi_data = self.parse_upi_id(upi_id)
         
         merchant_info = None
         if upi_data.is_merchant:
+            record = self.merchants.lookup(upi_data.name, upi_id)
+            if record is not None:
+                return upi_data, record.info, record.canonical
             merchant_info = self._search_merchant(upi_data.name, upi_id)
         
-        recipient_name = self.get_standardized_name(upi_data, merchant_info)
+        recipient_name = self.get_standardized_name(upi_id, upi_data, merchant_info)
+        if upi_data.is_merchant and merchant_info and "error" not in merchant_info[0]:
+            # Remember the resolution so the next sighting never leaves the machine
+            self.merchants.add(recipient_name, aliases=[upi_data.name], upi_prefixes=[upi_prefix(upi_id)],
+                               info=merchant_info)
+        return upi_data, merchant_info, recipient_name
+
+    def analyze_transaction(self, transaction: str, counterparty=None, analysis: Optional[Dict] = None) -> TransactionData:
+        parsed = parse_transaction_line(transaction)
+        if parsed:
+            upi_id = parsed.upi_id
+            date_str = parsed.date
+        else:
+            upi_id = extract_upi_id(transaction) or transaction.strip()
+            date_str = transaction.split()[0] if transaction.split() else ""
         
-        analysis = self._call_ollama(
-            prompt=json.dumps({
-                "transaction": transaction,
-                "upi_data": asdict(upi_data),
-                "merchant_info": merchant_info
-            }),
-            system_prompt=TRANSACTION_ANALYSIS_PROMPT
-        )
+        upi_data, merchant_info, recipient_name = counterparty or self.resolve_counterparty(upi_id)
         
-        # Take absolute value of amount and set sign based on transaction type
-        amount = abs(float(analysis["amount"]))
-        if analysis["transaction_type"] == "debit" or "debited" in transaction.lower():
-            amount = -amount
+        if parsed:
+            # Amount, direction and date come straight from the grammar and the
+            # category from the local model; the LLM only sees lines the model
+            # is unsure about.
+            amount = parsed.amount
+            transaction_type = parsed.transaction_type
+            recipient_type = "merchant" if upi_data.is_merchant else "individual"
+            if analysis is None:
+                category = categorize([transaction])[0]
+                if category is None:
+                    category = self._call_ollama(
+                        prompt=json.dumps({
+                            "transaction": transaction,
+                            "upi_data": asdict(upi_data),
+                            "merchant_info": merchant_info
+                        }),
+                        system_prompt=TRANSACTION_ANALYSIS_PROMPT,
+                        required_fields=ANALYSIS_FIELDS,
+                        default=self._analysis_default(transaction, upi_data)
+                    )["category"]
+            else:
+                category = analysis.get("category", "other")
+        else:
+            if analysis is None:
+                analysis = self._call_ollama(
+                    prompt=json.dumps({
+                        "transaction": transaction,
+                        "upi_data": asdict(upi_data),
+                        "merchant_info": merchant_info
+                    }),
+                    system_prompt=TRANSACTION_ANALYSIS_PROMPT,
+                    required_fields=ANALYSIS_FIELDS,
+                    default=self._analysis_default(transaction, upi_data)
+                )
+            
+            # Take absolute value of amount and set sign based on transaction type
+            amount = abs(float(analysis["amount"]))
+            if analysis["transaction_type"] == "debit" or "debited" in transaction.lower():
+                amount = -amount
+            transaction_type = analysis["transaction_type"]
+            recipient_type = analysis["recipient_type"]
+            category = analysis["category"]
         
         transaction_data = TransactionData(
             raw_transaction=transaction,
             upi_id=upi_id,
             amount=amount,
             date=date_str,
-            transaction_type=analysis["transaction_type"],
-            recipient_type=analysis["recipient_type"],
-            category=analysis["category"],
+            transaction_type=transaction_type,
+            recipient_type=recipient_type,
+            category=category,
             bank=upi_data.bank,
             recipient_name=recipient_name,
             merchant_info=merchant_info
@@ -266,7 +359,7 @@ class TransactionAnalyzer:
         return transaction_data
 
     def batch_process(self, transactions: List[str]) -> List[TransactionData]:
-        return [self.analyze_transaction(tx) for tx in transactions]
+        return self.batch_engine.process(transactions)
 
 def main():
     analyzer = TransactionAnalyzer()
@@ -0,0 +1,22 @@
+import os
+import sys
+import tempfile
+
+# Every store reads its location from the environment at import time, so
+# point them all at a scratch directory before any module is imported.
+_ROOT = tempfile.mkdtemp(prefix="udan-tests-")
+for name, path in {
+    "UDAN_WAREHOUSE_ROOT": "warehouse",
+    "UDAN_WORKSPACE_ROOT": "applications",
+    "UDAN_BLOB_ROOT": "blobs",
+    "UDAN_FEATURE_DB": "cache/features.sqlite3",
+    "UDAN_FORECAST_DB": "cache/forecasts.sqlite3",
+    "UDAN_JOB_DB": "cache/jobs.sqlite3",
+    "UDAN_CACHE_PATH": "cache/lookup_cache.sqlite3",
+    "UDAN_CHART_CACHE": "cache/charts",
+    "UDAN_MERCHANT_KB_PATH": "cache/merchant_kb.sqlite3",
+    "UDAN_CATEGORIZER_PATH": "cache/categorizer.joblib",
+}.items():
+    os.environ[name] = os.path.join(_ROOT, path)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
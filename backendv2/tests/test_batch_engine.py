@@ -0,0 +1,75 @@
+import time
+import random
+import threading
+
+from batch_engine import BatchAnalyzer, ProviderLimiter, backoff_delay
+
+
+class FakeAnalyzer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.resolved = []
+        self.prefetched = None
+        self.fallback_lines = None
+
+    def prefetch_upi_ids(self, upi_ids):
+        self.prefetched = list(upi_ids)
+
+    def resolve_counterparty(self, upi_id):
+        time.sleep(random.uniform(0, 0.01))  # finish out of order
+        with self.lock:
+            self.resolved.append(upi_id)
+        return ("party", upi_id)
+
+    def analyze_fallback_batch(self, items):
+        self.fallback_lines = [tx for tx, _ in items]
+        return [{"category": "llm"} for _ in items]
+
+    def analyze_transaction(self, tx, counterparty=None, analysis=None):
+        time.sleep(random.uniform(0, 0.01))
+        return tx, counterparty[1], analysis["category"]
+
+
+def test_results_keep_input_order_and_counterparties_resolve_once(monkeypatch):
+    lines = [f"INR {i + 1} debited to shop{i % 3}@okaxis" for i in range(12)] + ["paid rent to landlord@oksbi"]
+    monkeypatch.setattr("batch_engine.categorize", lambda texts: ["food" if i % 2 == 0 else None
+                                                                   for i in range(len(texts))])
+    analyzer = FakeAnalyzer()
+    results = BatchAnalyzer(analyzer, max_workers=4).process(lines)
+
+    assert [tx for tx, _, _ in results] == lines
+    assert [upi for _, upi, _ in results][:3] == ["shop0@okaxis", "shop1@okaxis", "shop2@okaxis"]
+    assert results[-1][1] == "landlord@oksbi"
+    assert sorted(analyzer.resolved) == sorted(set(analyzer.resolved))
+    assert analyzer.prefetched == ["shop0@okaxis", "shop1@okaxis", "shop2@okaxis", "landlord@oksbi"]
+    # grammar misses and low-confidence lines go to the LLM in one batch
+    assert analyzer.fallback_lines == [line for i, line in enumerate(lines) if i % 2 == 1 or i == 12]
+    assert [c for _, _, c in results] == ["llm" if i % 2 == 1 or i == 12 else "food" for i in range(13)]
+
+
+def test_empty_batch():
+    assert BatchAnalyzer(FakeAnalyzer()).process([]) == []
+
+
+def test_limiter_caps_concurrency():
+    limiter = ProviderLimiter("test", max_concurrency=2, rate=1000.0, burst=1000.0)
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def call():
+        with limiter:
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+
+
+def test_backoff_is_capped():
+    assert all(0 <= backoff_delay(attempt, cap=3.0) <= 3.0 for attempt in range(20))
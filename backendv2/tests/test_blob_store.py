@@ -0,0 +1,55 @@
+import hashlib
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from blob_store import BlobStore, file_digest
+
+
+def test_identical_uploads_are_stored_once(tmp_path):
+    store = BlobStore(str(tmp_path))
+    data = b"%PDF-1.4 statement"
+    digest, path, size = store.put_stream(io.BytesIO(data), ".PDF")
+    assert digest == hashlib.sha256(data).hexdigest() and size == len(data)
+    assert path == store.blob_path(digest, ".pdf") and open(path, "rb").read() == data
+    assert store.put_stream(io.BytesIO(data), ".pdf")[1] == path
+    assert file_digest(path) == digest
+    assert os.listdir(store.tmp_dir) == []
+
+
+def test_oversized_stream_is_rejected_and_spool_removed(tmp_path):
+    store = BlobStore(str(tmp_path))
+    with pytest.raises(ValueError):
+        store.put_stream(io.BytesIO(b"x" * 100), ".txt", max_bytes=10)
+    assert os.listdir(store.tmp_dir) == []
+
+
+def test_result_is_memoized_only_on_clean_exit(tmp_path):
+    store = BlobStore(str(tmp_path))
+    rows = pd.DataFrame({"raw_transaction": ["a"], "amount": [1.0], "date": ["2024-03-05"]})
+    with pytest.raises(RuntimeError):
+        with store.result_writer("d1", "v1") as result:
+            result.write(rows)
+            raise RuntimeError("analysis failed")
+    assert store.load_result("d1", "v1") is None
+    with store.result_writer("d1", "v1") as result:
+        result.write(rows)
+        result.discard()
+    assert store.load_result("d1", "v1") is None
+    with store.result_writer("d1", "v1") as result:
+        result.write(rows)
+    assert store.load_result("d1", "v1")["raw_transaction"].tolist() == ["a"]
+
+
+def test_rows_with_unparseable_dates_are_not_memoized(tmp_path):
+    store = BlobStore(str(tmp_path))
+    with store.result_writer("d2", "v1") as result:
+        result.write(pd.DataFrame({
+            "raw_transaction": ["good", "bad", "undated"],
+            "amount": [1.0, 2.0, 3.0],
+            "date": ["05/03/2024", "sometime", None],
+        }))
+    cached = store.load_result("d2", "v1")
+    assert cached["raw_transaction"].tolist() == ["good", "undated"]
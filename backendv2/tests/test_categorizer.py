@@ -0,0 +1,66 @@
+import os
+
+import pandas as pd
+
+import categorizer
+from categorizer import load_training_frame, train_from_history, transaction_text
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MERCHANTS = {
+    "food": ["swiggy", "zomato", "dominos", "cafe coffee day"],
+    "transport": ["uber", "ola cabs", "rapido", "irctc"],
+    "utilities": ["bescom electricity", "airtel recharge", "jio prepaid", "water board"],
+    "shopping": ["amazon", "flipkart", "myntra", "ajio"],
+}
+
+
+def labeled_csv(path, per_category=15):
+    rows = [
+        # digits collapse during featurization, so vary a word to keep rows distinct
+        {"raw_transaction": f"INR {100 + i} debited to {name.replace(' ', '.')}@okaxis {name} ref {chr(97 + i) * 2}",
+         "category": category}
+        for category, names in MERCHANTS.items()
+        for i in range(per_category)
+        for name in [names[i % len(names)]]
+    ]
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return rows
+
+
+def test_transaction_text_collapses_digits_and_noise():
+    assert transaction_text("INR 500 debited to Swiggy.75839@okicici!") == "inr # debited to swiggy.#@okicici"
+
+
+def test_non_utf8_exports_are_read_and_unusable_files_logged(tmp_path, capsys):
+    (tmp_path / "latin1.csv").write_bytes(b"raw_transaction,category\nPaid \xb7 swiggy,Food\n")
+    (tmp_path / "empty.csv").write_bytes(b"")
+    (tmp_path / "unlabeled.csv").write_text("raw_transaction,amount\nx,1\n")
+    data = load_training_frame([str(tmp_path / "*.csv")])
+    assert data["category"].tolist() == ["food"]
+    out = capsys.readouterr().out
+    assert "Skipping" in out and "empty.csv" in out and "unlabeled.csv" in out
+
+
+def test_checked_in_history_is_fully_read():
+    sources = [os.path.join(REPO, "transactions_updated.csv")]
+    assert len(load_training_frame(sources)) > 0
+
+
+def test_refuses_to_persist_a_model_below_the_minimum(tmp_path):
+    labeled_csv(tmp_path / "small.csv", per_category=2)
+    model_path = str(tmp_path / "model.joblib")
+    assert train_from_history([str(tmp_path / "small.csv")], path=model_path) is None
+    assert not os.path.exists(model_path)
+
+
+def test_trains_persists_and_predicts(tmp_path):
+    labeled_csv(tmp_path / "history.csv")
+    model_path = str(tmp_path / "model.joblib")
+    model = train_from_history([str(tmp_path / "history.csv")], path=model_path)
+    assert model is not None and os.path.exists(model_path)
+    reloaded = categorizer.TransactionCategorizer.load(model_path)
+    labels, confidence = reloaded.predict(["INR 250 debited to zomato77@okaxis zomato",
+                                           "INR 90 debited to uber.rides@okaxis uber"])
+    assert labels == ["food", "transport"]
+    assert (confidence > 0.25).all()
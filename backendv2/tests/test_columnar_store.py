@@ -0,0 +1,48 @@
+import os
+
+import pandas as pd
+
+from columnar_store import (
+    QUARANTINE_ROOT, delete_transactions, parse_dates, partition_files, read_transactions,
+    write_transactions,
+)
+
+
+def frame(dates):
+    return pd.DataFrame({
+        "raw_transaction": [f"txn {i}" for i in range(len(dates))],
+        "upi_id": ["shop@okaxis"] * len(dates),
+        "amount": [100.0] * len(dates),
+        "transaction_type": ["debit"] * len(dates),
+        "date": dates,
+    })
+
+
+def test_parse_dates_handles_known_formats_and_leaves_garbage_unparsed():
+    parsed = parse_dates(pd.Series([
+        "2024-03-05", "05/03/2024", "05-03-24", "5 Mar 2024", "2024-03-05 10:15:00", "not a date", None,
+    ]))
+    assert [d.strftime("%Y-%m-%d") for d in parsed[:5]] == ["2024-03-05"] * 5
+    assert parsed[5:].isna().all()
+
+
+def test_unparseable_dates_are_quarantined_not_written():
+    written = write_transactions("cs-quarantine", frame(["05/03/2024", "yesterday", "06/04/2024"]))
+    assert written == 2
+    months = sorted(os.path.basename(os.path.dirname(p)) for p in partition_files("cs-quarantine"))
+    assert months == ["month=2024-03", "month=2024-04"]
+    quarantined = pd.read_csv(os.path.join(QUARANTINE_ROOT, "cs-quarantine.csv"))
+    assert quarantined["date"].tolist() == ["yesterday"]
+    assert quarantined["reason"].tolist() == ["unparseable date"]
+
+
+def test_delete_transactions_makes_rewrites_idempotent():
+    for _ in range(2):
+        delete_transactions("cs-rerun")
+        write_transactions("cs-rerun", frame(["05/03/2024", "bad"]))
+    assert len(read_transactions(["cs-rerun"])) == 1
+    assert len(pd.read_csv(os.path.join(QUARANTINE_ROOT, "cs-rerun.csv"))) == 1
+
+    delete_transactions("cs-rerun")
+    assert partition_files("cs-rerun") == []
+    assert not os.path.exists(os.path.join(QUARANTINE_ROOT, "cs-rerun.csv"))
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation import (PRIMARY_ACCOUNT, build_spend_tensor, pairwise_correlations, correlate_accounts,
+                         related_party_correlation)
+
+
+def transactions():
+    rows = []
+    for month, (mine, partner, other) in enumerate([(100, 200, 50), (300, 600, 40), (200, 400, 60), (400, 800, 10)]):
+        day = f"2024-{month + 1:02d}-10"
+        rows += [
+            {"date": day, "amount": -mine, "category": "food", "account": None},
+            {"date": day, "amount": -partner, "category": "food", "account": "partner@oksbi"},
+            {"date": day, "amount": -other, "category": "shopping", "account": "friend@okaxis"},
+            {"date": day, "amount": 5000, "category": "other", "account": None},  # inflow, ignored
+        ]
+    return pd.DataFrame(rows)
+
+
+def test_tensor_axes_and_totals():
+    tensor = build_spend_tensor(transactions())
+    assert tensor.months == ["2024-01", "2024-02", "2024-03", "2024-04"]
+    assert tensor.accounts == ["friend@okaxis", "partner@oksbi", PRIMARY_ACCOUNT]
+    assert tensor.categories == ["food", "shopping"]
+    assert tensor.values.shape == (4, 3, 2)
+    np.testing.assert_allclose(tensor.totals()[:, 2], [100, 300, 200, 400])
+
+
+def test_tensor_zero_fills_empty_months():
+    df = pd.DataFrame({"date": ["2024-01-05", "2024-03-05"], "amount": [-10, -20],
+                       "category": ["food", "food"], "account": ["a", "a"]})
+    tensor = build_spend_tensor(df)
+    assert tensor.months == ["2024-01", "2024-02", "2024-03"]
+    np.testing.assert_allclose(tensor.totals()[:, 0], [10, 0, 20])
+
+
+def test_pairwise_matches_numpy_corrcoef():
+    rng = np.random.default_rng(0)
+    series = rng.normal(size=(12, 4, 3))
+    result = pairwise_correlations(series)
+    for k in range(3):
+        np.testing.assert_allclose(result[k], np.corrcoef(series[:, :, k].T), atol=1e-12)
+
+
+def test_constant_series_gives_nan():
+    series = np.array([[1.0, 2.0], [1.0, 3.0], [1.0, 5.0]])[:, :, None]
+    assert np.isnan(pairwise_correlations(series)[0, 0, 1])
+
+
+def test_report_pairs_sorted_by_strength():
+    report = correlate_accounts(build_spend_tensor(transactions()))
+    top = report["pairs"][0]
+    assert sorted(top["accounts"]) == ["partner@oksbi", PRIMARY_ACCOUNT]
+    assert top["overall"] == pytest.approx(1.0)
+    assert correlate_accounts(build_spend_tensor(transactions()), min_months=6)["pairs"] == []
+
+
+def test_related_party_correlation_treats_primary_as_own():
+    df = transactions()
+    expected = np.mean([1.0, np.corrcoef([100, 300, 200, 400], [50, 40, 60, 10])[0, 1]])
+    assert related_party_correlation(df, []) == pytest.approx(expected)
+    # marking the partner as the applicant's own leaves only the friend as linked
+    own_only = related_party_correlation(df, ["partner@oksbi"])
+    assert own_only < 0
+    assert related_party_correlation(df, [], min_months=5) is None
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from columnar_store import write_transactions, read_forecasts
+from forecasting import (CashFlowForecaster, daily_net_flow, fit_model, update_model, forecast_from_state,
+                         forecast_batch, forecast_frame, forecast_portfolio)
+
+
+def flows(start, days, seed=0, base=-100.0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=days, freq="D")
+    weekly = np.where(dates.weekday >= 5, -300.0, 0.0)  # weekend spending
+    return pd.DataFrame({"date": dates, "amount": base + weekly + rng.normal(0, 20, days)})
+
+
+def test_daily_net_flow_zero_fills_gaps():
+    df = pd.DataFrame({"date": ["2024-01-01", "2024-01-01", "2024-01-04", "bad"], "amount": [10, -4, 5, 1]})
+    daily = daily_net_flow(df)
+    assert list(daily.index.strftime("%Y-%m-%d")) == ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04"]
+    assert list(daily) == [6.0, 0.0, 0.0, 5.0]
+
+
+def test_fit_learns_level_and_weekly_pattern():
+    state = fit_model(daily_net_flow(flows("2024-01-01", 120)))
+    assert state["observations"] == 120
+    assert state["cutoff"] == "2024-04-30"
+    forecast = forecast_from_state(state, 14)
+    by_day = {pd.Timestamp(d["date"]).weekday(): d["net"] for d in forecast["daily"]}
+    assert by_day[5] < by_day[2] - 200
+    assert forecast["outlook"] == "loss"
+    assert forecast["interval"][0] < forecast["next_period_total"] < forecast["interval"][1]
+    assert not forecast["low_confidence"]
+
+
+def test_monthly_payday_is_forecast():
+    # ~-100/day spending with a 5000 salary on the 1st: a 30-day window nets about +2000
+    dates = pd.date_range("2024-01-01", periods=120, freq="D")
+    amounts = -100.0 + np.where(dates.day == 1, 5000.0, 0.0) + np.random.default_rng(4).normal(0, 10, 120)
+    forecast = forecast_frame(pd.DataFrame({"date": dates, "amount": amounts}), 30)
+    assert forecast["outlook"] == "profit"
+    assert forecast["next_period_total"] == pytest.approx(2000, abs=500)
+    payday = next(d for d in forecast["daily"] if d["date"] == "2024-05-01")
+    assert payday["net"] > 4000
+
+
+def test_short_history_has_no_monthly_profile():
+    state = fit_model(daily_net_flow(flows("2024-01-01", 45)))
+    assert not any(state["monthly"])
+
+
+def test_update_folds_in_only_new_days():
+    daily = daily_net_flow(flows("2024-01-01", 90))
+    state = fit_model(daily[:60])
+    assert update_model(state, daily[:60]) is state
+    updated = update_model(state, daily)
+    assert updated["params"] == state["params"]
+    assert updated["observations"] == 90
+    assert updated["cutoff"] == "2024-03-31"
+    assert updated["sse"] > state["sse"]
+
+
+def test_batch_fit_matches_single_fits():
+    a, b = flows("2024-01-01", 120, seed=1), flows("2024-02-10", 45, seed=2, base=50.0)
+    df = pd.concat([a.assign(application_id="a"), b.assign(application_id="b")], ignore_index=True)
+    rows, states = forecast_batch(df, horizon=30)
+    assert [r["application_id"] for r in rows] == ["a", "b"]
+    for name, frame in (("a", a), ("b", b)):
+        single = fit_model(daily_net_flow(frame))
+        batch = states[name]
+        assert batch["params"] == single["params"]
+        assert batch["start"] == single["start"] and batch["cutoff"] == single["cutoff"]
+        assert batch["level"] == pytest.approx(single["level"])
+        assert batch["trend"] == pytest.approx(single["trend"])
+        np.testing.assert_allclose(batch["season"], single["season"])
+        np.testing.assert_allclose(batch["monthly"], single["monthly"])
+        row = rows[0] if name == "a" else rows[1]
+        assert row["next_period_total"] == forecast_from_state(single, 30)["next_period_total"]
+
+
+def test_forecaster_updates_forward_and_refits_on_backfill(tmp_path):
+    forecaster = CashFlowForecaster(str(tmp_path / "forecasts.sqlite3"))
+    history = flows("2024-01-01", 150, seed=3)
+    write_transactions("backfill", history[(history["date"] >= "2024-03-01") & (history["date"] < "2024-05-01")])
+    first = forecaster.model_for("backfill")
+    assert first["start"] == "2024-03-01" and first["cutoff"] == "2024-05-01"
+
+    # newer days are folded into the stored state
+    write_transactions("backfill", history[history["date"] >= "2024-05-01"])
+    newer = forecaster.model_for("backfill")
+    assert newer["start"] == "2024-03-01"
+    assert newer["params"] == first["params"]
+    assert newer["observations"] == first["observations"] + 29
+
+    # an older statement changes history before the cutoff, so the model is refitted
+    write_transactions("backfill", history[history["date"] < "2024-03-01"])
+    refit = forecaster.model_for("backfill")
+    assert refit["start"] == "2024-01-01"
+    assert refit["observations"] == 150
+    assert forecaster.load_state("backfill") == refit
+
+
+def test_portfolio_subset_run_keeps_other_applicants():
+    for name, seed in (("p1", 5), ("p2", 6), ("p3", 7)):
+        write_transactions(name, flows("2024-01-01", 90, seed=seed))
+    ids = ["p1", "p2", "p3"]
+    full = forecast_portfolio(ids, workers=2, chunk_size=1, run_date="2024-04-01")
+    assert sorted(full["application_id"]) == ids
+
+    # a rerun for one applicant only replaces that applicant's row
+    write_transactions("p2", flows("2024-03-31", 5, seed=8, base=500.0))
+    forecast_portfolio(["p2"], run_date="2024-04-01")
+    stored = read_forecasts(ids, run_date="2024-04-01").set_index("application_id")
+    assert sorted(stored.index) == ids
+    assert stored.at["p2", "forecast_start"] == pd.Timestamp("2024-04-05")
+    assert stored.at["p1", "next_period_total"] == full.set_index("application_id").at["p1", "next_period_total"]
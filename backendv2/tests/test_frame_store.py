@@ -0,0 +1,48 @@
+import pandas as pd
+
+from columnar_store import write_transactions
+from frame_store import DataFrameStore
+
+
+def transactions(n):
+    return pd.DataFrame({
+        "date": ["05/01/2024"] * n,
+        "raw_transaction": [f"UPI/{i}/shop@okaxis" for i in range(n)],
+        "upi_id": ["shop@okaxis"] * n,
+        "amount": [100.0] * n,
+        "transaction_type": ["debit"] * n,
+    })
+
+
+def test_version_changes_only_when_data_does():
+    store = DataFrameStore()
+    write_transactions("fs-version", transactions(3))
+    df, version = store.get_frame("fs-version")
+    assert len(df) == 3
+    assert store.get_frame("fs-version")[1] == version
+    write_transactions("fs-version", transactions(2))
+    df, new_version = store.get_frame("fs-version")
+    assert len(df) == 5 and new_version != version
+
+
+def test_least_recently_used_application_is_evicted_and_listeners_notified():
+    write_transactions("fs-a", transactions(50))
+    write_transactions("fs-b", transactions(50))
+    write_transactions("fs-c", transactions(50))
+    probe = DataFrameStore()
+    probe.get_frame("fs-a")
+    one_app = probe._apps["fs-a"].nbytes
+
+    store = DataFrameStore(memory_budget=int(one_app * 2.5))
+    evicted = []
+    store.add_eviction_listener(evicted.append)
+    store.get_frame("fs-a")
+    store.get_frame("fs-b")
+    store.get_frame("fs-a")  # b is now least recently used
+    store.get_frame("fs-c")
+    assert evicted == ["fs-b"]
+    assert store.current_version("fs-b") is None
+    assert store.current_version("fs-a") is not None
+
+    store.invalidate("fs-a")
+    assert evicted == ["fs-b", "fs-a"]
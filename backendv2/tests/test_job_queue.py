@@ -0,0 +1,85 @@
+import time
+import socket
+
+from job_queue import JobQueue, JobReporter
+
+
+def wait_for(queue, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+def files_handler(payload, reporter):
+    reporter.set_files(payload["files"])
+    for name in payload["files"]:
+        reporter.file_started(name)
+        reporter.file_progress(name, 10, [{"row": 1}])
+        if name in payload.get("fail", []):
+            reporter.file_failed(name, "boom")
+        elif name in payload.get("partial", []):
+            reporter.file_partial(name, "pages 3-4 failed")
+        else:
+            reporter.file_done(name, {"file": name})
+
+
+def test_final_status_reflects_per_file_outcomes(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), workers=2, poll_interval=0.01)
+    queue.register("files", files_handler)
+    queue.register("crash", lambda payload, reporter: 1 / 0)
+    queue.start()
+    done = queue.enqueue("files", {"files": ["a", "b"]})
+    partial = queue.enqueue("files", {"files": ["a", "b"], "fail": ["b"]})
+    truncated = queue.enqueue("files", {"files": ["a"], "partial": ["a"]})
+    failed = queue.enqueue("files", {"files": ["a", "b"], "fail": ["a", "b"]})
+    crashed = queue.enqueue("crash", {})
+
+    job = wait_for(queue, done)
+    assert job["status"] == "done" and job["error"] is None
+    assert job["progress"] == {"a": {"status": "done"}, "b": {"status": "done"}}
+    assert job["results"] == [{"file": "a"}, {"file": "b"}]
+    assert wait_for(queue, partial)["status"] == "partial"
+    assert wait_for(queue, truncated)["error"] == "1 of 1 files were only partly extracted"
+    assert wait_for(queue, failed)["error"] == "2 of 2 files failed"
+    assert "division by zero" in wait_for(queue, crashed)["error"]
+
+
+def test_progress_keeps_only_count_and_preview(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    job_id = queue.enqueue("files", {})
+    reporter = JobReporter(queue, job_id)
+    reporter.set_files(["a"])
+    for processed in (100, 200, 300):
+        reporter.file_progress("a", processed, [{"row": 1}])
+    job = queue.get(job_id)
+    assert job["progress"]["a"] == {"status": "running", "processed": 300, "preview": [{"row": 1}]}
+    assert job["results"] == []
+
+
+def test_recover_requeues_jobs_of_dead_owners(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    queue = JobQueue(path)
+    orphan = queue.enqueue("files", {})
+    alive = queue.enqueue("files", {})
+    conn = queue._connect()
+    conn.execute("UPDATE jobs SET status='running', owner=? WHERE id=?", (f"{socket.gethostname()}:999999999", orphan))
+    conn.execute("UPDATE jobs SET status='running', owner=? WHERE id=?", ("other-host:1", alive))
+
+    JobQueue(path).recover()
+    assert queue.get(orphan)["status"] == "queued"
+    assert queue.get(alive)["status"] == "running"
+
+
+def test_cancel_only_withdraws_unclaimed_jobs(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    queued = queue.enqueue("files", {})
+    running = queue.enqueue("files", {})
+    queue._connect().execute("UPDATE jobs SET status='running' WHERE id=?", (running,))
+    assert queue.cancel(queued, "Upload rejected") is True
+    assert queue.get(queued)["status"] == "cancelled" and queue.get(queued)["error"] == "Upload rejected"
+    assert queue.cancel(running, "Upload rejected") is False
+    assert queue.get(running)["status"] == "running"
@@ -0,0 +1,66 @@
+from llm_csv import ParseReport, ExtractionIncomplete, iter_text_lines, iter_transaction_rows
+
+
+def rows(text, report=None):
+    return list(iter_transaction_rows(iter_text_lines([text]), report))
+
+
+def test_fenced_output_with_header_and_quoted_fields():
+    text = (
+        "```csv\n"
+        "Raw Transaction,UPI ID,Amount,Transaction Type,Recipient Type,Category,Bank,Recipient Name\n"
+        "\"Lunch, with team\",swiggy@okicici,INR 450,debit,merchant,Food,HDFC,Swiggy\n"
+        "```\n"
+    )
+    [row] = rows(text)
+    assert row["raw_transaction"] == "Lunch, with team"
+    assert row["amount"] == -450.0
+    assert row["category"] == "food"
+    assert row["bank"] == "hdfc"
+
+
+def test_missing_header_and_unquoted_comma_are_repaired():
+    [row] = rows("Dinner, drinks,bar@okaxis,₹1200,,merchant,party,,Bar\n")
+    assert row["raw_transaction"] == "Dinner,drinks"
+    # no type given: the sign and the text decide, unknown categories become "other"
+    assert row["transaction_type"] == "credit" and row["amount"] == 1200.0
+    assert row["category"] == "other"
+    assert row["bank"] == "unknown"
+
+
+def test_debit_sign_and_repeated_headers():
+    text = (
+        "raw_transaction,upi_id,amount,transaction_type,recipient_type,category,bank,recipient_name\n"
+        "Rent,landlord@oksbi,-15000,,individual,utilities,sbi,Landlord\n"
+        "raw_transaction,upi_id,amount,transaction_type,recipient_type,category,bank,recipient_name\n"
+        "Salary,acme@okhdfc,50000,credit,merchant,other,hdfc,Acme\n"
+    )
+    parsed = rows(text)
+    assert [r["amount"] for r in parsed] == [-15000.0, 50000.0]
+    assert parsed[0]["transaction_type"] == "debit"
+
+
+def test_bad_rows_are_quarantined_not_fatal():
+    report = ParseReport()
+    text = (
+        "raw_transaction,upi_id,amount,transaction_type,recipient_type,category,bank,recipient_name\n"
+        "Coffee,cafe@okaxis,abc,debit,merchant,food,axis,Cafe\n"
+        "Tea,cafe@okaxis,30,debit,merchant,food,axis,Cafe\n"
+        "short\n"
+    )
+    parsed = rows(text, report)
+    assert [r["raw_transaction"] for r in parsed] == ["Tea"]
+    assert report.rows == 1
+    assert len(report.quarantined) == 2
+    assert "non-numeric amount" in report.quarantined[0]["reason"]
+
+
+def test_iter_text_lines_rejoins_split_chunks():
+    assert list(iter_text_lines(["a,b\nc", ",d\n", "e"])) == ["a,b\n", "c,d\n", "e\n"]
+
+
+def test_extraction_incomplete_names_failed_pages():
+    report = ParseReport(rows=4)
+    report.fail([2, 3, 4], "timeout")
+    report.fail([7], "quota")
+    assert str(ExtractionIncomplete(report)) == "4 rows extracted; extraction failed for pages 3-5, page 8"
@@ -0,0 +1,70 @@
+import time
+import threading
+
+from lookup_cache import LookupCache, prompt_version
+from search import TransactionAnalyzer, UPIData, upi_cache_key
+
+
+def test_versioned_round_trip_and_expiry(tmp_path):
+    cache = LookupCache(str(tmp_path / "cache.sqlite3"))
+    cache.set("upi", "a@okaxis", {"bank": "axis"}, "v1")
+    assert cache.get("upi", "a@okaxis", "v1") == {"bank": "axis"}
+    assert cache.get("upi", "a@okaxis", "v2") is None
+    assert cache.get("merchant_search", "a@okaxis", "v1") is None
+
+    cache.set("upi", "b@okaxis", {"bank": "axis"}, "v1", ttl_seconds=-1)
+    assert cache.get("upi", "b@okaxis", "v1") is None
+
+
+def test_eviction_keeps_recently_used_entries(tmp_path):
+    cache = LookupCache(str(tmp_path / "cache.sqlite3"), max_entries=3, evict_every=1000)
+    for i in range(5):
+        cache.set("upi", f"id{i}", i)
+        time.sleep(0.01)
+    cache.get("upi", "id0")  # touched last, so it survives
+    cache.evict()
+    kept = [i for i in range(5) if cache.get("upi", f"id{i}") is not None]
+    assert kept == [0, 3, 4]
+
+
+def test_concurrent_writers_share_one_file(tmp_path):
+    cache = LookupCache(str(tmp_path / "cache.sqlite3"), evict_every=7)
+    threads = [threading.Thread(target=lambda n=n: [cache.set("ns", f"{n}-{i}", i) for i in range(50)])
+               for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache._writes == 200
+    assert cache.get("ns", "3-49") == 49
+
+
+def test_prompt_version_tracks_prompt_text():
+    assert prompt_version("a") == prompt_version("a") != prompt_version("b")
+
+
+def analyzer(tmp_path, verified):
+    calls = []
+    analyzer = TransactionAnalyzer.__new__(TransactionAnalyzer)
+    analyzer.cache = LookupCache(str(tmp_path / "cache.sqlite3"))
+    analyzer.known_merchants = {}
+
+    def call(prompt, **kwargs):
+        calls.append(prompt)
+        return {"verified_name": verified}
+    analyzer._call_ollama = call
+    return analyzer, calls
+
+
+def test_merchant_verification_is_keyed_by_upi_id(tmp_path):
+    first, calls = analyzer(tmp_path, "Swiggy")
+    info = [{"title": "Swiggy", "snippet": "food delivery"}]
+    assert first.get_standardized_name("Swiggy.1@okicici", UPIData(True, "swiggy", "icici", 1.0), info) == "Swiggy"
+    # same handle, differently extracted name: answered from the cache by a fresh analyzer
+    second, second_calls = analyzer(tmp_path, "unused")
+    assert second.get_standardized_name(" swiggy.1@OKICICI", UPIData(True, "swiggy food", "icici", 1.0), info) == "Swiggy"
+    assert second_calls == []
+    # another handle with the same display name is verified on its own
+    assert second.get_standardized_name("swiggy.2@okaxis", UPIData(True, "swiggy", "axis", 1.0), info) == "unused"
+    assert len(second_calls) == 1
+    assert upi_cache_key(" A@OkAxis ") == "a@okaxis"
@@ -0,0 +1,44 @@
+import os
+
+import merchant_kb
+from merchant_kb import MerchantKB, normalize_name, upi_prefix
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_seeds_from_the_checked_in_history(tmp_path):
+    kb = MerchantKB(str(tmp_path / "kb.sqlite3"), seed_source=os.path.join(REPO, merchant_kb.SEED_SOURCE))
+    swiggy = kb.lookup(upi_id="swiggy.99999@ybl")
+    assert swiggy is not None and swiggy.category == "food" and swiggy.info
+    # records persist, so a second instance loads them instead of reseeding
+    assert set(MerchantKB(str(tmp_path / "kb.sqlite3"), seed_source=None).records) == set(kb.records)
+
+
+def test_unreadable_seed_leaves_an_empty_usable_kb(tmp_path, monkeypatch):
+    seed = tmp_path / "seed.csv"
+    seed.write_text("recipient_type,recipient_name\nmerchant,swiggy\n")
+
+    def broken(self, path):
+        raise ValueError("corrupt seed")
+
+    monkeypatch.setattr(MerchantKB, "seed_from_csv", broken)
+    kb = MerchantKB(str(tmp_path / "kb.sqlite3"), seed_source=str(seed))
+    assert kb.records == {}
+    kb.add("Big Bazaar", category="shopping", upi_prefixes=["bigbazaar"])
+    assert kb.lookup(name="big bazaar").category == "shopping"
+
+
+def test_lookup_by_prefix_alias_and_fuzzy_name(tmp_path):
+    kb = MerchantKB(str(tmp_path / "kb.sqlite3"), seed_source=None)
+    kb.add("Zomato", category="food", aliases=["zomato ltd"], upi_prefixes=[upi_prefix("zomato.order@hdfcbank")])
+    assert kb.lookup(upi_id="ZOMATO.123@icici").canonical == "zomato"
+    assert kb.lookup(name="Zomato Ltd.").canonical == "zomato"
+    assert kb.lookup(name="zomatoo").canonical == "zomato"
+    assert kb.lookup(name="uber") is None
+
+
+def test_generic_and_short_prefixes_are_not_indexed():
+    assert upi_prefix("shop123@ybl") is None
+    assert upi_prefix("ab.cd@ybl") is None
+    assert upi_prefix("Swiggy.75839@okicici") == "swiggy"
+    assert normalize_name("  Dr. Reddy's  Labs ") == "dr reddy s labs"
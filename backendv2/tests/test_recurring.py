@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from recurring import detect_recurring, summarize_recurring
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=["upi_id", "amount", "date", "category"])
+
+
+def test_fixed_monthly_debit_is_a_likely_emi():
+    rows = [("bank.emi@okhdfc", -5000, f"2024-{m:02d}-05", "utilities") for m in range(1, 7)]
+    # noise: one-off purchases that must not be reported
+    rows += [("shop@okaxis", -120 * m, f"2024-{m:02d}-{m + 10}", "shopping") for m in range(1, 4)]
+    [emi] = detect_recurring(frame(rows))
+    assert emi["counterparty"] == "bank.emi@okhdfc"
+    assert emi["period"] == "monthly"
+    assert emi["occurrences"] == 6
+    assert emi["likely_emi"] is True
+    assert emi["next_expected"].startswith("2024-07")
+
+
+def test_amount_bands_split_one_counterparty():
+    dates = pd.date_range("2024-01-01", periods=8, freq="7D").strftime("%Y-%m-%d")
+    rows = [("friend@oksbi", -200, d, "food") for d in dates]
+    rows += [("friend@oksbi", -2000, d, "other") for d in pd.date_range("2024-01-15", periods=4, freq="30D")]
+    found = {r["amount_mean"]: r for r in detect_recurring(frame(rows))}
+    assert found[200.0]["period"] == "weekly"
+    assert found[2000.0]["period"] == "monthly"
+
+
+def test_irregular_and_short_series_are_ignored():
+    rows = [("a@okaxis", -100, "2024-01-01", None), ("a@okaxis", -100, "2024-01-02", None),
+            ("a@okaxis", -100, "2024-03-20", None), ("b@okaxis", -50, "2024-01-01", None)]
+    assert detect_recurring(frame(rows)) == []
+    assert detect_recurring(pd.DataFrame()) == []
+
+
+def test_summary_totals_committed_outflow():
+    rows = [("rent@oksbi", -10000, f"2024-{m:02d}-01", "utilities") for m in range(1, 5)]
+    summary = summarize_recurring(detect_recurring(frame(rows)))
+    assert summary["recurring_debit_count"] == 1
+    # scaled to 30 days from the observed ~31-day period
+    assert summary["monthly_committed_outflow"] == pytest.approx(10000.0, rel=0.05)
@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+from columnar_store import write_transactions, save_application
+from feature_store import FeatureStore, build_features, FEATURE_VERSION
+from credit_score import score_features, WEIGHTS, SCORE_MIN, SCORE_MAX
+
+
+def statement(salary, spend_per_day, months=6):
+    rows = []
+    for day in pd.date_range("2024-01-01", periods=months * 30, freq="D"):
+        if day.day == 1:
+            rows.append({"raw_transaction": "salary", "upi_id": "acme@okhdfc", "amount": salary,
+                         "transaction_type": "credit", "category": "other", "date": day})
+            rows.append({"raw_transaction": "emi", "upi_id": "loan@okhdfc", "amount": -4000,
+                         "transaction_type": "debit", "category": "utilities", "date": day + pd.Timedelta(days=4)})
+        rows.append({"raw_transaction": "groceries", "upi_id": "mart@okaxis", "amount": -spend_per_day,
+                     "transaction_type": "debit", "category": "food", "date": day})
+    return pd.DataFrame(rows)
+
+
+def test_features_for_a_steady_earner(tmp_path):
+    write_transactions("steady", statement(salary=60000, spend_per_day=500))
+    save_application("steady", {"upi_ids": [], "is_own": []})
+    features = build_features("steady")
+    assert features["transaction_count"] > 0
+    assert features["history_months"] == pytest.approx(0.5, abs=0.1)
+    assert 0.0 < features["savings_rate"] <= 1.0
+    assert features["positive_month_ratio"] == pytest.approx(1.0)
+    assert 0.0 < features["emi_burden"] < 1.0
+    # a single account has nothing to correlate with
+    assert features["related_party_correlation"] is None
+
+    store = FeatureStore(str(tmp_path / "features.sqlite3"))
+    assert store.get("steady") is None
+    stored = store.get_or_build("steady")
+    assert stored["features"] == features
+    assert store.get("steady")["computedAt"] == stored["computedAt"]
+
+
+def test_feature_version_scopes_stored_vectors(tmp_path, monkeypatch):
+    store = FeatureStore(str(tmp_path / "features.sqlite3"))
+    store.put("app", {"savings_rate": 0.1})
+    monkeypatch.setattr("feature_store.FEATURE_VERSION", FEATURE_VERSION + "-next")
+    assert store.get("app") is None
+
+
+def test_stronger_profile_scores_higher():
+    write_transactions("saver", statement(salary=80000, spend_per_day=300))
+    write_transactions("spender", statement(salary=20000, spend_per_day=900))
+    saver = score_features(build_features("saver"))
+    spender = score_features(build_features("spender"))
+    assert SCORE_MIN <= spender["score"] < saver["score"] <= SCORE_MAX
+    assert saver["band"] in ("excellent", "good")
+
+
+def test_missing_features_take_neutral_values():
+    result = score_features({})
+    assert result["missingFeatures"] == list(WEIGHTS)
+    assert SCORE_MIN < result["score"] < SCORE_MAX
+    contributions = [abs(f["contribution"]) for f in result["factors"]]
+    assert contributions == sorted(contributions, reverse=True)
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from txn_parser import parse_transaction_line, extract_upi_id, parse_lines
+
+
+def test_parses_timestamped_debit_with_role():
+    parsed = parse_transaction_line("Shop Owner - [07:41:42 02-12-2022] INR 823 debited to mart.156@okhdfc")
+    assert parsed.upi_id == "mart.156@okhdfc"
+    assert parsed.amount == -823.0
+    assert parsed.transaction_type == "debit"
+    assert parsed.role == "Shop Owner"
+    assert parsed.timestamp == datetime(2022, 12, 2, 7, 41, 42)
+    assert parsed.date == "2022-12-02 07:41:42"
+
+
+def test_parses_credit_with_note_and_thousands_separator():
+    parsed = parse_transaction_line("Rs. 1,250.50 credited from yash.gupta123@hdfc salary")
+    assert parsed.amount == 1250.5
+    assert parsed.transaction_type == "credit"
+    assert parsed.note == "salary"
+    assert parsed.date == ""
+
+
+def test_rejects_lines_outside_the_grammar():
+    assert parse_transaction_line("Paid the electricity bill") is None
+    # impossible calendar date
+    assert parse_transaction_line("[07:41:42 31-02-2022] INR 10 debited to a@okaxis") is None
+
+
+def test_extract_upi_id_and_parse_lines():
+    assert extract_upi_id("refund from 9876543210@paytm today") == "9876543210@paytm"
+    assert extract_upi_id("no handle here") is None
+    lines = list(parse_lines(["", "INR 5 debited to a@okaxis", "  garbage  "]))
+    assert [line for line, _ in lines] == ["INR 5 debited to a@okaxis", "garbage"]
+    assert lines[0][1].amount == -5.0 and lines[1][1] is None
@@ -0,0 +1,31 @@
+import pytest
+
+from upi_handles import parse_handle, resolve_bank, split_upi_id
+
+
+def test_split_and_resolve_are_case_and_space_insensitive():
+    assert split_upi_id("  Swiggy.75839@OKICICI ") == ("swiggy.75839", "okicici")
+    assert resolve_bank("someone@YBL") == "yes"
+    assert resolve_bank("someone@unknownpsp") is None
+
+
+@pytest.mark.parametrize("upi_id,expected", [
+    ("9876543210@paytm", {"is_merchant": False, "name": "9876543210", "bank": "paytm", "confidence": 0.9}),
+    ("+919876543210@ybl", {"is_merchant": False, "name": "9876543210", "bank": "yes", "confidence": 0.9}),
+    ("q123456789@ybl", {"is_merchant": True, "name": "q123456789", "bank": "yes", "confidence": 0.8}),
+    ("swiggy.75839@okicici", {"is_merchant": True, "name": "swiggy", "bank": "icici", "confidence": 0.85}),
+    ("sharma.medicals@okaxis", {"is_merchant": True, "name": "sharma", "bank": "axis", "confidence": 0.85}),
+    ("yash.gupta123@hdfc", {"is_merchant": False, "name": "yash.gupta123", "bank": "hdfc", "confidence": 0.75}),
+])
+def test_parse_handle_recognizes_known_shapes(upi_id, expected):
+    assert parse_handle(upi_id) == expected
+
+
+@pytest.mark.parametrize("upi_id", [
+    "yash@hdfc",             # single token: could be a person or a shop
+    "swiggy@unknownpsp",     # handle not in the table
+    "@okaxis",               # no local part
+    "12345@paytm",           # too short for a phone number
+])
+def test_parse_handle_defers_ambiguous_ids_to_the_llm(upi_id):
+    assert parse_handle(upi_id) is None
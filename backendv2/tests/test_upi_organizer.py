@@ -0,0 +1,65 @@
+import threading
+import types
+
+import pytest
+
+import upi_organizer
+from columnar_store import read_transactions
+from upi_organizer import UPIDataProcessor
+
+
+def make_processor():
+    processor = UPIDataProcessor.__new__(UPIDataProcessor)
+    processor.transaction_analyzer = types.SimpleNamespace(fallback_count=0)
+    processor._digest_locks = {}
+    processor._digest_locks_guard = threading.Lock()
+    return processor
+
+
+@pytest.fixture
+def fake_pdf(monkeypatch, tmp_path):
+    """A 'PDF' whose extraction yields the rows in `rows`, counting how often it runs."""
+    state = {"rows": [], "runs": 0}
+
+    def iter_document_transactions(file_path, output_csv_path):
+        state["runs"] += 1
+        yield from state["rows"]
+
+    monkeypatch.setitem(__import__("sys").modules, "pdf2data",
+                        types.SimpleNamespace(iter_document_transactions=iter_document_transactions))
+    monkeypatch.setattr(upi_organizer, "STREAM_CHUNK_SIZE", 2)
+    path = tmp_path / "statement.pdf"
+    path.write_bytes(b"%PDF-1.4 " + str(tmp_path).encode())
+    state["path"] = str(path)
+    return state
+
+
+def row(i, date="05/03/2024"):
+    return {"raw_transaction": f"txn {i}", "upi_id": "shop@okaxis", "amount": 10.0 * i,
+            "transaction_type": "debit", "date": date}
+
+
+def test_document_result_is_a_summary_fresh_and_cached(fake_pdf, tmp_path):
+    fake_pdf["rows"] = [row(i) for i in range(1, 6)]
+    processor = make_processor()
+    chunks = []
+    fresh = processor.process_document(fake_pdf["path"], output_dir=str(tmp_path),
+                                       on_chunk=lambda df: chunks.append(len(df)))
+    assert fresh == {"file": fake_pdf["path"], "transactions_processed": 5, "chunks": 3, "cached": False}
+    assert chunks == [2, 2, 1]
+
+    cached = processor.process_document(fake_pdf["path"], output_dir=str(tmp_path), application_id="uo-cached")
+    assert cached == {"file": fake_pdf["path"], "transactions_processed": 5, "chunks": 1, "cached": True}
+    assert fake_pdf["runs"] == 1
+    assert len(read_transactions(["uo-cached"])) == 5
+
+
+def test_replay_does_not_file_quarantined_rows_under_the_unknown_month(fake_pdf, tmp_path):
+    fake_pdf["rows"] = [row(1), row(2, date="sometime"), row(3, date="06/04/2024")]
+    processor = make_processor()
+    processor.process_document(fake_pdf["path"], output_dir=str(tmp_path), application_id="uo-fresh")
+    replay = processor.process_document(fake_pdf["path"], output_dir=str(tmp_path), application_id="uo-replay")
+    assert replay["cached"] is True
+    for application_id in ("uo-fresh", "uo-replay"):
+        months = sorted(read_transactions([application_id])["month"].astype(str))
+        assert months == ["2024-03", "2024-04"]
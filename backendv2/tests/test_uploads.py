@@ -0,0 +1,101 @@
+import io
+import os
+
+import pytest
+
+from blob_store import blobs
+from uploads import UploadError, stream_multipart
+
+BOUNDARY = "test-boundary"
+
+
+def body(*parts, close=True):
+    out = b""
+    for name, filename, content_type, data in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename is not None else "")
+        out += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n".encode()
+        if content_type:
+            out += f"Content-Type: {content_type}\r\n".encode()
+        out += b"\r\n" + data + b"\r\n"
+    if close:
+        out += f"--{BOUNDARY}--\r\n".encode()
+    return out
+
+
+def parse(data, **kwargs):
+    return stream_multipart(io.BytesIO(data), BOUNDARY, len(data), **kwargs)
+
+
+def spooled():
+    return os.listdir(blobs.tmp_dir)
+
+
+def test_fields_and_files_are_stored_and_reported_in_order():
+    seen = []
+    data = body(
+        ("loanPurpose", None, None, b"education"),
+        ("documents", "a.pdf", "application/pdf", b"%PDF-1.4 first"),
+        ("documents", "b.txt", "text/plain", b"2024-01-20 INR 500 debited"),
+    )
+    fields, files = parse(data, on_file=lambda f: seen.append(f.filename))
+    assert fields == {"loanPurpose": "education"}
+    assert [f.filename for f in files] == seen == ["a.pdf", "b.txt"]
+    assert open(files[0].path, "rb").read() == b"%PDF-1.4 first"
+
+
+def test_on_file_runs_before_later_parts_are_read():
+    events = []
+
+    class Recording(io.BytesIO):
+        def read(self, size=-1):
+            chunk = super().read(min(size, 64))
+            events.append(("read", self.tell()))
+            return chunk
+
+    first = ("documents", "a.pdf", "application/pdf", b"%PDF-1.4 " + b"x" * 200)
+    second = ("documents", "b.pdf", "application/pdf", b"%PDF-1.4 " + b"y" * 200)
+    data = body(first, second)
+    stream_multipart(Recording(data), BOUNDARY, len(data),
+                     on_file=lambda f: events.append(("file", f.filename)))
+    first_file = events.index(("file", "a.pdf"))
+    # the second part was still unread when the first one was handed over
+    assert events[first_file - 1][1] < len(data) - len(second[3])
+
+
+@pytest.mark.parametrize("filename,content_type,data,status", [
+    ("statement.exe", "application/octet-stream", b"MZ", 415),
+    ("statement.pdf", "image/png", b"%PDF-1.4", 415),
+    ("statement.pdf", "application/pdf", b"not a pdf at all", 415),
+    ("statement.txt", "text/plain", b"abc\x00def", 415),
+])
+def test_wrong_types_are_refused_before_storing(filename, content_type, data, status):
+    with pytest.raises(UploadError) as exc:
+        parse(body(("documents", filename, content_type, data)))
+    assert exc.value.status == status
+    assert spooled() == []
+
+
+def test_size_limits():
+    with pytest.raises(UploadError) as exc:
+        parse(body(("documents", "big.txt", "text/plain", b"a" * 5000)), max_file_bytes=1000)
+    assert exc.value.status == 413 and spooled() == []
+    data = body(("documents", "big.txt", "text/plain", b"a" * 5000))
+    with pytest.raises(UploadError) as exc:
+        stream_multipart(io.BytesIO(data), BOUNDARY, None, max_request_bytes=1000)
+    assert exc.value.status == 413
+    with pytest.raises(UploadError):
+        parse(data, max_request_bytes=len(data) - 1)
+
+
+def test_truncated_body_is_rejected_after_completed_files():
+    seen = []
+    data = body(
+        ("documents", "a.pdf", "application/pdf", b"%PDF-1.4 complete"),
+        ("documents", "b.pdf", "application/pdf", b"%PDF-1.4 cut off here"),
+        close=False,
+    )
+    with pytest.raises(UploadError):
+        parse(data[:-30], on_file=lambda f: seen.append(f.filename))
+    # the caller was told about the first file and must undo what it started
+    assert seen == ["a.pdf"]
+    assert spooled() == []
@@ -0,0 +1,90 @@
+import re
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Optional, Iterable, Iterator, Tuple
+
+# Grammar for the machine-generated statement lines written by genrate_data.py
+# and generatedata.save_transactions_to_file, e.g.
+#   Shop Owner - [07:41:42 02-12-2022] INR 823 debited to mart.156@okhdfc
+#   [00:32:47 02-12-2022] INR 836 credited from mart.156@okhdfc
+#   INR 500 debited to swiggy.75839@okicici for dinner
+TRANSACTION_PATTERN = re.compile(
+    r"^\s*(?:(?P<role>[^\[\]]+?)\s+-\s+)?"
+    r"(?:\[(?P<time>\d{2}:\d{2}:\d{2})\s+(?P<date>\d{2}-\d{2}-\d{4})\]\s+)?"
+    r"(?:INR|Rs\.?|₹)\s*(?P<amount>\d[\d,]*(?:\.\d+)?)\s+"
+    r"(?P<direction>debited\s+to|credited\s+from)\s+"
+    r"(?P<upi_id>[A-Za-z0-9._\-]+@[A-Za-z0-9._\-]*[A-Za-z0-9])"
+    r"(?:\s+(?P<note>.*?))?\s*$",
+    re.IGNORECASE,
+)
+
+UPI_ID_PATTERN = re.compile(r"[A-Za-z0-9._\-]+@[A-Za-z0-9._\-]*[A-Za-z0-9]")
+
+TIMESTAMP_FORMAT = "%H:%M:%S %d-%m-%Y"
+
+
+@dataclass
+class ParsedTransaction:
+    raw_transaction: str
+    upi_id: str
+    amount: float
+    transaction_type: str
+    direction: str
+    timestamp: Optional[datetime] = None
+    role: Optional[str] = None
+    note: Optional[str] = None
+
+    @property
+    def date(self) -> str:
+        return self.timestamp.strftime("%Y-%m-%d %H:%M:%S") if self.timestamp else ""
+
+
+def parse_transaction_line(line: str) -> Optional[ParsedTransaction]:
+    """Parses a regular statement line without any network call.
+
+    Returns None when the line does not match the grammar so callers can fall
+    back to the LLM path.
+    """
+    match = TRANSACTION_PATTERN.match(line)
+    if not match:
+        return None
+
+    timestamp = None
+    if match.group("time"):
+        try:
+            timestamp = datetime.strptime(
+                f"{match.group('time')} {match.group('date')}", TIMESTAMP_FORMAT
+            )
+        except ValueError:
+            return None
+
+    direction = "debited to" if match.group("direction").lower().startswith("debited") else "credited from"
+    transaction_type = "debit" if direction == "debited to" else "credit"
+    amount = float(match.group("amount").replace(",", ""))
+    if transaction_type == "debit":
+        amount = -amount
+
+    return ParsedTransaction(
+        raw_transaction=line.strip(),
+        upi_id=match.group("upi_id"),
+        amount=amount,
+        transaction_type=transaction_type,
+        direction=direction,
+        timestamp=timestamp,
+        role=match.group("role"),
+        note=match.group("note") or None,
+    )
+
+
+def extract_upi_id(text: str) -> Optional[str]:
+    """Returns the first UPI ID found anywhere in free-form text."""
+    match = UPI_ID_PATTERN.search(text)
+    return match.group(0) if match else None
+
+
+def parse_lines(lines: Iterable[str]) -> Iterator[Tuple[str, Optional[ParsedTransaction]]]:
+    """Yields (line, parsed) for every non-blank line; parsed is None on a grammar miss."""
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield line, parse_transaction_line(line)
@@ -0,0 +1,83 @@
+import re
+from typing import Dict, Optional
+
+# PSP handle (the part after '@') -> bank that issues or sponsors it
+PSP_HANDLES: Dict[str, str] = {
+    # Google Pay
+    "okicici": "icici", "okhdfcbank": "hdfc", "okhdfc": "hdfc", "oksbi": "sbi", "okaxis": "axis",
+    # PhonePe
+    "ybl": "yes", "ibl": "icici", "axl": "axis",
+    # Paytm
+    "paytm": "paytm", "ptyes": "yes", "ptsbi": "sbi", "pthdfc": "hdfc", "ptaxis": "axis",
+    # Amazon Pay
+    "apl": "axis", "yapl": "yes", "rapl": "rbl",
+    # WhatsApp, Cred, Mobikwik, Jupiter and other app handles
+    "waicici": "icici", "wahdfcbank": "hdfc", "waaxis": "axis", "wasbi": "sbi",
+    "axisb": "axis", "ikwik": "hdfc", "jupiteraxis": "axis", "fam": "idfc", "slice": "slice",
+    # Bank apps
+    "hdfc": "hdfc", "hdfcbank": "hdfc", "payzapp": "hdfc",
+    "icici": "icici", "icicibank": "icici", "pockets": "icici",
+    "sbi": "sbi", "sbiyono": "sbi",
+    "axis": "axis", "axisbank": "axis",
+    "kotak": "kotak", "kmbl": "kotak",
+    "yesbank": "yes", "yesbankltd": "yes",
+    "idfcbank": "idfc", "idfcfirst": "idfc", "indus": "indusind", "rbl": "rbl",
+    "pnb": "pnb", "barodampay": "bob", "boi": "boi", "cnrb": "canara", "unionbank": "union",
+    "aubank": "au", "federal": "federal", "fbl": "federal", "dbs": "dbs", "hsbc": "hsbc",
+    "citi": "citi", "sc": "standard_chartered", "airtel": "airtel", "jio": "jio",
+}
+
+# Words that mark the local part as a business rather than a person
+MERCHANT_HINTS = {
+    "shop", "mart", "store", "stores", "seller", "vendor", "retail", "merchant", "traders", "trading",
+    "enterprises", "enterprise", "services", "solutions", "pvt", "ltd", "llp", "foods", "restaurant",
+    "cafe", "hotel", "medical", "medicals", "pharma", "pharmacy", "clinic", "hospital", "school",
+    "college", "petrol", "fuel", "kirana", "bazaar", "agency", "billpay", "recharge", "sub",
+    "swiggy", "zomato", "netflix", "amazon", "flipkart", "myntra", "uber", "ola", "rapido",
+    "bigbasket", "blinkit", "zepto", "dmart", "irctc", "spotify", "hotstar", "bookmyshow",
+    "razorpay", "cashfree", "payu", "bharatpe", "paytmqr", "billdesk",
+}
+
+_PHONE = re.compile(r"^(?:\+?91)?([6-9]\d{9})$")
+_MERCHANT_QR = re.compile(r"^(?:q\d{6,}|gpay-\d+|paytmqr\w*|bharatpe\.?\d+)$")
+_TOKEN = re.compile(r"[a-z]+")
+
+
+def split_upi_id(upi_id: str):
+    local, _, handle = upi_id.strip().lower().rpartition("@")
+    return local, handle
+
+
+def resolve_bank(upi_id: str) -> Optional[str]:
+    """Bank behind a UPI ID's PSP handle, or None for handles not in the table."""
+    return PSP_HANDLES.get(split_upi_id(upi_id)[1])
+
+
+def parse_handle(upi_id: str) -> Optional[Dict]:
+    """Rule-based version of UPI_PARSER_PROMPT.
+
+    Recognizes phone-number handles, payment-gateway QR handles and
+    name(.)number handles whose name is a business word. Returns None when
+    the handle is not in the PSP table or the local part is ambiguous, so
+    the caller can fall back to the LLM.
+    """
+    local, handle = split_upi_id(upi_id)
+    bank = PSP_HANDLES.get(handle)
+    if not local or bank is None:
+        return None
+
+    phone = _PHONE.match(local)
+    if phone:
+        return {"is_merchant": False, "name": phone.group(1), "bank": bank, "confidence": 0.9}
+    if _MERCHANT_QR.match(local):
+        return {"is_merchant": True, "name": local, "bank": bank, "confidence": 0.8}
+
+    tokens = _TOKEN.findall(local)
+    merchant_tokens = [t for t in tokens if t in MERCHANT_HINTS]
+    if merchant_tokens:
+        # swiggy.75839 -> swiggy; netflix.sub12 -> netflix
+        return {"is_merchant": True, "name": tokens[0], "bank": bank, "confidence": 0.85}
+    if len(tokens) >= 2:
+        # first.last / first.last123: a person's name, kept whole like the LLM does
+        return {"is_merchant": False, "name": local, "bank": bank, "confidence": 0.75}
+    return None
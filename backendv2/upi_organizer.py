@@ -1,36 +1,103 @@
 import pandas as pd
 from datetime import datetime
-from typing import List, Dict, Union
+from typing import List, Dict, Union, Optional, Iterator, Callable
 from search import TransactionAnalyzer
 from dataclasses import asdict
 import json
 import os
-from groq import Groq
+import threading
+from columnar_store import write_transactions, TRANSACTION_SCHEMA
+from llm_csv import ExtractionIncomplete
+from insights import compute_insights
+from blob_store import blobs, file_digest
+from lookup_cache import prompt_version
+from llm_client import GEMINI_MODEL
+from categorizer import DEFAULT_MODEL_PATH as CATEGORIZER_PATH, CONFIDENCE_THRESHOLD
+from prompts import (UPI_PARSER_PROMPT, TRANSACTION_ANALYSIS_PROMPT, MERCHANT_VERIFY_PROMPT, DOCUMENT_EXTRACTION_PROMPT,
+                     UPI_PARSER_BATCH_PROMPT, TRANSACTION_ANALYSIS_BATCH_PROMPT)
 if not os.path.exists('./all_csvs'):
             os.makedirs('./all_csvs')
+
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', 100))
+# Bump when row post-processing changes so memoized extractions are redone
+EXTRACTION_SCHEMA_VERSION = "v2"
+
+def iter_lines(file_path: str) -> Iterator[str]:
+    with open(file_path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+def extraction_version() -> str:
+    """Fingerprint of everything that shapes an extraction result; changing any of it invalidates memoized results."""
+    categorizer_mtime = os.path.getmtime(CATEGORIZER_PATH) if os.path.exists(CATEGORIZER_PATH) else None
+    return prompt_version("\n".join([
+        EXTRACTION_SCHEMA_VERSION, str(TRANSACTION_SCHEMA),
+        UPI_PARSER_PROMPT, TRANSACTION_ANALYSIS_PROMPT, MERCHANT_VERIFY_PROMPT, DOCUMENT_EXTRACTION_PROMPT,
+        UPI_PARSER_BATCH_PROMPT, TRANSACTION_ANALYSIS_BATCH_PROMPT,
+        GEMINI_MODEL, os.environ.get('LLM_PROVIDER', 'groq'),
+        f"categorizer:{categorizer_mtime}:{CONFIDENCE_THRESHOLD}",
+    ]))
+
 class UPIDataProcessor:
     def __init__(self):
         self.transaction_analyzer = TransactionAnalyzer()
+        self._digest_locks: Dict[str, threading.Lock] = {}
+        self._digest_locks_guard = threading.Lock()
+
+    def _digest_lock(self, digest: str) -> threading.Lock:
+        with self._digest_locks_guard:
+            return self._digest_locks.setdefault(digest, threading.Lock())
 
     def process_text_transactions(self, transactions: List[str]) -> pd.DataFrame:
-        results = []
-        for tx in transactions:
-            analyzed = self.transaction_analyzer.analyze_transaction(tx)
-            results.append(asdict(analyzed))
-        return pd.DataFrame(results)
+        results = self.transaction_analyzer.batch_process(transactions)
+        return pd.DataFrame([asdict(analyzed) for analyzed in results])
+
+    def iter_text_chunks(self, file_path: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+        """Analyzes a statement in fixed-size chunks, yielding each as soon as it is done."""
+        chunk = []
+        for line in iter_lines(file_path):
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                yield self.process_text_transactions(chunk)
+                chunk = []
+        if chunk:
+            yield self.process_text_transactions(chunk)
+
+    def process_text_file(self, file_path: str, output_dir: str = './all_csvs', application_id: Optional[str] = None,
+                          on_chunk: Optional[Callable[[pd.DataFrame], None]] = None,
+                          account: Optional[str] = None) -> Dict:
+        """Streams a .txt statement through the local parser and analyzer.
+
+        Only one chunk is held in memory at a time; each is persisted and
+        passed to on_chunk before the next one is read.
+        """
+        csv_path = None
+        if not application_id:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            os.makedirs(output_dir, exist_ok=True)
+            csv_path = os.path.join(output_dir, f'processed_transactions_{timestamp}.csv')
+
+        processed = 0
+        chunks = 0
+        for chunk_df in self.iter_text_chunks(file_path):
+            if application_id:
+                write_transactions(application_id, chunk_df, account=account)
+            else:
+                chunk_df.to_csv(csv_path, mode='a', header=chunks == 0, index=False)
+            processed += len(chunk_df)
+            chunks += 1
+            print(f"[DEBUG] {file_path}: {processed} transactions processed")
+            if on_chunk:
+                on_chunk(chunk_df)
+        return {'file': file_path, 'transactions_processed': processed, 'chunks': chunks}
 
     def generate_insights(self, df: pd.DataFrame) -> Dict:
-        insights = {
-            'total_transactions': int(len(df)),
-            'total_amount': float(df['amount'].sum()),
-            'avg_transaction': float(df['amount'].mean()),
-            'category_distribution': df['category'].value_counts().to_dict(),
-            'merchant_distribution': df[df['recipient_type'] == 'merchant']['recipient_name'].value_counts().to_dict(),
-            'bank_distribution': df['bank'].value_counts().to_dict()
-        }
-        return {k: v.item() if hasattr(v, 'item') else v for k, v in insights.items()}
-
-    def process_and_analyze(self, input_data: Union[str, List[str]], input_type: str = 'text') -> Dict:
+        return compute_insights(df)
+
+    def process_and_analyze(self, input_data: Union[str, List[str]], input_type: str = 'text',
+                            output_dir: str = './all_csvs', application_id: Optional[str] = None) -> Dict:
         # Use Gemini Vision to get raw transaction strings
         from pdf2data import process_document_with_gemini
         print('hello')
@@ -43,7 +110,7 @@ class UPIDataProcessor:
                 for file_path in input_data:
                     try:
                         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-                        transactions = process_document_with_gemini(file_path, f'./all_csvs/output_{timestamp}.csv')
+                        transactions = process_document_with_gemini(file_path, os.path.join(output_dir, f'output_{timestamp}.csv'))
                         all_transactions.extend(transactions)
                     except Exception as e:
                         print(f"Error processing in  {file_path}: {e}")
@@ -51,17 +118,14 @@ class UPIDataProcessor:
             else:
                 print(input_data)
                 timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-                transactions = process_document_with_gemini(input_data, f'./all_csvs/output_{timestamp}.csv')
+                transactions = process_document_with_gemini(input_data, os.path.join(output_dir, f'output_{timestamp}.csv'))
                 
             # Process these strings using existing text analyzer
             transactions_df = self.process_text_transactions(transactions)
             
             insights = self.generate_insights(transactions_df)
             
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            if not os.path.exists('./all_csvs'):
-                os.makedirs('./all_csvs')
-            transactions_df.to_csv(f'./all_csvs/processed_transactions_{timestamp}.csv', index=False)
+            self.save_transactions(transactions_df, output_dir, application_id)
             
             return {
                 'transactions': transactions_df.to_dict('records'),
@@ -70,23 +134,97 @@ class UPIDataProcessor:
         except Exception as e:
             print(e)
 
-    def process_document(self, file_path: str) -> Dict:
+    def save_transactions(self, transactions_df: pd.DataFrame, output_dir: str, application_id: Optional[str] = None):
+        if application_id:
+            write_transactions(application_id, transactions_df)
+            return
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        os.makedirs(output_dir, exist_ok=True)
+        transactions_df.to_csv(os.path.join(output_dir, f'processed_transactions_{timestamp}.csv'), index=False)
+
+    def process_document(self, file_path: str, output_dir: str = './all_csvs',
+                         application_id: Optional[str] = None,
+                         on_chunk: Optional[Callable[[pd.DataFrame], None]] = None,
+                         account: Optional[str] = None) -> Dict:
+        """Extracts and analyzes one document, memoized by content hash and extraction version.
+
+        Rows are delivered through on_chunk and the application's dataset; the
+        return value is only a summary, so job results stay small.
+        `account` tags the stored rows with the linked UPI account the document belongs to.
+        """
+        digest, version = file_digest(file_path), extraction_version()
+        # An upload-time prefetch and an analysis job may race on the same file;
+        # the second one waits and replays the first one's result.
+        with self._digest_lock(digest):
+            cached = blobs.load_result(digest, version)
+            if cached is not None:
+                print(f"[DEBUG] {file_path}: reusing {len(cached)} transactions extracted from {digest[:12]}")
+                if application_id:
+                    write_transactions(application_id, cached, account=account)
+                if on_chunk:
+                    on_chunk(cached)
+                return {'file': file_path, 'transactions_processed': len(cached), 'chunks': 1, 'cached': True}
+
+            with blobs.result_writer(digest, version) as result:
+                def record_chunk(chunk_df):
+                    result.write(chunk_df)
+                    if on_chunk:
+                        on_chunk(chunk_df)
+                fallbacks = self.transaction_analyzer.fallback_count
+                summary = self._process_document(file_path, output_dir, application_id, record_chunk, account)
+                if self.transaction_analyzer.fallback_count != fallbacks:
+                    # Some rows carry default values from a failed LLM call; redo them next time.
+                    # The counter is shared, so a concurrent document's failure also lands here,
+                    # which only costs a re-extraction.
+                    print(f"[DEBUG] {file_path}: LLM fallbacks used, not memoizing the result")
+                    result.discard()
+                return {**summary, 'cached': False}
+
+    def _process_document(self, file_path: str, output_dir: str, application_id: Optional[str],
+                          on_chunk: Callable[[pd.DataFrame], None], account: Optional[str] = None):
         file_ext = os.path.splitext(file_path)[1].lower()
         print(f'Processing single file: {file_path}')
         
         if file_ext in ['.txt']:
-            print('WE ARE HEREE')
-            file_path = './' + file_path.replace('\\', '/')
+            file_path = file_path.replace('\\', '/')
             print(file_path)
-            try:
-                return self.process_and_analyze(file_path, 'text')
-            except Exception as e:
-                print(f"Error processing {file_path}: {e}")
-                return {'error': str(e)}
+            # Failures propagate so the job marks the file failed and nothing is memoized
+            return self.process_text_file(file_path, output_dir=output_dir,
+                                          application_id=application_id, on_chunk=on_chunk,
+                                          account=account)
         else:
-            from pdf2data import process_document_with_gemini
+            from pdf2data import iter_document_transactions
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            return process_document_with_gemini(file_path, f'./all_csvs/output_{timestamp}.csv')
+            os.makedirs(output_dir, exist_ok=True)
+            rows = iter_document_transactions(file_path, os.path.join(output_dir, f'output_{timestamp}.csv'))
+            processed, chunks, chunk = 0, 0, []
+            # Persist and report rows in chunks while the model is still generating
+            try:
+                for row in rows:
+                    chunk.append(row)
+                    if len(chunk) >= STREAM_CHUNK_SIZE:
+                        self._flush_document_chunk(chunk, application_id, on_chunk, account)
+                        processed += len(chunk)
+                        chunks += 1
+                        chunk = []
+            except ExtractionIncomplete:
+                # keep what was extracted, but let the caller know pages are missing
+                if chunk:
+                    self._flush_document_chunk(chunk, application_id, on_chunk, account)
+                raise
+            if chunk:
+                self._flush_document_chunk(chunk, application_id, on_chunk, account)
+                processed += len(chunk)
+                chunks += 1
+            return {'file': file_path, 'transactions_processed': processed, 'chunks': chunks}
+
+    def _flush_document_chunk(self, rows: List[Dict], application_id: Optional[str],
+                              on_chunk: Optional[Callable[[pd.DataFrame], None]], account: Optional[str] = None):
+        chunk_df = pd.DataFrame(rows)
+        if application_id:
+            write_transactions(application_id, chunk_df, account=account)
+        if on_chunk:
+            on_chunk(chunk_df)
 
 
 def main():
@@ -105,11 +243,15 @@ def main():
     
     # results = processor.process_and_analyze(text_transactions, 'text')
     
-    results = processor.process_document(f'./testing.pdf')
-    print("\nProcessed Transactions:")
-    print(pd.DataFrame(results['transactions']))
-    print("\nInsights:")
-    print(json.dumps(results['insights'], indent=2))
+    extracted = []
+    summary = processor.process_document(f'./testing.pdf', on_chunk=extracted.append)
+    print(json.dumps(summary, indent=2))
+    if extracted:
+        transactions = pd.concat(extracted, ignore_index=True)
+        print("\nProcessed Transactions:")
+        print(transactions)
+        print("\nInsights:")
+        print(json.dumps(processor.generate_insights(transactions), indent=2, default=str))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,150 @@
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from blob_store import blobs, BlobWriter
+
+MAX_FILE_BYTES = int(os.environ.get("MAX_UPLOAD_FILE_MB", 25)) * 1024 * 1024
+MAX_REQUEST_BYTES = int(os.environ.get("MAX_UPLOAD_REQUEST_MB", 100)) * 1024 * 1024
+MAX_FIELD_BYTES = 64 * 1024
+READ_SIZE = 64 * 1024
+
+# Extension -> accepted part content types; anything else is refused before it is stored
+ALLOWED_TYPES = {
+    ".pdf": {"application/pdf"},
+    ".txt": {"text/plain"},
+    ".png": {"image/png"},
+    ".jpg": {"image/jpeg"},
+    ".jpeg": {"image/jpeg"},
+}
+GENERIC_TYPES = {"", "application/octet-stream"}
+
+MAGIC = {
+    ".pdf": (b"%PDF",),
+    ".png": (b"\x89PNG",),
+    ".jpg": (b"\xff\xd8\xff",),
+    ".jpeg": (b"\xff\xd8\xff",),
+}
+
+
+class UploadError(Exception):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class UploadedFile:
+    field: str
+    filename: str
+    digest: str
+    path: str
+    size: int
+
+
+def check_file_type(filename: str, content_type: str) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext not in ALLOWED_TYPES:
+        raise UploadError(f"Unsupported file type {ext or filename!r}", 415)
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type not in GENERIC_TYPES and content_type not in ALLOWED_TYPES[ext]:
+        raise UploadError(f"{filename}: content type {content_type} does not match {ext}", 415)
+    return ext
+
+
+def check_magic(filename: str, ext: str, head: bytes):
+    """Sniffs the first bytes so a renamed file is refused before the rest is read."""
+    if ext in MAGIC and not head.startswith(MAGIC[ext]):
+        raise UploadError(f"{filename} is not a valid {ext} file", 415)
+    if ext == ".txt" and b"\x00" in head:
+        raise UploadError(f"{filename} is not a text file", 415)
+
+
+def stream_multipart(stream, boundary: str, content_length: Optional[int] = None,
+                     on_file: Optional[Callable[[UploadedFile], None]] = None,
+                     max_file_bytes: int = MAX_FILE_BYTES,
+                     max_request_bytes: int = MAX_REQUEST_BYTES) -> Tuple[Dict[str, str], List[UploadedFile]]:
+    """Parses a multipart body incrementally, writing each file straight into the blob store.
+
+    Memory stays bounded by READ_SIZE plus form fields. Each file is hashed
+    while it is written and handed to on_file as soon as its last byte
+    arrives, so callers can start on it while later files are still
+    uploading. A body that ends before the closing boundary raises
+    UploadError; callers that acted in on_file must undo that work then.
+    """
+    if content_length is not None and content_length > max_request_bytes:
+        raise UploadError(f"Request exceeds the {max_request_bytes} byte limit", 413)
+    decoder = MultipartDecoder(boundary.encode(), max_form_memory_size=MAX_FIELD_BYTES)
+    fields: Dict[str, str] = {}
+    files: List[UploadedFile] = []
+    part, buffer, writer, ext, head = None, [], None, None, None
+    received = 0
+    complete = False
+    try:
+        while True:
+            chunk = stream.read(READ_SIZE)
+            received += len(chunk)
+            if received > max_request_bytes:
+                raise UploadError(f"Request exceeds the {max_request_bytes} byte limit", 413)
+            decoder.receive_data(chunk or None)
+            event = decoder.next_event()
+            while not isinstance(event, (NeedData, Epilogue)):
+                if isinstance(event, Field):
+                    part, buffer, writer = event, [], None
+                elif isinstance(event, File):
+                    part, head, writer = event, b"", None
+                    # Browsers send an empty, nameless part for file inputs left blank
+                    if event.filename:
+                        ext = check_file_type(event.filename, event.headers.get("Content-Type", ""))
+                        writer = blobs.open_writer(ext, max_file_bytes)
+                elif isinstance(event, Data):
+                    if isinstance(part, Field):
+                        buffer.append(event.data)
+                        if not event.more_data:
+                            fields[part.name] = b"".join(buffer).decode("utf-8", "replace")
+                    elif writer is not None:
+                        if head is not None:
+                            head += event.data
+                            if len(head) >= 8 or not event.more_data:
+                                check_magic(part.filename, ext, head)
+                                head = None
+                        try:
+                            writer.write(event.data)
+                        except ValueError as e:
+                            raise UploadError(f"{part.filename}: {e}", 413)
+                        if not event.more_data:
+                            digest, path, size = writer.commit()
+                            writer = None
+                            uploaded = UploadedFile(part.name, part.filename, digest, path, size)
+                            files.append(uploaded)
+                            if on_file:
+                                on_file(uploaded)
+                event = decoder.next_event()
+            if isinstance(event, Epilogue):
+                complete = True
+                break
+            if not chunk:
+                break
+    except RequestEntityTooLarge:
+        raise UploadError("Upload exceeds the allowed size", 413)
+    except ValueError as e:
+        raise UploadError(f"Malformed upload: {e}")
+    finally:
+        if isinstance(writer, BlobWriter):
+            writer.abort()
+    if not complete:
+        raise UploadError("Upload ended before the final multipart boundary")
+    return fields, files
+
+
+def stream_request_upload(request, on_file: Optional[Callable[[UploadedFile], None]] = None):
+    """stream_multipart for a Flask request; only the raw stream is touched, never request.files."""
+    if request.mimetype != "multipart/form-data":
+        raise UploadError("Expected multipart/form-data", 415)
+    boundary = request.mimetype_params.get("boundary")
+    if not boundary:
+        raise UploadError("Missing multipart boundary")
+    return stream_multipart(request.stream, boundary, request.content_length, on_file)
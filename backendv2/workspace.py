@@ -0,0 +1,74 @@
+import os
+import re
+import json
+import threading
+from typing import Dict, List
+
+WORKSPACE_ROOT = os.environ.get("UDAN_WORKSPACE_ROOT", "./applications")
+
+_APPLICATION_ID = re.compile(r"^[A-Za-z0-9_\-]{1,64}$")
+_lock = threading.Lock()
+_workspaces: Dict[str, "ApplicationWorkspace"] = {}
+
+
+class ApplicationWorkspace:
+    """Storage owned by a single loan application.
+
+    Everything derived from an applicant's uploads (extracted CSVs, reports,
+    UPI IDs) lives under its own directory so concurrent applications never
+    see each other's data.
+    """
+
+    def __init__(self, application_id: str, root: str = WORKSPACE_ROOT):
+        if not _APPLICATION_ID.match(application_id or ""):
+            raise ValueError(f"Invalid application id: {application_id!r}")
+        self.application_id = application_id
+        self.root = os.path.join(root, application_id)
+        self.csv_dir = os.path.join(self.root, "csvs")
+        self.meta_path = os.path.join(self.root, "meta.json")
+        self._lock = threading.Lock()
+        os.makedirs(self.csv_dir, exist_ok=True)
+
+    def path(self, *parts: str) -> str:
+        return os.path.join(self.root, *parts)
+
+    def csv_files(self) -> List[str]:
+        return sorted(
+            os.path.join(self.csv_dir, f) for f in os.listdir(self.csv_dir) if f.endswith(".csv")
+        )
+
+    def load_meta(self) -> Dict:
+        if not os.path.exists(self.meta_path):
+            return {}
+        with open(self.meta_path) as f:
+            return json.load(f)
+
+    def update_meta(self, **values) -> Dict:
+        with self._lock:
+            meta = self.load_meta()
+            meta.update(values)
+            tmp_path = self.meta_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, self.meta_path)
+            return meta
+
+    @property
+    def upi_ids(self) -> List[str]:
+        return self.load_meta().get("upi_ids", [])
+
+    def add_upi_id(self, upi_id: str) -> List[str]:
+        ids = self.upi_ids
+        if upi_id and upi_id not in ids:
+            ids.append(upi_id)
+            self.update_meta(upi_ids=ids)
+        return ids
+
+
+def get_workspace(application_id: str) -> ApplicationWorkspace:
+    with _lock:
+        workspace = _workspaces.get(application_id)
+        if workspace is None:
+            workspace = ApplicationWorkspace(application_id)
+            _workspaces[application_id] = workspace
+        return workspace
@@ -27,7 +27,7 @@ const Dashboard = () => {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ question: query }),
+        body: JSON.stringify({ question: query, applicationId: localStorage.getItem('applicationId') }),
       });
       const data = await response.json();
       setQueryResult(data.result);
@@ -40,7 +40,8 @@ const Dashboard = () => {
   const generateReport = async () => {
     setLoading(true);
     try {
-      const response = await fetch('http://127.0.0.1:5000/api/generate-report');
+      const applicationId = localStorage.getItem('applicationId');
+      const response = await fetch(`http://127.0.0.1:5000/api/generate-report?applicationId=${applicationId}`);
       const data = await response.json();
       setReport(data.report);
     } catch (error) {
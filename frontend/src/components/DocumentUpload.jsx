@@ -14,7 +14,7 @@ const DocumentUpload = () => {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ upiId }),
+        body: JSON.stringify({ upiId, applicationId: localStorage.getItem('applicationId') }),
       });
 
       const data = await response.json();
@@ -35,7 +35,8 @@ const DocumentUpload = () => {
   
     try {
       // First check if UPI ID exists by making a test request
-      const testResponse = await fetch('http://localhost:5000/api/accepttext', {
+      const applicationId = localStorage.getItem('applicationId');
+      const testResponse = await fetch(`http://localhost:5000/api/accepttext?applicationId=${applicationId}`, {
         method: 'GET'
       });
       
@@ -43,7 +43,10 @@ const SocialCreditForm = () => {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify(socialData)
+        body: JSON.stringify({
+          ...socialData,
+          applicationId: localStorage.getItem('applicationId')
+        })
       });
       
       const data = await response.json();
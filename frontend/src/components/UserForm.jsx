@@ -92,6 +92,7 @@ const handleSubmit = async (e) => {
           if (submitResponse.ok) {
               const submitResult = await submitResponse.json();
               setApplicationId(submitResult.applicationId);
+              localStorage.setItem('applicationId', submitResult.applicationId);
               alert("Application submitted successfully!");
               nextStep(); // Add this line to advance to step 6
       }
@@ -115,9 +116,23 @@ const handleGenerateReport = async () => {
       });
         
       if (analysisResponse.ok) {
-          const analysisResult = await analysisResponse.json();
-          console.log(analysisResult);
-          alert("Loan report generated successfully!");
+          const { jobId } = await analysisResponse.json();
+          // Analysis runs in the background; poll until the job settles
+          let job;
+          do {
+              await new Promise(resolve => setTimeout(resolve, 2000));
+              const jobResponse = await fetch(`http://127.0.0.1:5000/api/jobs/${jobId}`);
+              job = await jobResponse.json();
+              console.log(job.progress);
+          } while (job.status === 'queued' || job.status === 'running');
+          console.log(job);
+          if (job.status === 'done') {
+              alert("Loan report generated successfully!");
+          } else if (job.status === 'partial') {
+              alert(`Loan report generated, but some files could not be processed (${job.error})`);
+          } else {
+              alert("An error occurred while generating the loan report");
+          }
           // Navigate to results page or show results modal
       }
   } catch (error) {